@@ -0,0 +1,69 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, List, Optional, Sequence
+from db_connection import Database, Query
+
+logger = logging.getLogger('AGGREGATES')
+
+
+class AggregateRefresher:
+    """
+    Runs a refresh function of precomputed aggregates every `refresh_interval` seconds. The
+    function recomputes only the keys marked dirty by the table triggers and returns how many
+    it refreshed. Every worker runs the loop, the function skips the round while another
+    session holds its advisory lock. After a refresh that changed something the cached
+    responses of `datasets` are moved to new keys through `on_refresh`.
+    """
+
+    def __init__(self, db: Database, query: Query, refresh_interval: float = 60.0,
+                 datasets: Sequence[str] = (), on_refresh: Optional[Callable[[List[str]], Awaitable]] = None):
+        self._db = db
+        self._query = query
+        self.refresh_interval = refresh_interval
+        self.datasets = list(datasets)
+        self._on_refresh = on_refresh
+
+        self._task: Optional[asyncio.Task] = None
+        self.refreshed = 0
+        self.failures = 0
+
+    # returns the number of keys refreshed
+    async def refresh(self) -> int:
+        rows = await self._db.fetch(self._query)
+        if rows is None:
+            self.failures += 1
+            return 0
+
+        refreshed = rows[0]['refreshed'] if rows else 0
+        if refreshed:
+            self.refreshed += refreshed
+            if self._on_refresh is not None and self.datasets:
+                await self._on_refresh(self.datasets)
+
+        return refreshed
+
+    async def _refresh_periodically(self):
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+
+            try:
+                refreshed = await self.refresh()
+                if refreshed:
+                    logger.info(f'Refreshed {refreshed} key(s) with {self._query.name}')
+            except Exception as exp:
+                logger.error(f'Failed to run {self._query.name}: {exp}')
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_event_loop().create_task(self._refresh_periodically())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def stats(self) -> dict:
+        return {
+            'refreshed': self.refreshed,
+            'failures': self.failures,
+        }
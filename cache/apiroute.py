@@ -1,14 +1,28 @@
+import json
+import math
+import time
 import asyncio
-import logging
 import hashlib
+import logging
 from aioredis import RedisError
 from fastapi.routing import APIRoute
 from cache.redis import RedisRequestResponseCache
+from cache.memory import LRUMemoryCache
+from cache.singleflight import SingleFlight
+from cache.policy import CachePolicy, is_stale, should_refresh_early
+from cache.keys import CacheKeySpec, build_cache_key, build_cache_tags
+from cache.versions import DatasetVersions
+from cache.compression import PayloadCompressor
+from cache.breaker import CircuitBreaker
+from cache.encoding import encode_variants, decode_variant, choose_encoding
+from cache.ratelimit import RateLimit, RateLimiter, RateLimitPolicy
 from fastapi import Response, Request, HTTPException
-from utils import validate_token, increment_usage_counter
+from fastapi.responses import JSONResponse
+from db_sessions import main_db_instance
+from utils import validate_token, increment_usage_counter, user_profiles, reference_data
 
 from config import config
-from typing import Callable, Coroutine, Any
+from typing import Callable, Coroutine, Any, Optional, List
 
 # TODO: read the values from config
 _pass_through_list = {
@@ -32,15 +46,421 @@ _exclusion_list = {
     # '/login',
     # '/verify-email'
 }
+_default_policy = CachePolicy(negative_ttl=config.cache_negative_ttl)
+_empty_bodies = {b'', b'[]', b'{}', b'null', b'""'}
 _expiry_config = {
-}  # the time here is in seconds
+    # heavy analytics are served stale for a while and refreshed in the background
+    '/company/{company_ticker}/related-companies': CachePolicy(
+        ttl=24 * 60 * 60, stale_ttl=6 * 60 * 60, beta=1.0, negative_ttl=config.cache_negative_ttl),
+    '/company/{company_ticker}/carbonbudget': CachePolicy(
+        ttl=24 * 60 * 60, stale_ttl=6 * 60 * 60, beta=1.0, negative_ttl=config.cache_negative_ttl),
+}  # keyed by route path or request path, the time here is in seconds
+_key_config = {
+    # the trailing path params of these routes are not read by the controllers
+    '/company/{company_ticker}/carbontax/{financialColumn}': CacheKeySpec(
+        path_params=('company_ticker',), query_params=('financial_column',)),
+    '/company/{company_ticker}/historicalPrices/{limitdate}': CacheKeySpec(
+        path_params=('company_ticker',), query_params=('limit_date',)),
+}  # keyed by route path, routes not listed depend on all of their inputs
+_dataset_config = {
+    '/company/{company_ticker}/carbon-footprint': ('carbon',),
+    '/company/{company_ticker}/related-companies': ('general', 'financials'),
+    '/company/{company_ticker}/news': ('news',),
+    '/company/{company_ticker}/sumhistoriccarbon/{year_range}': ('carbon',),
+    '/company/{company_ticker}/temperatureconversion/{year_range}': ('carbon',),
+    '/company/{company_ticker}/industry-sum': ('carbon', 'general', 'industry_aggregates'),
+    '/company/{company_ticker}/EmissionsEfficiency': ('carbon', 'general', 'financials', 'industry_aggregates'),
+    '/company/{company_ticker}/carbontax': ('carbon', 'financials', 'tax_regimes'),
+    '/company/{company_ticker}/carbontax/{financialColumn}': ('carbon', 'financials', 'tax_regimes'),
+    '/company/{company_ticker}/industry-average': ('carbon', 'general', 'industry_aggregates'),
+    '/company/{company_ticker}/industry-temp-impact/{year}': ('carbon', 'general', 'industry_aggregates'),
+    '/company/{company_ticker}/netincome-carbon': ('carbon', 'financials'),
+    '/company/{company_ticker}/15rock-globalscore': ('carbon', 'general', 'industry_aggregates'),
+    '/company/{company_ticker}/co2_breakdown': ('carbon', 'financials'),
+    '/company/{company_ticker}/equivalencies_calculator': ('carbon', 'financials'),
+    '/company/{company_ticker}/historicalPrices': ('eodprice',),
+    '/company/{company_ticker}/historicalPrices/{limitdate}': ('eodprice',),
+    '/company/{company_ticker}/valuation': ('valuation',),
+    '/company/{company_ticker}/carbongrowthrate': ('carbon',),
+    '/company/{company_ticker}/carboncapture': ('carbon', 'general'),
+    '/company/{company_ticker}/productionefficency': ('carbon', 'general', 'financials'),
+    '/company/{company_ticker}/carbonAlpha/{pct_carbon}': ('carbon', 'general', 'eodprice', 'industry_aggregates'),
+    '/company/{company_ticker}/CarbonTransitonRisk': ('carbon', 'general', 'eodprice', 'financials', 'industry_aggregates'),
+    '/company/{company_ticker}/CarbonTransitonRisk/{pct_carbon}': ('carbon', 'general', 'eodprice', 'financials', 'industry_aggregates'),
+    '/company/{company_ticker}/cogs': ('financials',),
+    '/company/{company_ticker}/carbonbudget': ('carbon', 'financials', 'country_emissions', 'fund_holdings'),
+    '/company/{company_ticker}/financials': ('general', 'financials'),
+    '/company/{company_ticker}/info': ('general',),
+    '/company/{company_ticker}': ('general',),
+    '/country/{country}/carbon': ('country_emissions',),
+    '/country/{country}/tax': ('tax_regimes',),
+    '/country/world/carbon/sum': ('country_emissions',),
+    '/portfolio/analytics/carbon-footprint': ('carbon',),
+    '/portfolio/analytics/cogs': ('financials',),
+    '/portfolio/analytics/historicalprices': ('eodprice',),
+    '/portfolio/analytics/score': ('carbon', 'general', 'industry_aggregates'),
+    '/portfolio/analytics/sortino': ('carbon',),
+    '/portfolio/carbon-footprint': ('carbon',),
+    '/portfolio/carbon-averages': ('carbon',),
+    '/portfolio': ('general',),
+    '/search/{search_name}': ('general',),
+}  # keyed by route path, the tables a response is derived from
+_cost_config = {
+    '/company/{company_ticker}/carbonAlpha/{pct_carbon}': 10,
+    '/company/{company_ticker}/CarbonTransitonRisk': 10,
+    '/company/{company_ticker}/CarbonTransitonRisk/{pct_carbon}': 10,
+    '/company/{company_ticker}/carbonbudget': 10,
+    '/company/{company_ticker}/15rock-globalscore': 5,
+    '/portfolio/analytics/score': 5,
+    '/portfolio/analytics/sortino': 5,
+}  # keyed by route path, compute tokens a cache miss costs, 1 when not listed
+_rate_limit_config = {
+    'enterprise': RateLimitPolicy(
+        read=RateLimit(rate=config.rate_limit_read_rate * 10, burst=config.rate_limit_read_burst * 10),
+        compute=RateLimit(rate=config.rate_limit_compute_rate * 10, burst=config.rate_limit_compute_burst * 10),
+    ),
+}  # keyed by company.user_profile.client_type, every other client type gets the default limits
 _redis = RedisRequestResponseCache(
     url=config.redis_server,
+    compressor=PayloadCompressor(
+        codec=config.cache_compression,
+        threshold=config.cache_compression_threshold,
+        level=config.cache_compression_level,
+    ),
+    breaker=CircuitBreaker(
+        name='redis',
+        failure_threshold=config.cache_breaker_failure_threshold,
+        recovery_timeout=config.cache_breaker_recovery_timeout,
+    ),
+    timeout=config.cache_redis_timeout,
+)
+_memory = LRUMemoryCache(
+    max_bytes=config.memory_cache_max_bytes,
+)
+_single_flight = SingleFlight(
+    timeout=config.cache_coalesce_timeout,
+)
+_dataset_versions = DatasetVersions(
+    cache=_redis,
+    refresh_interval=config.cache_version_refresh_interval,
+    # the industry of a ticker comes from the reference data, reloaded before the new version is used
+    reloaders={'general': reference_data.refresh},
+)
+_rate_limiter = RateLimiter(
+    cache=_redis,
+    default=RateLimitPolicy(
+        read=RateLimit(rate=config.rate_limit_read_rate, burst=config.rate_limit_read_burst),
+        compute=RateLimit(rate=config.rate_limit_compute_rate, burst=config.rate_limit_compute_burst),
+    ),
+    policies=_rate_limit_config,
 )
 
 logging.basicConfig(level=logging.INFO)
 
 
+def _get_policy(route_path: str, request_path: str) -> CachePolicy:
+    value = _expiry_config.get(route_path, _expiry_config.get(request_path))
+    return CachePolicy.from_config(value, _default_policy)
+
+
+# cached entries carry the soft expiry and how long the response took to compute, large
+# bodies are only kept as precompressed variants which are served as they are
+def _make_entry(body: bytes, policy: CachePolicy, delta: float, status: int = 200, negative: bool = False) -> dict:
+    encodings = encode_variants(body, config.response_compression_threshold, config.response_compression_brotli)
+
+    return {
+        'body': None if encodings else body,
+        'encodings': encodings,
+        'etag': _etag(body),
+        'status': status,
+        'stale_at': time.time() + (policy.negative_ttl if negative else policy.ttl),
+        'delta': delta,
+    }
+
+
+# not found and empty results are cached too, only for a short while
+def _is_negative(status: int, body: bytes) -> bool:
+    return status == 404 or body.strip() in _empty_bodies
+
+
+# entries written before the soft ttl scheme are the raw body
+def _read_entry(value) -> dict:
+    if isinstance(value, dict):
+        return value
+
+    return {'body': value, 'encodings': {}, 'etag': _etag(value), 'status': 200, 'stale_at': None, 'delta': 0.0}
+
+
+# strong validator of the response body
+def _etag(body: bytes) -> str:
+    return f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+
+
+# strong validators differ per byte representation, the content coding is appended for the variants
+def _representation_etag(etag: Optional[str], encoding: Optional[str]) -> Optional[str]:
+    if not etag or encoding is None:
+        return etag
+
+    return f'{etag[:-1]}-{encoding}"'
+
+
+# If-None-Match uses the weak comparison, a W/ prefix does not matter
+def _etag_matches(if_none_match: Optional[str], etag: Optional[str]) -> bool:
+    if not if_none_match or not etag:
+        return False
+
+    candidates = {candidate.strip() for candidate in if_none_match.split(',')}
+    if '*' in candidates:
+        return True
+
+    return etag in {candidate[2:] if candidate.startswith('W/') else candidate for candidate in candidates}
+
+
+# browsers and CDNs may keep the response until it goes stale on our side
+def _cache_headers(entry: dict, policy: CachePolicy, encoding: Optional[str] = None) -> dict:
+    max_age = policy.ttl
+    if entry.get('stale_at') is not None:
+        max_age = max(0, min(policy.ttl, int(entry['stale_at'] - time.time())))
+
+    cache_control = f"{'public' if policy.public else 'private'}, max-age={max_age}"
+    if policy.stale_ttl:
+        cache_control += f', stale-while-revalidate={policy.stale_ttl}'
+
+    headers = {'Cache-Control': cache_control}
+    if entry.get('etag'):
+        headers['ETag'] = _representation_etag(entry['etag'], encoding)
+    if entry.get('encodings'):
+        headers['Vary'] = 'Accept-Encoding'
+
+    return headers
+
+
+def _entry_size(entry: dict) -> int:
+    return len(entry['body'] or b'') + sum(len(variant) for variant in entry.get('encodings', {}).values())
+
+
+def _entry_body(entry: dict) -> bytes:
+    if entry['body'] is not None:
+        return entry['body']
+
+    # the client does not accept any of the precompressed variants
+    encoding, variant = next(iter(entry['encodings'].items()))
+    return decode_variant(encoding, variant)
+
+
+def _build_response(request: Request, entry: dict, policy: CachePolicy) -> Response:
+    if entry.get('response') is not None:
+        return entry['response']
+
+    encoding = choose_encoding(request.headers.get('Accept-Encoding'), entry.get('encodings'))
+    headers = _cache_headers(entry, policy, encoding)
+
+    status = entry.get('status', 200)
+
+    # the client already has this exact representation
+    if status == 200 and request.method in ('GET', 'HEAD') \
+            and _etag_matches(request.headers.get('If-None-Match'), headers.get('ETag')):
+        return Response(status_code=304, headers=headers)
+
+    if encoding is None:
+        return Response(content=_entry_body(entry), status_code=status, media_type="application/json",
+                        headers=headers)
+
+    headers['Content-Encoding'] = encoding
+    return Response(content=entry['encodings'][encoding], status_code=status, media_type="application/json",
+                    headers=headers)
+
+
+# look the key up in the in-process tier first and only then go to redis
+async def _get_cached(key: str):
+    exists, entry = _memory.get(key)
+    if exists:
+        return True, entry
+
+    exists, entry, ttl = await _redis.get_with_ttl(key)
+    if exists:
+        entry = _read_entry(entry)
+
+        # the in-process copy never outlives the redis entry
+        ttl = config.memory_cache_max_ttl if ttl is None else min(ttl, config.memory_cache_max_ttl)
+        _memory.set(key, entry, ttl, size=_entry_size(entry))
+
+    return exists, entry
+
+
+async def _set_cached(key: str, entry: dict, expire_after: int, tags=()):
+    _memory.set(key, entry, min(expire_after, config.memory_cache_max_ttl), size=_entry_size(entry))
+    # precompressed bodies do not shrink any further
+    await _redis.set(key, entry, expire_after=expire_after, tags=tags, compress=not entry.get('encodings'))
+
+
+# drop keys matching the patterns and keys recorded under the tags from both tiers,
+# the memory tier of the other workers expires within memory_cache_max_ttl
+async def invalidate(patterns: List[str] = (), tags: List[str] = ()) -> List[str]:
+    deleted = []
+
+    for pattern in patterns:
+        _memory.delete_matching(pattern)
+        deleted.extend(await _redis.delete(pattern))
+
+    if tags:
+        keys = await _redis.delete_tags(list(tags))
+        for key in keys:
+            _memory.delete(key)
+        deleted.extend(keys)
+
+    return deleted
+
+
+# run the path operation function and cache its response
+async def _compute(key: str, request: Request, route_handler: Callable, policy: CachePolicy,
+                   tags: List[str]) -> dict:
+    started = time.monotonic()
+    try:
+        response: Response = await route_handler(request)
+        status, body = response.status_code, response.body
+    except HTTPException as exp:
+        if exp.status_code != 404:
+            raise
+        status, body = exp.status_code, json.dumps({'detail': exp.detail}).encode('utf-8')
+
+    negative = _is_negative(status, body)
+
+    # errors are never cached, they are sent as the handler built them without validators or a max-age
+    if status != 200 and not negative:
+        logging.info(f'Not caching the {status} response for {key}')
+        return {'status': status, 'response': response}
+
+    entry = _make_entry(body, policy, time.monotonic() - started, status, negative)
+
+    expire_after = policy.negative_ttl if negative else policy.hard_ttl
+    logging.info(f"Caching the {'negative ' if negative else ''}response with an expiry time of {expire_after}s")
+    try:
+        await _set_cached(key, entry, expire_after, tags)
+    except (RedisError, asyncio.TimeoutError) as exp:
+        logging.error(f'Failed to cache the response for {key}: {exp}')
+
+    return entry
+
+
+# wait for the lock holder on another worker to publish the value
+async def _wait_for_lock_holder(key: str):
+    loop = asyncio.get_event_loop()
+    deadline = loop.time() + config.cache_coalesce_timeout
+
+    while loop.time() < deadline:
+        await asyncio.sleep(config.cache_lock_poll_interval)
+
+        exists, entry = await _get_cached(key)
+        if exists:
+            return True, entry
+
+        # the holder released the lock without caching anything, it failed
+        if not await _redis.is_locked(key):
+            break
+
+    return False, None
+
+
+# only one worker across all nodes computes the value while the redis lock is held,
+# background refreshes do not wait and leave the work to the lock holder
+async def _compute_with_lock(key: str, request: Request, route_handler: Callable, policy: CachePolicy,
+                             tags: List[str], wait: bool = True) -> Optional[dict]:
+    if not config.cache_distributed_lock:
+        return await _compute(key, request, route_handler, policy, tags)
+
+    token = None
+    try:
+        token = await _redis.acquire_lock(key, config.cache_lock_ttl)
+
+        if token is None:
+            if not wait:
+                return None
+
+            exists, entry = await _wait_for_lock_holder(key)
+            if exists:
+                return entry
+
+            logging.warning(f'Lock holder for {key} did not publish a value, computing it locally')
+
+    except (RedisError, asyncio.TimeoutError) as exp:
+        logging.error(f'Failed to coordinate the cache miss for {key} over redis: {exp}')
+
+    try:
+        return await _compute(key, request, route_handler, policy, tags)
+    finally:
+        if token is not None:
+            try:
+                await _redis.release_lock(key, token)
+            except (RedisError, asyncio.TimeoutError) as exp:
+                logging.error(f'Failed to release the cache lock for {key}: {exp}')
+
+
+# refresh a stale or soon to expire entry after the response has been sent
+async def _refresh(key: str, request: Request, route_handler: Callable, policy: CachePolicy, tags: List[str]):
+    try:
+        # another worker may have refreshed it already, only our in-process copy is old
+        exists, entry, ttl = await _redis.get_with_ttl(key)
+        if exists:
+            entry = _read_entry(entry)
+            if not is_stale(entry['stale_at']):
+                ttl = config.memory_cache_max_ttl if ttl is None else min(ttl, config.memory_cache_max_ttl)
+                _memory.set(key, entry, ttl, size=_entry_size(entry))
+                return
+
+        logging.info(f'Refreshing the cached response for {key} in the background')
+        await _single_flight.do(
+            key, lambda: _compute_with_lock(key, request, route_handler, policy, tags, wait=False))
+
+    except Exception as exp:
+        logging.error(f'Failed to refresh the cached response for {key}: {exp}')
+
+
+def _schedule_refresh(key: str, request: Request, route_handler: Callable, policy: CachePolicy, tags: List[str]):
+    if _single_flight.in_flight(key):
+        return
+
+    asyncio.get_event_loop().create_task(_refresh(key, request, route_handler, policy, tags))
+
+
+# called by the ingestion jobs after a load, e.g. bump_dataset_versions(['carbon'])
+async def bump_dataset_versions(datasets: List[str]) -> dict:
+    logging.info(f'Bumping the cache versions of {datasets}')
+    return await _dataset_versions.bump(datasets)
+
+
+def cache_stats() -> dict:
+    return {
+        'memory': _memory.stats(),
+        'redis': _redis.stats(),
+        'single_flight': _single_flight.stats(),
+        'rate_limiter': _rate_limiter.stats(),
+    }
+
+
+def _too_many_requests(retry_after: float) -> Response:
+    return JSONResponse({'detail': 'Rate limit exceeded'}, status_code=429,
+                        headers={'Retry-After': str(max(1, math.ceil(retry_after)))})
+
+
+class _ComputeRateLimited(Exception):
+    def __init__(self, retry_after: float):
+        super().__init__(f'compute rate limit exceeded, retry after {retry_after}s')
+        self.retry_after = retry_after
+
+
+# only the request that computes is charged the cost of the route in compute tokens, the
+# followers sharing its result are not, a rate limited leader lets its followers compute instead
+async def _charge_compute(email: str, client_type: Optional[str], route_path: str,
+                          compute: Callable[[], Coroutine[Any, Any, Optional[dict]]]) -> Optional[dict]:
+    if config.rate_limit_enabled:
+        retry_after = await _rate_limiter.check(email, client_type, 'compute', _cost_config.get(route_path, 1))
+        if retry_after is not None:
+            raise _ComputeRateLimited(retry_after)
+
+    return await compute()
+
+
 class CachingLayerRoute(APIRoute):
     def get_route_handler(self) -> Callable[[Request], Coroutine[Any, Any, Response]]:
         original_route_handler = super().get_route_handler()
@@ -57,36 +477,73 @@ class CachingLayerRoute(APIRoute):
             if not is_valid:
                 raise HTTPException(status_code=401, detail="Invalid token")
 
+            # the router dependencies reuse the claims instead of decoding the token again
+            request.state.token_claims = data
+
             try:
-                key = request.url.path
-                if key in _exclusion_list:
+                client_type = None
+                if config.rate_limit_enabled:
+                    client_type = await user_profiles.client_type(data['email'])
+                    retry_after = await _rate_limiter.check(data['email'], client_type, 'read')
+                    if retry_after is not None:
+                        return _too_many_requests(retry_after)
+
+                if request.url.path in _exclusion_list:
                     return await original_route_handler(request)
 
-                if request.method == 'POST':
-                    body = await request.body()
-                    body_hash = hashlib.md5(body).hexdigest()
-                    key += f'_{body_hash}'
+                datasets = _dataset_config.get(self.path, ())
+
+                # reject the tickers unknown to company."General" before they reach the models, only
+                # on the routes reading it, the others also answer for e.g. index symbols
+                ticker = request.path_params.get('company_ticker')
+                if ticker is not None and 'general' in datasets and reference_data.is_known(ticker) is False:
+                    logging.info(f'Rejecting the request for the unknown ticker {ticker}')
+                    return JSONResponse({'detail': f'Unknown ticker {ticker}'}, status_code=404,
+                                        headers={'Cache-Control': f'private, max-age={config.cache_negative_ttl}'})
 
-                exists, content = await _redis.get(key)
+                body = await request.body() if request.method == 'POST' else None
+
+                # the dataset versions in the key invalidate the responses after a data load
+                key = build_cache_key(self.path, request.path_params, request.query_params.multi_items(),
+                                      body, _key_config.get(self.path))
+                key += await _dataset_versions.stamp(datasets)
+
+                policy = _get_policy(self.path, request.url.path)
+                tags = build_cache_tags(self.path, request.path_params, body, datasets)
+                exists, entry = await _get_cached(key)
 
                 # cache miss, forward the request to key operation function
                 if not exists:
                     forwarded = True
                     logging.info(f'Cache miss: forwarding the request to path operation function - {request.url.path}')
-                    response: Response = await original_route_handler(request)
 
-                    # in seconds, one day = 24 * 60 * 60
-                    expire_after = _expiry_config.get(
-                        request.url.path, 1 * 60 * 60)
-                    logging.info(
-                        f"Caching the response with an expiry time of {expire_after} seconds")
-                    await _redis.set(key, response.body, expire_after=expire_after)
+                    # concurrent misses for the same key wait for a single computation, only misses
+                    # are charged to the compute bucket, weighted by the cost of the route
+                    entry, shared = await _single_flight.do(key, lambda: _charge_compute(
+                        data['email'], client_type, self.path,
+                        lambda: _compute_with_lock(key, request, original_route_handler, policy, tags)))
+                    if shared:
+                        logging.info(f'Cache miss: shared the in-flight response for {key}')
+
+                    # we joined a background refresh that left the work to another worker
+                    if entry is None:
+                        entry = await _charge_compute(
+                            data['email'], client_type, self.path,
+                            lambda: _compute(key, request, original_route_handler, policy, tags))
+
+                elif is_stale(entry['stale_at']):
+                    logging.info("Cache hit: returning the stale response and refreshing it")
+                    _schedule_refresh(key, request, original_route_handler, policy, tags)
 
-                    content = response.body
                 else:
                     logging.info("Cache hit: returning the response")
+                    if should_refresh_early(entry['stale_at'], entry['delta'], policy.beta):
+                        _schedule_refresh(key, request, original_route_handler, policy, tags)
+
+                return _build_response(request, entry, policy)
 
-                return Response(content=content, media_type="application/json")
+            except _ComputeRateLimited as exp:
+                return _too_many_requests(exp.retry_after)
 
             # catch any kind of exception in the caching layer
             except (RedisError, Exception) as exp:
@@ -96,9 +553,10 @@ class CachingLayerRoute(APIRoute):
                     logging.info(f'Forwarding the request to key operation function: {request.url.path}')
                     return await original_route_handler(request)
 
+                raise
+
             finally:
-                # increment the counter in the background task
-                asyncio.get_event_loop().create_task(
-                    increment_usage_counter(data['email']))
+                # buffered, written to the database in batches
+                increment_usage_counter(data['email'])
 
         return cache_route_handler
@@ -0,0 +1,89 @@
+import time
+import logging
+
+logger = logging.getLogger('CIRCUIT_BREAKER')
+
+
+class CircuitBreaker:
+    """
+    Tracks consecutive failures of a dependency. After `failure_threshold` failures the circuit
+    opens and calls are rejected right away for `recovery_timeout` seconds, then up to
+    `half_open_max_calls` probe calls are let through: a successful probe closes the circuit,
+    a failed one opens it again.
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, name: str, failure_threshold: int = 5, recovery_timeout: float = 30.0,
+                 half_open_max_calls: int = 1):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.half_open_max_calls = half_open_max_calls
+
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probes = 0
+
+        self.rejected = 0
+        self.trips = 0
+
+    @property
+    def state(self) -> str:
+        if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.recovery_timeout:
+            self._state = self.HALF_OPEN
+            self._probes = 0
+
+        return self._state
+
+    # whether a call may go through, callers must report its outcome
+    def allow(self) -> bool:
+        state = self.state
+
+        if state == self.CLOSED:
+            return True
+
+        if state == self.HALF_OPEN and self._probes < self.half_open_max_calls:
+            self._probes += 1
+            return True
+
+        self.rejected += 1
+        return False
+
+    def record_success(self):
+        if self._state != self.CLOSED:
+            logger.info(f'{self.name} circuit closed')
+
+        self._state = self.CLOSED
+        self._failures = 0
+        self._probes = 0
+
+    def record_failure(self):
+        self._failures += 1
+
+        if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+            # calls let through before the circuit opened may still fail, they do not extend
+            # the recovery timeout
+            if self._state != self.OPEN:
+                logger.warning(f'{self.name} circuit opened after {self._failures} failure(s), '
+                               f'bypassing it for {self.recovery_timeout}s')
+                self.trips += 1
+
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+                self._probes = 0
+
+    # a call that ended without an outcome, e.g. cancelled, a probe counts as failed so its slot is freed
+    def record_abandoned(self):
+        if self._state == self.HALF_OPEN:
+            self.record_failure()
+
+    def stats(self) -> dict:
+        return {
+            'state': self.state,
+            'consecutive_failures': self._failures,
+            'rejected': self.rejected,
+            'trips': self.trips,
+        }
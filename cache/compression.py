@@ -0,0 +1,114 @@
+import time
+import zlib
+import logging
+from typing import Callable, Dict, NamedTuple, Optional
+
+logger = logging.getLogger('CACHE_COMPRESSION')
+
+# 0xc1 is never used by msgpack, so a payload starting with it is compressed and
+# anything else is a plain msgpack payload written before compression was enabled
+_HEADER = b'\xc1'
+
+
+class Codec(NamedTuple):
+    id: int
+    name: str
+    compress: Callable[[bytes, Optional[int]], bytes]
+    decompress: Callable[[bytes], bytes]
+
+
+_codecs: Dict[str, Codec] = {
+    'zlib': Codec(1, 'zlib',
+                  lambda data, level: zlib.compress(data, 6 if level is None else level),
+                  zlib.decompress),
+}
+
+try:
+    import lz4.frame
+
+    _codecs['lz4'] = Codec(2, 'lz4',
+                           lambda data, level: lz4.frame.compress(data, compression_level=level or 0),
+                           lz4.frame.decompress)
+except ImportError:
+    pass
+
+try:
+    import zstandard
+
+    _codecs['zstd'] = Codec(3, 'zstd',
+                            lambda data, level: zstandard.ZstdCompressor(level=level or 3).compress(data),
+                            lambda data: zstandard.ZstdDecompressor().decompress(data))
+except ImportError:
+    pass
+
+_codecs_by_id = {codec.id: codec for codec in _codecs.values()}
+
+
+class PayloadCompressor:
+    """
+    Compresses cache payloads of at least `threshold` bytes with a pluggable codec
+    (zlib, lz4 or zstd when the library is installed). Compressed payloads are prefixed with
+    a header byte and the codec id, so entries written with another codec or without
+    compression are still readable.
+    """
+
+    def __init__(self, codec: str = 'zlib', threshold: int = 1024, level: Optional[int] = None):
+        if codec != 'none' and codec not in _codecs:
+            logger.warning(f'Compression codec {codec} is not available, falling back to zlib')
+            codec = 'zlib'
+
+        self.codec = _codecs.get(codec)
+        self.threshold = threshold
+        self.level = level
+
+        self.compressed = 0
+        self.skipped = 0
+        self.raw_bytes = 0
+        self.stored_bytes = 0
+        self.encode_seconds = 0.0
+        self.decode_seconds = 0.0
+
+    def encode(self, data: bytes) -> bytes:
+        if self.codec is None or len(data) < self.threshold:
+            self.skipped += 1
+            return data
+
+        started = time.perf_counter()
+        compressed = self.codec.compress(data, self.level)
+        self.encode_seconds += time.perf_counter() - started
+
+        # incompressible payloads, e.g. already gzipped bodies, are stored as they are
+        if len(compressed) + 2 >= len(data):
+            self.skipped += 1
+            return data
+
+        self.compressed += 1
+        self.raw_bytes += len(data)
+        self.stored_bytes += len(compressed) + 2
+
+        return _HEADER + bytes([self.codec.id]) + compressed
+
+    def decode(self, data: bytes) -> bytes:
+        if data[:1] != _HEADER:
+            return data
+
+        codec = _codecs_by_id.get(data[1])
+        if codec is None:
+            raise ValueError(f'Cached payload was compressed with an unknown codec {data[1]}')
+
+        started = time.perf_counter()
+        decompressed = codec.decompress(data[2:])
+        self.decode_seconds += time.perf_counter() - started
+
+        return decompressed
+
+    def stats(self) -> dict:
+        return {
+            'codec': self.codec.name if self.codec else 'none',
+            'threshold': self.threshold,
+            'compressed': self.compressed,
+            'skipped': self.skipped,
+            'ratio': round(self.raw_bytes / self.stored_bytes, 3) if self.stored_bytes else None,
+            'encode_seconds': round(self.encode_seconds, 6),
+            'decode_seconds': round(self.decode_seconds, 6),
+        }
@@ -0,0 +1,72 @@
+import gzip
+from typing import Dict, Optional
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# preferred content encoding first when the client accepts several with the same weight
+_preference = ('br', 'gzip')
+
+
+# compressed variants of a response body, computed once when the response is cached
+def encode_variants(body: bytes, threshold: int, use_brotli: bool = True) -> Dict[str, bytes]:
+    if len(body) < threshold:
+        return {}
+
+    # mtime=0 keeps the gzip output deterministic for identical bodies
+    variants = {'gzip': gzip.compress(body, compresslevel=6, mtime=0)}
+    if use_brotli and brotli is not None:
+        variants['br'] = brotli.compress(body, quality=5)
+
+    return variants
+
+
+def decode_variant(encoding: str, data: bytes) -> bytes:
+    if encoding == 'gzip':
+        return gzip.decompress(data)
+    if encoding == 'br' and brotli is not None:
+        return brotli.decompress(data)
+
+    raise ValueError(f'Unsupported content encoding {encoding}')
+
+
+def _accepted_encodings(accept_encoding: str) -> Dict[str, float]:
+    accepted = {}
+
+    for part in accept_encoding.split(','):
+        name, _, params = part.strip().partition(';')
+        name = name.strip().lower()
+        if not name:
+            continue
+
+        weight = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                weight = float(params[2:])
+            except ValueError:
+                weight = 0.0
+
+        accepted[name] = weight
+
+    return accepted
+
+
+# pick the best variant the client accepts according to its Accept-Encoding header
+def choose_encoding(accept_encoding: Optional[str], available) -> Optional[str]:
+    if not accept_encoding or not available:
+        return None
+
+    accepted = _accepted_encodings(accept_encoding)
+    wildcard = accepted.get('*', 0.0)
+
+    candidates = [
+        (accepted.get(encoding, wildcard), -position, encoding)
+        for position, encoding in enumerate(_preference)
+        if encoding in available
+    ]
+    candidates = [candidate for candidate in candidates if candidate[0] > 0]
+
+    return max(candidates)[2] if candidates else None
@@ -0,0 +1,144 @@
+import re
+import json
+import hashlib
+from dataclasses import dataclass
+from urllib.parse import urlencode
+from typing import Any, Callable, Iterable, List, Mapping, Optional, Tuple, Union
+
+_path_param_pattern = re.compile(r'{(\w+)(:\w+)?}')
+
+# canonical form of the path and query params, tickers and countries are case insensitive
+_param_normalizers = {
+    'company_ticker': lambda value: value.strip().upper(),
+    'fund_ticker': lambda value: value.strip().upper(),
+    'ticker': lambda value: value.strip().upper(),
+    'country': lambda value: value.replace(' ', '').upper(),
+}
+_ticker_params = ('company_ticker', 'fund_ticker', 'ticker')
+
+
+@dataclass(frozen=True)
+class CacheKeySpec:
+    """
+    Declares which request inputs a cached route depends on.
+
+    path_params:  path params that are part of the key, None for all of them, the others
+                  are replaced by a wildcard
+    query_params: query params that are part of the key, None for all of them
+    body:         whether the body is part of the key, or a callable normalizing the decoded
+                  json body before it is hashed
+    """
+    path_params: Optional[Tuple[str, ...]] = None
+    query_params: Optional[Tuple[str, ...]] = None
+    body: Union[bool, Callable[[Any], Any]] = True
+
+
+def normalize_param(name: str, value: Any) -> str:
+    value = str(value)
+    normalizer = _param_normalizers.get(name)
+
+    return normalizer(value) if normalizer else value
+
+
+# tickers lists are order and case insensitive, e.g. the PortfolioItems body
+def normalize_json_body(data: Any) -> Any:
+    if isinstance(data, dict):
+        return {
+            key: sorted(normalize_param('ticker', ticker) for ticker in value)
+            if key == 'tickers' and isinstance(value, list) and all(isinstance(ticker, str) for ticker in value)
+            else normalize_json_body(value)
+            for key, value in data.items()
+        }
+
+    if isinstance(data, list):
+        return [normalize_json_body(item) for item in data]
+
+    return data
+
+
+def body_digest(body: bytes, normalizer: Callable[[Any], Any] = normalize_json_body) -> str:
+    try:
+        data = normalizer(json.loads(body))
+        canonical = json.dumps(data, sort_keys=True, separators=(',', ':')).encode('utf-8')
+    except ValueError:
+        # not json, fall back to the raw bytes
+        canonical = body
+
+    return hashlib.md5(canonical).hexdigest()
+
+
+def build_cache_key(route_path: str,
+                    path_params: Mapping[str, Any],
+                    query_params: Iterable[Tuple[str, Any]] = (),
+                    body: Optional[bytes] = None,
+                    spec: Optional[CacheKeySpec] = None) -> str:
+    """
+    Builds the cache key from the route path with the canonical path params filled in,
+    followed by the sorted query string and the digest of the normalized body, e.g.
+    /company/IBM.US/historicalPrices?limit_date=100 or /portfolio/carbon-footprint_<md5>
+    """
+    spec = spec or CacheKeySpec()
+
+    def fill(match) -> str:
+        name = match.group(1)
+        if name not in path_params or (spec.path_params is not None and name not in spec.path_params):
+            return '_'
+
+        return normalize_param(name, path_params[name])
+
+    key = _path_param_pattern.sub(fill, route_path)
+
+    query = sorted(
+        (name, normalize_param(name, value))
+        for name, value in query_params
+        if spec.query_params is None or name in spec.query_params
+    )
+    if query:
+        key += '?' + urlencode(query)
+
+    if body and spec.body:
+        normalizer = spec.body if callable(spec.body) else normalize_json_body
+        key += f'_{body_digest(body, normalizer)}'
+
+    return key
+
+
+def _body_tickers(body: Optional[bytes]) -> List[str]:
+    try:
+        data = json.loads(body) if body else None
+    except ValueError:
+        return []
+
+    tickers = data.get('tickers') if isinstance(data, dict) else None
+    if not isinstance(tickers, list):
+        return []
+
+    return [normalize_param('ticker', ticker) for ticker in tickers if isinstance(ticker, str)]
+
+
+def build_cache_tags(route_path: str,
+                     path_params: Mapping[str, Any],
+                     body: Optional[bytes] = None,
+                     datasets: Iterable[str] = ()) -> List[str]:
+    """
+    Tags a cached response is recorded under so it can be invalidated without a key scan:
+    router:<first path segment>, ticker:<ticker> for every ticker in the path or the body,
+    country:<country> and dataset:<dataset> for the tables the response is derived from
+    """
+    tags = set()
+
+    segment = route_path.strip('/').split('/')[0]
+    if segment and not segment.startswith('{'):
+        tags.add(f'router:{segment}')
+
+    for name in _ticker_params:
+        if name in path_params:
+            tags.add(f'ticker:{normalize_param(name, path_params[name])}')
+
+    if 'country' in path_params:
+        tags.add(f'country:{normalize_param("country", path_params["country"])}')
+
+    tags.update(f'ticker:{ticker}' for ticker in _body_tickers(body))
+    tags.update(f'dataset:{dataset}' for dataset in datasets)
+
+    return sorted(tags)
@@ -0,0 +1,120 @@
+import time
+import fnmatch
+from collections import OrderedDict
+from typing import Any, Optional, Tuple
+
+
+class LRUMemoryCache:
+    """
+    Per-worker in-process cache bounded by the total size of the stored values in bytes,
+    by the number of entries, or both. Least recently used entries are evicted first, every
+    entry carries its own expiry.
+    """
+
+    def __init__(self, max_bytes: Optional[int] = None, max_item_bytes: Optional[int] = None,
+                 max_entries: Optional[int] = None):
+        if max_bytes is None and max_entries is None:
+            raise ValueError('LRUMemoryCache needs max_bytes or max_entries')
+
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        # a single huge response should not flush the whole tier
+        if max_item_bytes is None and max_bytes is not None:
+            max_item_bytes = max_bytes // 8
+        self.max_item_bytes = max_item_bytes
+
+        self._entries = OrderedDict()  # key -> (value, size, expires_at)
+        self._size = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    # get the item from cache, expired entries count as a miss
+    def get(self, key: str) -> Tuple[bool, Any]:
+        entry = self._entries.get(key)
+
+        if entry is None:
+            self.misses += 1
+            return False, None
+
+        value, _, expires_at = entry
+        if expires_at <= time.monotonic():
+            self._remove(key)
+            self.misses += 1
+            return False, None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return True, value
+
+    # remaining time to live in seconds, None if the key is not cached
+    def ttl(self, key: str) -> Optional[float]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+
+        remaining = entry[2] - time.monotonic()
+        return remaining if remaining > 0 else None
+
+    # set the item in cache, size is the number of bytes the value accounts for
+    def set(self, key: str, value: Any, expire_after: float, size: int = 0) -> bool:
+        if key in self._entries:
+            self._remove(key)
+
+        if expire_after <= 0 or (self.max_item_bytes is not None and size > self.max_item_bytes):
+            return False
+
+        self._entries[key] = (value, size, time.monotonic() + expire_after)
+        self._size += size
+
+        while ((self.max_bytes is not None and self._size > self.max_bytes)
+               or (self.max_entries is not None and len(self._entries) > self.max_entries)):
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+        return True
+
+    def delete(self, key: str) -> bool:
+        if key not in self._entries:
+            return False
+
+        self._remove(key)
+        return True
+
+    # glob style delete, mirrors the redis pattern delete for the local tier
+    def delete_matching(self, pattern: str) -> int:
+        keys = [key for key in self._entries if fnmatch.fnmatchcase(key, pattern)]
+        for key in keys:
+            self._remove(key)
+
+        return len(keys)
+
+    def clear(self):
+        self._entries.clear()
+        self._size = 0
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+            'evictions': self.evictions,
+            'entries': len(self._entries),
+            'size_bytes': self._size,
+            'max_bytes': self.max_bytes,
+            'max_entries': self.max_entries,
+        }
+
+    def _remove(self, key: str):
+        _, size, _ = self._entries.pop(key)
+        self._size -= size
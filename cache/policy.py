@@ -0,0 +1,56 @@
+import math
+import random
+import time
+from dataclasses import dataclass
+from typing import Optional, Union
+
+
+@dataclass(frozen=True)
+class CachePolicy:
+    """
+    Expiry policy of a cached route, all times are in seconds.
+
+    ttl:       soft time to live, the response is fresh until then
+    stale_ttl: how long after the soft ttl a stale response is still served while it is
+               refreshed in the background, redis drops the entry after ttl + stale_ttl
+    beta:      weight of the probabilistic early refresh, 0 disables it and larger values
+               refresh earlier, scaled by how long the response took to compute
+    public:    whether shared caches (CDNs) may store the response, browsers always may
+    negative_ttl: how long not found and empty responses are cached, without a stale window
+    """
+    ttl: int = 60 * 60
+    stale_ttl: int = 10 * 60
+    beta: float = 1.0
+    public: bool = False
+    negative_ttl: int = 5 * 60
+
+    @property
+    def hard_ttl(self) -> int:
+        return self.ttl + self.stale_ttl
+
+    # a bare number in the expiry config is a hard ttl without a stale window
+    @classmethod
+    def from_config(cls, value: Union[int, 'CachePolicy', None], default: 'CachePolicy') -> 'CachePolicy':
+        if value is None:
+            return default
+        if isinstance(value, CachePolicy):
+            return value
+
+        return cls(ttl=int(value), stale_ttl=0, beta=0.0, negative_ttl=min(int(value), default.negative_ttl))
+
+
+def is_stale(stale_at: Optional[float], now: Optional[float] = None) -> bool:
+    if stale_at is None:
+        return False
+
+    return (now or time.time()) >= stale_at
+
+
+# probabilistic early expiration (XFetch): the closer to the soft expiry and the more
+# expensive the computation, the more likely a single request refreshes the value early
+def should_refresh_early(stale_at: Optional[float], delta: float, beta: float, now: Optional[float] = None) -> bool:
+    if stale_at is None or beta <= 0 or delta <= 0:
+        return False
+
+    now = now or time.time()
+    return now - delta * beta * math.log(1.0 - random.random()) >= stale_at
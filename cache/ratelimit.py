@@ -0,0 +1,69 @@
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Dict, Optional
+from aioredis import RedisError
+from cache.redis import RedisRequestResponseCache
+
+logger = logging.getLogger('RATE_LIMITER')
+
+
+@dataclass(frozen=True)
+class RateLimit:
+    """Token bucket refilled with `rate` tokens per second, holding at most `burst` tokens."""
+    rate: float
+    burst: int
+
+
+@dataclass(frozen=True)
+class RateLimitPolicy:
+    """
+    Limits of a client type. Every request takes a token from the read bucket, cache misses
+    also take the cost of the route from the compute bucket, so expensive analytics run out
+    of compute tokens without starving cached reads.
+    """
+    read: RateLimit
+    compute: RateLimit
+
+
+class RateLimiter:
+    """
+    Token buckets kept in redis, shared by every worker and node, keyed by the email of the
+    token holder. The limiter fails open: while redis is unavailable requests are not limited.
+    """
+
+    def __init__(self, cache: RedisRequestResponseCache, default: RateLimitPolicy,
+                 policies: Optional[Dict[str, RateLimitPolicy]] = None):
+        self._cache = cache
+        self.default = default
+        self.policies = policies or {}
+
+        self.limited = 0
+        self.failed_open = 0
+
+    def policy(self, client_type: Optional[str]) -> RateLimitPolicy:
+        return self.policies.get(client_type, self.default)
+
+    # seconds until the request would be allowed, None if it is allowed now
+    async def check(self, email: str, client_type: Optional[str], bucket: str, cost: int = 1) -> Optional[float]:
+        limit: RateLimit = getattr(self.policy(client_type), bucket)
+
+        try:
+            allowed, retry_after_ms = await self._cache.take_tokens(
+                f'ratelimit:{bucket}:{email}', limit.rate, limit.burst, min(cost, limit.burst))
+        except (RedisError, OSError, asyncio.TimeoutError) as exp:
+            logger.warning(f'Not rate limiting {email}: {exp}')
+            self.failed_open += 1
+            return None
+
+        if allowed:
+            return None
+
+        self.limited += 1
+        return retry_after_ms / 1000
+
+    def stats(self) -> dict:
+        return {
+            'limited': self.limited,
+            'failed_open': self.failed_open,
+        }
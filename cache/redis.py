@@ -1,52 +1,289 @@
+import time
+import uuid
 import aioredis
 import msgpack
 import asyncio
-from typing import List
+from aioredis import RedisError
+from cache.breaker import CircuitBreaker
+from cache.compression import PayloadCompressor
+from typing import AsyncIterator, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple, Any
+
+_DATASET_VERSIONS_KEY = 'cache:dataset_versions'
+_USAGE_PENDING_KEY = 'usage:pending'
+_USAGE_ROLLUP_KEY = 'usage:pending:rollup'
+
+# only delete the lock if we still own it
+_RELEASE_LOCK_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+# token bucket refilled from the redis clock, so every node agrees on the time,
+# returns whether the tokens were taken and otherwise the milliseconds until they are there
+_TAKE_TOKENS_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+
+local clock = redis.call('time')
+local now = clock[1] * 1000 + math.floor(clock[2] / 1000)
+
+local bucket = redis.call('hmget', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(bucket[1]) or burst
+local ts = tonumber(bucket[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate / 1000)
+
+local allowed, retry_after = 0, 0
+if tokens >= cost then
+    tokens = tokens - cost
+    allowed = 1
+else
+    retry_after = math.ceil((cost - tokens) * 1000 / rate)
+end
+
+redis.call('hset', KEYS[1], 'tokens', tostring(tokens), 'ts', now)
+redis.call('pexpire', KEYS[1], math.ceil(burst * 1000 / rate) + 1000)
+return {allowed, retry_after}
+"""
+
+
+class CircuitOpenError(RedisError):
+    pass
 
 
 class RedisRequestResponseCache:
-    def __init__(self, url: str):
+    def __init__(self, url: str, compressor: Optional[PayloadCompressor] = None,
+                 breaker: Optional[CircuitBreaker] = None, timeout: float = 2.0,
+                 tag_expire_after: int = 7 * 24 * 60 * 60, batch_size: int = 500):
         self._redis = aioredis.from_url(url,
                                         max_connections=200,
                                         socket_timeout=2,
                                         socket_connect_timeout=2,
                                         retry_on_timeout=False
                                         )
+        self.compressor = compressor or PayloadCompressor(codec='none')
+        self.breaker = breaker or CircuitBreaker('redis')
+        self.timeout = timeout
+        self.tag_expire_after = tag_expire_after
+        self.batch_size = batch_size
+
+        self.hits = 0
+        self.misses = 0
+
+    # every call goes through the circuit breaker, while it is open redis is not touched at all
+    async def _call(self, make_call: Callable[[], Awaitable[Any]], timeout: Optional[float] = None) -> Any:
+        if not self.breaker.allow():
+            raise CircuitOpenError('redis circuit is open')
+
+        try:
+            result = await asyncio.wait_for(make_call(), timeout=timeout or self.timeout)
+        except (RedisError, OSError, asyncio.TimeoutError):
+            self.breaker.record_failure()
+            raise
+        except BaseException:
+            self.breaker.record_abandoned()
+            raise
+
+        self.breaker.record_success()
+        return result
 
     # checks if the key is in cache
     async def contains(self, key):
-        return await self._redis.exists(key)
+        return await self._call(lambda: self._redis.exists(key))
 
     # get the item from cache
     async def get(self, item):
+        exists, content, _ = await self.get_with_ttl(item)
+        return exists, content
+
+    # get the item from cache together with its remaining time to live in seconds
+    async def get_with_ttl(self, item) -> Tuple[bool, Any, Optional[float]]:
         try:
-            cached_response = await asyncio.wait_for(self._redis.get(item), timeout=2.0)
-        except asyncio.TimeoutError:
-            return False, None
+            pipe = self._redis.pipeline(transaction=False)
+            pipe.get(item)
+            pipe.pttl(item)
+            cached_response, pttl = await self._call(pipe.execute)
+        except (RedisError, OSError, asyncio.TimeoutError):
+            self.misses += 1
+            return False, None, None
 
         if cached_response is None:
-            return False, None
+            self.misses += 1
+            return False, None, None
 
-        return True, msgpack.unpackb(cached_response, raw=False)
+        self.hits += 1
+        ttl = pttl / 1000 if pttl is not None and pttl > 0 else None
+        return True, msgpack.unpackb(self.compressor.decode(cached_response), raw=False), ttl
 
-    # set the item in cache
+    # set the item in cache and record the key in the sorted set of every tag, scored by the
+    # expiry of the key so the members that expired are pruned on every write
     async def set(self, key, value, **kwargs):
         expire_after = kwargs.get('expire_after', 24 * 60 * 60)  # default of 1 day expiry
+        tags = kwargs.get('tags', ())
         serialized_value = msgpack.packb(value, use_bin_type=True)
+        if kwargs.get('compress', True):
+            serialized_value = self.compressor.encode(serialized_value)
+
+        now = time.time()
+        pipe = self._redis.pipeline(transaction=False)
+        pipe.setex(key, expire_after, serialized_value)
+        for tag in tags:
+            pipe.zadd(f'tags:{tag}', {key: now + expire_after})
+            pipe.zremrangebyscore(f'tags:{tag}', '-inf', now)
+            pipe.expire(f'tags:{tag}', max(expire_after, self.tag_expire_after))
 
         try:
-            await asyncio.wait_for(self._redis.setex(key, expire_after, serialized_value), timeout=2.0)
-        except asyncio.TimeoutError:
+            await self._call(pipe.execute)
+        except (RedisError, OSError, asyncio.TimeoutError):
             pass
 
+    # try to take a short lived lock, returns the owner token or None if someone else holds it
+    async def acquire_lock(self, key: str, expire_after: int) -> Optional[str]:
+        token = uuid.uuid4().hex
+        acquired = await self._call(lambda: self._redis.set(f'lock:{key}', token, nx=True, ex=expire_after))
+
+        return token if acquired else None
+
+    async def release_lock(self, key: str, token: str):
+        await self._call(lambda: self._redis.eval(_RELEASE_LOCK_SCRIPT, 1, f'lock:{key}', token))
+
+    async def is_locked(self, key: str) -> bool:
+        return await self._call(lambda: self._redis.exists(f'lock:{key}')) > 0
+
+    # returns whether the tokens were taken and otherwise the milliseconds until they are available
+    async def take_tokens(self, key: str, rate: float, burst: int, cost: int) -> Tuple[bool, int]:
+        allowed, retry_after = await self._call(
+            lambda: self._redis.eval(_TAKE_TOKENS_SCRIPT, 1, key, rate, burst, cost))
+
+        return bool(allowed), int(retry_after)
+
+    # current version of every dataset that was bumped at least once
+    async def get_dataset_versions(self) -> Dict[str, int]:
+        versions = await self._call(lambda: self._redis.hgetall(_DATASET_VERSIONS_KEY))
+        return {dataset.decode('utf-8'): int(version) for dataset, version in versions.items()}
+
+    # bumping a version moves every cached response derived from the dataset to new keys
+    async def bump_dataset_versions(self, datasets: Iterable[str]) -> Dict[str, int]:
+        datasets = list(datasets)
+
+        pipe = self._redis.pipeline(transaction=True)
+        for dataset in datasets:
+            pipe.hincrby(_DATASET_VERSIONS_KEY, dataset, 1)
+
+        versions = await self._call(pipe.execute)
+        return dict(zip(datasets, versions))
+
+    # the monthly totals answer usage reads, the pending deltas are rolled up into postgres.
+    # A baseline starts the total of an email that is not counted yet, HSETNX and HINCRBY run in
+    # the same transaction so no other worker can create the field in between
+    async def incr_usage(self, rows: Iterable[Tuple[str, str, int, int]], expire_after: int,
+                         baselines: Optional[Dict[Tuple[str, str, int], int]] = None):
+        pipe = self._redis.pipeline(transaction=True)
+        totals = set()
+
+        for email, month, year, count in rows:
+            baseline = (baselines or {}).get((email, month, year))
+            if baseline:
+                pipe.hsetnx(f'usage:{year}:{month}', email, baseline)
+            pipe.hincrby(f'usage:{year}:{month}', email, count)
+            pipe.hincrby(_USAGE_PENDING_KEY, f'{year}:{month}:{email}', count)
+            totals.add(f'usage:{year}:{month}')
+
+        for key in totals:
+            pipe.expire(key, expire_after)
+
+        await self._call(pipe.execute)
+
+    async def get_usage(self, email: str, month: str, year: int) -> Optional[int]:
+        count = await self._call(lambda: self._redis.hget(f'usage:{year}:{month}', email))
+        return int(count) if count is not None else None
+
+    # moves the pending deltas aside for the rollup, a batch left by a failed rollup comes first
+    async def take_pending_usage(self) -> List[Tuple[str, str, int, int]]:
+        if not await self._call(lambda: self._redis.exists(_USAGE_ROLLUP_KEY)):
+            if not await self._call(lambda: self._redis.exists(_USAGE_PENDING_KEY)):
+                return []
+            await self._call(lambda: self._redis.rename(_USAGE_PENDING_KEY, _USAGE_ROLLUP_KEY))
+
+        pending = await self._call(lambda: self._redis.hgetall(_USAGE_ROLLUP_KEY))
+
+        rows = []
+        for field, count in pending.items():
+            year, month, email = field.decode('utf-8').split(':', 2)
+            rows.append((email, month, int(year), int(count)))
+
+        return rows
+
+    async def ack_pending_usage(self):
+        await self._call(lambda: self._redis.unlink(_USAGE_ROLLUP_KEY))
+
     async def close(self):
         await self._redis.close()
 
-    # bulk delete keys
+    # keys are unlinked in batches as they are walked, so redis is never blocked
+    async def _unlink(self, keys: AsyncIterator[bytes]) -> List[bytes]:
+        deleted, batch = [], []
+
+        async for key in keys:
+            batch.append(key)
+
+            if len(batch) >= self.batch_size:
+                await self._call(lambda: self._redis.unlink(*batch))
+                deleted.extend(batch)
+                batch = []
+
+        if batch:
+            await self._call(lambda: self._redis.unlink(*batch))
+            deleted.extend(batch)
+
+        return deleted
+
+    # every page of a SCAN family command goes through _call, so a stalled walk trips the breaker
+    async def _scan(self, scan_page: Callable[[int], Awaitable[Tuple[int, list]]]) -> AsyncIterator[Any]:
+        cursor = 0
+        while True:
+            cursor, items = await self._call(lambda: scan_page(cursor))
+            for item in items:
+                yield item
+
+            if cursor == 0:
+                return
+
+    async def _live_tag_members(self, tag: str) -> AsyncIterator[bytes]:
+        await self._call(lambda: self._redis.zremrangebyscore(f'tags:{tag}', '-inf', time.time()))
+
+        async for key, _ in self._scan(lambda cursor: self._redis.zscan(f'tags:{tag}', cursor,
+                                                                        count=self.batch_size)):
+            yield key
+
+        # plain sets written before the members were scored, they expire after tag_expire_after
+        async for key in self._scan(lambda cursor: self._redis.sscan(f'tag:{tag}', cursor, count=self.batch_size)):
+            yield key
+
+    # bulk delete keys, the keyspace is walked incrementally
     async def delete(self, pattern: str) -> List[str]:
-        keys = await self._redis.keys(pattern)
+        deleted = await self._unlink(self._scan(lambda cursor: self._redis.scan(cursor, match=pattern,
+                                                                               count=self.batch_size)))
+        return [key.decode('utf-8') for key in deleted]
+
+    # delete every key recorded under the tags, e.g. ticker:IBM.US or dataset:carbon
+    async def delete_tags(self, tags: List[str]) -> List[str]:
+        deleted = []
+
+        for tag in tags:
+            deleted.extend(await self._unlink(self._live_tag_members(tag)))
+            await self._call(lambda: self._redis.unlink(f'tags:{tag}', f'tag:{tag}'))
 
-        if len(keys) > 0:
-            await self._redis.delete(*keys)
+        return [key.decode('utf-8') for key in deleted]
 
-        return keys
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+            'compression': self.compressor.stats(),
+            'breaker': self.breaker.stats(),
+        }
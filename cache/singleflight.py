@@ -0,0 +1,82 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Tuple
+
+logger = logging.getLogger('SINGLE_FLIGHT')
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls for the same key: the first caller (the leader) runs the
+    computation, every caller arriving while it is in flight (the followers) waits for its result.
+    Followers wait at most `timeout` seconds and run the computation themselves if the
+    leader fails, is cancelled or takes too long.
+    """
+
+    def __init__(self, timeout: float = 10.0):
+        self.timeout = timeout
+        self._calls: Dict[str, asyncio.Future] = {}
+
+        self.leaders = 0
+        self.shared = 0
+        self.fallbacks = 0
+
+    def __len__(self):
+        return len(self._calls)
+
+    def in_flight(self, key: str) -> bool:
+        return key in self._calls
+
+    # returns the result and whether it was shared from another caller
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        in_flight = self._calls.get(key)
+
+        if in_flight is not None:
+            try:
+                result = await asyncio.wait_for(asyncio.shield(in_flight), timeout=self.timeout)
+                self.shared += 1
+                return result, True
+
+            except asyncio.CancelledError:
+                # our own cancellation has to propagate, a cancelled leader means fall back
+                if not in_flight.cancelled():
+                    raise
+                logger.warning(f'Leader for {key} was cancelled, computing the value in the follower')
+
+            except asyncio.TimeoutError:
+                logger.warning(f'Timed out after {self.timeout}s waiting for the leader of {key}')
+
+            except Exception as exp:
+                logger.warning(f'Leader for {key} failed ({exp}), computing the value in the follower')
+
+            self.fallbacks += 1
+            return await fn(), False
+
+        future = asyncio.get_event_loop().create_future()
+        self._calls[key] = future
+        self.leaders += 1
+
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as exp:
+            future.set_exception(exp)
+            # mark the exception as retrieved, there may be no followers to consume it
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result, False
+        finally:
+            if self._calls.get(key) is future:
+                del self._calls[key]
+
+    def stats(self) -> dict:
+        return {
+            'in_flight': len(self._calls),
+            'leaders': self.leaders,
+            'shared': self.shared,
+            'fallbacks': self.fallbacks,
+        }
@@ -0,0 +1,91 @@
+import time
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, Iterable, Optional, Set
+from aioredis import RedisError
+from cache.redis import RedisRequestResponseCache
+from cache.singleflight import SingleFlight
+
+logger = logging.getLogger('DATASET_VERSIONS')
+
+
+class DatasetVersions:
+    """
+    Per-worker view of the dataset versions kept in redis. The versions are reloaded at most
+    every `refresh_interval` seconds so that stamping a cache key costs no network roundtrip,
+    a bump is therefore picked up by all workers within that interval.
+
+    `reloaders` maps a dataset to the reload of a per-worker copy derived from it, e.g. the
+    reference data of general. After a bump the keys keep the old version of the dataset until
+    the reload succeeded, so no response computed from the old copy is cached under the new one.
+    """
+
+    def __init__(self, cache: RedisRequestResponseCache, refresh_interval: float = 5.0,
+                 reloaders: Optional[Dict[str, Callable[[], Awaitable[bool]]]] = None):
+        self._cache = cache
+        self._refresh_interval = refresh_interval
+        self._flight = SingleFlight(timeout=2.0)
+        self._reloaders = reloaders or {}
+
+        self._versions: Dict[str, int] = {}
+        self._loaded_at = None
+        self._reloading: Set[str] = set()
+
+    async def _load(self):
+        try:
+            versions = await self._cache.get_dataset_versions()
+        except (RedisError, OSError, asyncio.TimeoutError) as exp:
+            # keep serving with the versions we know, retry after the interval
+            logger.error(f'Failed to load the dataset versions: {exp}')
+        else:
+            # on the first load the copies are loading on their own already
+            if self._loaded_at is not None:
+                self._reload_changed(versions)
+            self._versions = versions
+
+        self._loaded_at = time.monotonic()
+
+    # the changed datasets keep their old version until their copy is reloaded
+    def _reload_changed(self, versions: Dict[str, int]):
+        for dataset in self._reloaders:
+            version = versions.get(dataset, 0)
+            if version == self._versions.get(dataset, 0):
+                continue
+
+            versions[dataset] = self._versions.get(dataset, 0)
+
+            if dataset not in self._reloading:
+                self._reloading.add(dataset)
+                asyncio.get_event_loop().create_task(self._reload(dataset, version))
+
+    async def _reload(self, dataset: str, version: int):
+        try:
+            if await self._reloaders[dataset]():
+                self._versions[dataset] = version
+            else:
+                logger.warning(f'Could not reload the {dataset} dataset, retrying on the next refresh')
+        except Exception as exp:
+            logger.error(f'Failed to reload the {dataset} dataset: {exp}')
+        finally:
+            self._reloading.discard(dataset)
+
+    async def get(self, datasets: Iterable[str]) -> Dict[str, int]:
+        if self._loaded_at is None or time.monotonic() - self._loaded_at >= self._refresh_interval:
+            await self._flight.do('versions', self._load)
+
+        return {dataset: self._versions.get(dataset, 0) for dataset in datasets}
+
+    # the suffix appended to the cache key, e.g. @carbon:3,general:1
+    async def stamp(self, datasets: Iterable[str]) -> str:
+        versions = await self.get(sorted(set(datasets)))
+        if not versions:
+            return ''
+
+        return '@' + ','.join(f'{dataset}:{version}' for dataset, version in versions.items())
+
+    async def bump(self, datasets: Iterable[str]) -> Dict[str, int]:
+        versions = await self._cache.bump_dataset_versions(datasets)
+        changed = {**self._versions, **versions}
+        self._reload_changed(changed)
+        self._versions = changed
+        return versions
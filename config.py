@@ -1,5 +1,6 @@
 import os
 from os.path import dirname, join
+from typing import Optional
 from pydantic import BaseSettings
 from dotenv import load_dotenv
 
@@ -14,11 +15,75 @@ class Config(BaseSettings):
     postgres_user: str
     postgres_password: str
     postgres_log_db_name: str
+    # numeric columns of the main database decoded as decimal or float
+    postgres_numeric_format: str = 'float'
     redis_server: str
     firebase_api_key: str
     # jwt_key: str
     rock_url: str
     rock_api_key: str
 
+    # per-worker in-memory tier in front of redis
+    memory_cache_max_bytes: int = 64 * 1024 * 1024
+    memory_cache_max_ttl: int = 60  # seconds, bounds staleness after a redis delete
+
+    # cache miss coalescing, the redis lock extends it across workers and nodes
+    cache_coalesce_timeout: float = 10.0
+    cache_distributed_lock: bool = False
+    cache_lock_ttl: int = 30
+    cache_lock_poll_interval: float = 0.05
+
+    # redis calls time out after cache_redis_timeout seconds, after a number of consecutive
+    # failures redis is bypassed for the recovery timeout before it is probed again
+    cache_redis_timeout: float = 2.0
+    cache_breaker_failure_threshold: int = 5
+    cache_breaker_recovery_timeout: float = 30.0
+
+    # how often each worker reloads the dataset versions stamped into the cache keys
+    cache_version_refresh_interval: float = 5.0
+
+    # not found and empty responses, unknown tickers are rejected from the reference data
+    cache_negative_ttl: int = 5 * 60
+
+    # how often each worker reloads its copy of company."General"
+    reference_data_refresh_interval: int = 60 * 60
+
+    # how often each worker reloads the company search index
+    search_index_refresh_interval: int = 60 * 60
+
+    # how often each worker runs the refresh of the dirty industry aggregates
+    industry_aggregates_refresh_interval: float = 60.0
+
+    # redis payload compression: zlib, lz4, zstd or none
+    cache_compression: str = 'zlib'
+    cache_compression_threshold: int = 1024  # bytes
+    cache_compression_level: Optional[int] = None
+
+    # cached bodies above the threshold are stored gzip (and brotli) encoded for the clients
+    response_compression_threshold: int = 1024  # bytes
+    response_compression_brotli: bool = True
+
+    # api usage counts are flushed to redis in batches, at most usage_max_pending are lost on a crash,
+    # and rolled up into postgres by one worker every usage_rollup_interval seconds
+    usage_flush_interval: float = 1.0
+    usage_max_pending: int = 1000
+    usage_rollup_interval: float = 60.0
+
+    # token buckets per email: every request takes a read token, cache misses also take the cost
+    # of the route in compute tokens, rates are tokens per second
+    rate_limit_enabled: bool = True
+    rate_limit_read_rate: float = 20.0
+    rate_limit_read_burst: int = 200
+    rate_limit_compute_rate: float = 1.0
+    rate_limit_compute_burst: int = 60
+    user_profile_ttl: int = 5 * 60
+
+    # company.user_profile.client_type allowed to invalidate the cache and reload the reference data
+    admin_client_type: str = 'admin'
+
+    # decoded jwt tokens are memoized per worker
+    jwt_cache_ttl: int = 5 * 60
+    jwt_cache_max_entries: int = 10000
+
 
 config = Config()
@@ -1,18 +1,81 @@
+import time
 import asyncpg
+from functools import partial
+from typing import Dict, NamedTuple
+
+# how the numeric columns of a pool are decoded, a query needing the exact text casts the
+# column with ::text, text columns would break the pandas code of the models
+NUMERIC_FORMATS = ('decimal', 'float')
+
+
+class Query(NamedTuple):
+    """
+    A statement defined once with $n parameters. Its text never changes between calls, so
+    asyncpg reuses the statement prepared on each connection instead of planning it again.
+    """
+    name: str
+    sql: str
+
+
+async def set_numeric_codec(con, numeric: str):
+    if numeric != 'float':
+        return
+
+    # the text format keeps 'NaN', parameters are sent as text too
+    await con.set_type_codec('numeric', schema='pg_catalog', encoder=str, decoder=float, format='text')
+
+
+class QueryStats:
+    __slots__ = ('calls', 'errors', 'rows', 'total_seconds', 'max_seconds')
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.rows = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+
+    def record(self, seconds: float, rows: int):
+        self.calls += 1
+        self.rows += rows
+        self.total_seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+
+    def as_dict(self) -> dict:
+        return {
+            'calls': self.calls,
+            'errors': self.errors,
+            'rows': self.rows,
+            'avg_ms': round(self.total_seconds * 1000 / self.calls, 3) if self.calls else None,
+            'max_ms': round(self.max_seconds * 1000, 3),
+        }
 
 
 class Database:
-    def __init__(self, database: str, user: str, password: str, host: str, port: int = 5432):
+    """
+    asyncpg pool of one database, numeric columns are decoded as `numeric` on every connection
+    of the pool.
+    """
+
+    def __init__(self, database: str, user: str, password: str, host: str, port: int = 5432,
+                 statement_cache_size: int = 256, numeric: str = 'decimal'):
+        if numeric not in NUMERIC_FORMATS:
+            raise ValueError(f'Unknown numeric format {numeric}, expected one of {NUMERIC_FORMATS}')
+
         self.user = user
         self.password = password
         self.host = host
         self.port = port
         self.database = database
+        self.statement_cache_size = statement_cache_size
+        self.numeric = numeric
         self._cursor = None
 
         self._connection_pool = None
         self.con = None
 
+        self._query_stats: Dict[str, QueryStats] = {}
+
     async def connect(self):
         if not self._connection_pool:
             try:
@@ -25,6 +88,8 @@ class Database:
                     user=self.user,
                     password=self.password,
                     database=self.database,
+                    statement_cache_size=self.statement_cache_size,
+                    init=partial(set_numeric_codec, numeric=self.numeric),
                 )
 
             except Exception as e:
@@ -64,3 +129,41 @@ class Database:
                 print(e)
             finally:
                 await self._connection_pool.release(con)
+
+    # named queries are timed per name, errors are logged like in fetch_rows
+    async def fetch(self, query: Query, *args):
+        if not self._connection_pool:
+            await self.connect()
+
+        stats = self._query_stats.get(query.name)
+        if stats is None:
+            stats = self._query_stats[query.name] = QueryStats()
+
+        # the database is unreachable, connect logged why
+        if not self._connection_pool:
+            stats.errors += 1
+            return None
+
+        async with self._connection_pool.acquire() as con:
+            started = time.perf_counter()
+            try:
+                result = await con.fetch(query.sql, *args)
+            except Exception as e:
+                stats.errors += 1
+                print(f'{query.name}: {e}')
+                return None
+
+            stats.record(time.perf_counter() - started, len(result))
+            return result
+
+    def query_stats(self) -> dict:
+        return {name: stats.as_dict() for name, stats in sorted(self._query_stats.items())}
+
+    # unlike execute, errors are raised so the caller can retry the batch
+    async def execute_many(self, query: str, args):
+        if not self._connection_pool:
+            await self.connect()
+
+        async with self._connection_pool.acquire() as con:
+            async with con.transaction():
+                await con.executemany(query, args)
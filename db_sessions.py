@@ -5,7 +5,8 @@ main_db_instance = Database(
     database=config.postgres_main_db_name,
     host=config.postgres_server,
     user=config.postgres_user,
-    password=config.postgres_password
+    password=config.postgres_password,
+    numeric=config.postgres_numeric_format
 )
 
 log_db_instance = Database(
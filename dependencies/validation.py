@@ -1,8 +1,35 @@
-from fastapi import HTTPException, Header
-from utils import validate_token
+from typing import Optional
+from fastapi import HTTPException, Header, Request
+from utils import validate_token, user_profiles
+from config import config
 
 
-def validate_token_dependency(authorization: str = Header('')):
-    is_valid, _ = validate_token(authorization)
+# claims of the bearer token, verified once per request and kept on request.state
+def token_claims(request: Request, authorization: str) -> Optional[dict]:
+    claims = getattr(request.state, 'token_claims', None)
+    if claims is not None:
+        return claims
+
+    is_valid, claims = validate_token(authorization)
     if not is_valid:
+        return None
+
+    request.state.token_claims = claims
+    return claims
+
+
+def validate_token_dependency(request: Request, authorization: str = Header('')):
+    claims = token_claims(request, authorization)
+    if claims is None:
         raise HTTPException(status_code=401, detail='Invalid token')
+
+    return claims
+
+
+# the cache administration endpoints are reserved to the admin client type of company.user_profile
+async def admin_dependency(request: Request, authorization: str = Header('')):
+    claims = validate_token_dependency(request, authorization)
+    if await user_profiles.client_type(claims['email']) != config.admin_client_type:
+        raise HTTPException(status_code=403, detail='Admin access required')
+
+    return claims
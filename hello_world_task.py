@@ -2,6 +2,7 @@ from db_sessions import main_db_instance
 from fastapi.encoders import jsonable_encoder
 import asyncio
 from batch_jobs import proddatadownload_v2 as downloadMarketData
+from cache.apiroute import bump_dataset_versions
 
 async def hello_world_task():
     await main_db_instance.connect()
@@ -15,6 +16,9 @@ async def hello_world_task():
 
     downloadMarketData()
 
+    # cached responses built on the old prices move to new keys and age out
+    await bump_dataset_versions(['eodprice'])
+
     await main_db_instance.disconnect()
 
 loop = asyncio.get_event_loop()
@@ -9,18 +9,21 @@ from fastapi.encoders import jsonable_encoder
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 
-from cache.apiroute import CachingLayerRoute, _redis
+from aggregates import AggregateRefresher
+from cache.apiroute import CachingLayerRoute, _redis, bump_dataset_versions
 from config import config
 from db_sessions import main_db_instance
 from domain import ModelItem
 from http_client import http_client
+import named_queries as queries
 from models_logic import \
     get_fund_holdings_weights, \
-    get_fund_data, search_company, \
+    get_fund_data, \
     get_company_chart_endpoints, \
     get_portfolio_chart_endpoints
-from routers import fund, company, portfolio, country, user, userinfo
+from routers import fund, company, portfolio, country, user, userinfo, cache, usage, search
 from sql_queries import get_tables_string
+from utils import usage_counter, usage_store
 
 app = FastAPI()
 origins = [
@@ -52,10 +55,39 @@ app.include_router(country.router)
 app.include_router(portfolio.router)
 app.include_router(user.router)
 app.include_router(userinfo.router)
+app.include_router(cache.router)
+app.include_router(usage.router)
+app.include_router(search.router)
 
 
 logging.basicConfig(level=logging.INFO)
 
+# the industry aggregates and global scores changed by the data loads are recomputed in the background
+industry_aggregates = AggregateRefresher(
+    main_db_instance,
+    queries.refresh_industry_carbon,
+    refresh_interval=config.industry_aggregates_refresh_interval,
+    datasets=['industry_aggregates'],
+    on_refresh=bump_dataset_versions,
+)
+
+
+@app.on_event("startup")
+async def start_aggregate_refresh():
+    industry_aggregates.start()
+
+
+@app.on_event("shutdown")
+async def stop_aggregate_refresh():
+    await industry_aggregates.close()
+
+
+# write the buffered api usage counts before the worker exits
+@app.on_event("shutdown")
+async def flush_usage_counter():
+    await usage_counter.close()
+    await usage_store.close()
+
 #
 # # catch all exceptions
 # async def catch_exceptions_middleware(request: Request, call_next):
@@ -136,14 +168,6 @@ logging.basicConfig(level=logging.INFO)
 #     return jsonable_encoder(result_data)
 #
 #
-# @app.get("/search/{search_name}")
-# async def get_search_names(
-#         search_name: str,
-# ):
-#     results = await search_company(search_name)
-#     return jsonable_encoder(results)
-#
-#
 # @app.get("/website/company/endpoints")
 # async def get_all_endpoints_controller():
 #     endpoints = await get_company_chart_endpoints()
@@ -0,0 +1,35 @@
+from logging.config import fileConfig
+
+from alembic import context
+from sqlalchemy import create_engine
+
+from config import config as app_config
+
+alembic_config = context.config
+fileConfig(alembic_config.config_file_name)
+
+url = f'postgresql://{app_config.postgres_user}:{app_config.postgres_password}' \
+      f'@{app_config.postgres_server}/{app_config.postgres_main_db_name}'
+
+
+def run_migrations_offline():
+    context.configure(url=url, target_metadata=None, literal_binds=True)
+
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online():
+    engine = create_engine(url)
+
+    with engine.connect() as connection:
+        context.configure(connection=connection, target_metadata=None)
+
+        with context.begin_transaction():
+            context.run_migrations()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
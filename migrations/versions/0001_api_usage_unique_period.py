@@ -0,0 +1,44 @@
+"""one api_usage row per email and month, required by the batched usage upsert
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18
+"""
+from alembic import op
+
+revision = '0001'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # the select-then-insert counter could race and insert duplicates, merge them first
+    op.execute("""
+        update company.api_usage u
+        set count = d.total
+        from (
+            select email, month, year, sum(count) as total
+            from company.api_usage
+            group by email, month, year
+            having count(*) > 1
+        ) d
+        where u.email = d.email and u.month = d.month and u.year = d.year
+          and not exists (
+            select 1 from company.api_usage k
+            where k.email = u.email and k.month = u.month and k.year = u.year and k.ctid < u.ctid
+          )
+    """)
+    op.execute("""
+        delete from company.api_usage u
+        using company.api_usage k
+        where u.email = k.email and u.month = k.month and u.year = k.year and u.ctid > k.ctid
+    """)
+    op.execute("""
+        create unique index if not exists api_usage_email_month_year_key
+        on company.api_usage (email, month, year)
+    """)
+
+
+def downgrade():
+    op.execute("drop index if exists company.api_usage_email_month_year_key")
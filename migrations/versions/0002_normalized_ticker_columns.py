@@ -0,0 +1,50 @@
+"""normalized ticker and country columns with btree indexes
+
+The queries used to compare upper(ticker) or REPLACE(upper(country), ' ', '') on every row,
+which no plain index can serve. The normalized values are stored generated columns, so they
+stay in sync with every insert and update of the batch jobs.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18
+"""
+from alembic import op
+
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+# table, normalized column, expression, index columns
+_columns = [
+    ('carbon', 'ticker_norm', "upper(ticker)", 'ticker_norm, year'),
+    ('"General"', 'ticker_norm', "upper(ticker)", 'ticker_norm'),
+    ('"financials_Income_Statement_yearly"', 'ticker_norm', "upper(ticker)", 'ticker_norm'),
+    ('fund_data', 'ticker_norm', "upper(ticker)", 'ticker_norm'),
+    ('"fund_Holdings"', 'ticker_norm', "upper(ticker)", 'ticker_norm'),
+    ('country_emissions', 'country_norm', "replace(upper(country), ' ', '')", 'country_norm'),
+    ('tax_regimes', 'countryname_norm', "replace(upper(countryname), ' ', '')", 'countryname_norm'),
+]
+
+
+def _index_name(table: str, column: str) -> str:
+    return f'{table.strip(chr(34)).lower()}_{column}_idx'
+
+
+def upgrade():
+    for table, column, expression, index_columns in _columns:
+        op.execute(f'alter table company.{table} '
+                   f'add column if not exists {column} text generated always as ({expression}) stored')
+        op.execute(f'create index if not exists {_index_name(table, column)} '
+                   f'on company.{table} ({index_columns})')
+
+    # industry lookups of the industry aggregates
+    op.execute('create index if not exists general_industry_idx on company."General" (industry)')
+
+
+def downgrade():
+    op.execute('drop index if exists company.general_industry_idx')
+
+    for table, column, _, _ in reversed(_columns):
+        op.execute(f'drop index if exists company.{_index_name(table, column)}')
+        op.execute(f'alter table company.{table} drop column if exists {column}')
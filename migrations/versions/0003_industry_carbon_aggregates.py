@@ -0,0 +1,226 @@
+"""industry by year carbon aggregates, refreshed incrementally
+
+The industry endpoints grouped all of company.carbon by year for the tickers of one industry
+on every request. company.industry_carbon_yearly keeps those aggregates per (industry, year).
+Statement triggers on carbon, the income statements and "General" mark the affected
+(industry, year) keys in company.industry_carbon_dirty, and
+company.refresh_industry_carbon_yearly() recomputes only the marked keys.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18
+"""
+from alembic import op
+
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+# table, function marking the keys of its changed rows
+_marked_tables = [
+    ('carbon', 'industry_carbon_mark_carbon'),
+    ('"financials_Income_Statement_yearly"', 'industry_carbon_mark_financials'),
+    ('"General"', 'industry_carbon_mark_general'),
+]
+
+# the rows of the transition table as (industry, year) keys, the table is new_rows or old_rows
+_mark_keys = {
+    'industry_carbon_mark_carbon': """
+        select distinct g.industry, r.year::integer
+        from {rows} r
+        join company."General" g on g.ticker_norm = upper(r.ticker)
+        where g.industry is not null and r.year is not null
+    """,
+    'industry_carbon_mark_financials': """
+        select distinct g.industry, extract(year from r.date)::integer
+        from {rows} r
+        join company."General" g on g.ticker_norm = upper(r.ticker)
+        where g.industry is not null and r.date is not null
+    """,
+    # a ticker moving industries changes every year of both industries
+    'industry_carbon_mark_general': """
+        select distinct r.industry, c.year::integer
+        from {rows} r
+        join company.carbon c on c.ticker_norm = upper(r.ticker)
+        where r.industry is not null and c.year is not null
+    """,
+}
+
+
+def _mark_function(name: str) -> str:
+    keys = _mark_keys[name]
+    return f"""
+        create or replace function company.{name}() returns trigger
+        language plpgsql as $$
+        begin
+            if TG_OP in ('INSERT', 'UPDATE') then
+                insert into company.industry_carbon_dirty (industry, year)
+                {keys.format(rows='new_rows')}
+                on conflict do nothing;
+            end if;
+
+            if TG_OP in ('UPDATE', 'DELETE') then
+                insert into company.industry_carbon_dirty (industry, year)
+                {keys.format(rows='old_rows')}
+                on conflict do nothing;
+            end if;
+
+            return null;
+        end;
+        $$
+    """
+
+
+def _table_name(table: str) -> str:
+    return table.strip('"').lower()
+
+
+def upgrade():
+    op.execute("""
+        create table if not exists company.industry_carbon_yearly (
+            industry text not null,
+            year integer not null,
+            carbon_sum numeric,
+            carbon_avg numeric,
+            carbon_max numeric,
+            carbon_min numeric,
+            carbon_count integer not null,
+            -- carbon and cost of goods sold of the companies with an income statement that year
+            cogs_sum numeric,
+            cogs_carbon_sum numeric,
+            cogs_carbon_avg numeric,
+            cogs_count integer not null,
+            refreshed_at timestamptz not null default now(),
+            primary key (industry, year)
+        )
+    """)
+    op.execute("""
+        create table if not exists company.industry_carbon_dirty (
+            industry text not null,
+            year integer not null,
+            primary key (industry, year)
+        )
+    """)
+
+    for name in _mark_keys:
+        op.execute(_mark_function(name))
+
+    # truncate fires no row triggers, every key may have changed
+    op.execute("""
+        create or replace function company.industry_carbon_mark_all() returns trigger
+        language plpgsql as $$
+        begin
+            insert into company.industry_carbon_dirty (industry, year)
+            select industry, year from company.industry_carbon_yearly
+            on conflict do nothing;
+
+            return null;
+        end;
+        $$
+    """)
+
+    for table, function in _marked_tables:
+        name = _table_name(table)
+        op.execute(f"""
+            create trigger {name}_industry_carbon_insert after insert on company.{table}
+            referencing new table as new_rows
+            for each statement execute function company.{function}()
+        """)
+        op.execute(f"""
+            create trigger {name}_industry_carbon_update after update on company.{table}
+            referencing old table as old_rows new table as new_rows
+            for each statement execute function company.{function}()
+        """)
+        op.execute(f"""
+            create trigger {name}_industry_carbon_delete after delete on company.{table}
+            referencing old table as old_rows
+            for each statement execute function company.{function}()
+        """)
+        op.execute(f"""
+            create trigger {name}_industry_carbon_truncate after truncate on company.{table}
+            for each statement execute function company.industry_carbon_mark_all()
+        """)
+
+    # returns the number of (industry, year) keys refreshed, 0 when another session is refreshing
+    op.execute("""
+        create or replace function company.refresh_industry_carbon_yearly() returns integer
+        language plpgsql as $$
+        declare
+            industries text[];
+            years integer[];
+        begin
+            if not pg_try_advisory_xact_lock(hashtext('company.industry_carbon_yearly')) then
+                return 0;
+            end if;
+
+            -- keys marked while this refresh runs are left for the next one
+            with claimed as (
+                delete from company.industry_carbon_dirty returning industry, year
+            )
+            select array_agg(industry), array_agg(year) into industries, years from claimed;
+
+            if industries is null then
+                return 0;
+            end if;
+
+            delete from company.industry_carbon_yearly a
+            using unnest(industries, years) as k(industry, year)
+            where a.industry = k.industry and a.year = k.year;
+
+            insert into company.industry_carbon_yearly (
+                industry, year, carbon_sum, carbon_avg, carbon_max, carbon_min, carbon_count,
+                cogs_sum, cogs_carbon_sum, cogs_carbon_avg, cogs_count
+            )
+            select k.industry, k.year, t.carbon_sum, t.carbon_avg, t.carbon_max, t.carbon_min, t.carbon_count,
+                   f.cogs_sum, f.cogs_carbon_sum, f.cogs_carbon_avg, f.cogs_count
+            from unnest(industries, years) as k(industry, year)
+            join lateral (
+                select sum(c.carbon) as carbon_sum, avg(c.carbon) as carbon_avg,
+                       max(c.carbon) as carbon_max, min(c.carbon) as carbon_min, count(*) as carbon_count
+                from company.carbon c
+                where c.year = k.year
+                  and c.ticker_norm in (select g.ticker_norm from company."General" g where g.industry = k.industry)
+                having count(*) > 0
+            ) t on true
+            cross join lateral (
+                select sum(fisy.totalrevenue) - sum(fisy.grossprofit) as cogs_sum,
+                       sum(c.carbon) as cogs_carbon_sum, avg(c.carbon) as cogs_carbon_avg, count(*) as cogs_count
+                from company.carbon c
+                join company."financials_Income_Statement_yearly" fisy
+                on fisy.ticker_norm = c.ticker_norm and extract(year from fisy.date) = c.year
+                where c.year = k.year and fisy.grossprofit != fisy.totalrevenue
+                  and c.ticker_norm in (select g.ticker_norm from company."General" g where g.industry = k.industry)
+            ) f;
+
+            return array_length(industries, 1);
+        end;
+        $$
+    """)
+
+    # initial load, every existing key is dirty
+    op.execute("""
+        insert into company.industry_carbon_dirty (industry, year)
+        select distinct g.industry, c.year::integer
+        from company.carbon c
+        join company."General" g on g.ticker_norm = c.ticker_norm
+        where g.industry is not null and c.year is not null
+        on conflict do nothing
+    """)
+    op.execute('select company.refresh_industry_carbon_yearly()')
+
+
+def downgrade():
+    op.execute('drop function if exists company.refresh_industry_carbon_yearly()')
+
+    for table, _ in reversed(_marked_tables):
+        name = _table_name(table)
+        for event in ('truncate', 'delete', 'update', 'insert'):
+            op.execute(f'drop trigger if exists {name}_industry_carbon_{event} on company.{table}')
+
+    op.execute('drop function if exists company.industry_carbon_mark_all()')
+    for name in reversed(list(_mark_keys)):
+        op.execute(f'drop function if exists company.{name}()')
+
+    op.execute('drop table if exists company.industry_carbon_dirty')
+    op.execute('drop table if exists company.industry_carbon_yearly')
@@ -0,0 +1,243 @@
+"""materialized 15Rock global scores per (ticker, year)
+
+The global score ranked every company of company."General" joined with company.carbon with
+four window functions partitioned by (industry, year), then kept a single ticker.
+company.global_score stores the rank, the industry average, max and min, GlobalModelScore and
+GlobalModelPercent of every (ticker, year). The scores of one (industry, year) partition only
+change together, so they are refreshed from the same dirty keys as the industry aggregates.
+
+The dirty keys now use '' for a missing industry, so the companies without an industry are
+ranked among themselves like before.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18
+"""
+from alembic import op
+
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+# the rows of the transition table as (industry, year) keys, the table is new_rows or old_rows
+_mark_keys = {
+    'industry_carbon_mark_carbon': """
+        select distinct coalesce(g.industry, ''), r.year::integer
+        from {rows} r
+        join company."General" g on g.ticker_norm = upper(r.ticker)
+        where r.year is not null
+    """,
+    'industry_carbon_mark_financials': """
+        select distinct coalesce(g.industry, ''), extract(year from r.date)::integer
+        from {rows} r
+        join company."General" g on g.ticker_norm = upper(r.ticker)
+        where r.date is not null
+    """,
+    'industry_carbon_mark_general': """
+        select distinct coalesce(r.industry, ''), c.year::integer
+        from {rows} r
+        join company.carbon c on c.ticker_norm = upper(r.ticker)
+        where c.year is not null
+    """,
+}
+
+# 0003 versions of the key selects, restored on downgrade
+_previous_mark_keys = {
+    'industry_carbon_mark_carbon': """
+        select distinct g.industry, r.year::integer
+        from {rows} r
+        join company."General" g on g.ticker_norm = upper(r.ticker)
+        where g.industry is not null and r.year is not null
+    """,
+    'industry_carbon_mark_financials': """
+        select distinct g.industry, extract(year from r.date)::integer
+        from {rows} r
+        join company."General" g on g.ticker_norm = upper(r.ticker)
+        where g.industry is not null and r.date is not null
+    """,
+    'industry_carbon_mark_general': """
+        select distinct r.industry, c.year::integer
+        from {rows} r
+        join company.carbon c on c.ticker_norm = upper(r.ticker)
+        where r.industry is not null and c.year is not null
+    """,
+}
+
+_refresh_industry_carbon = """
+            delete from company.industry_carbon_yearly a
+            using unnest(industries, years) as k(industry, year)
+            where a.industry = k.industry and a.year = k.year;
+
+            insert into company.industry_carbon_yearly (
+                industry, year, carbon_sum, carbon_avg, carbon_max, carbon_min, carbon_count,
+                cogs_sum, cogs_carbon_sum, cogs_carbon_avg, cogs_count
+            )
+            select k.industry, k.year, t.carbon_sum, t.carbon_avg, t.carbon_max, t.carbon_min, t.carbon_count,
+                   f.cogs_sum, f.cogs_carbon_sum, f.cogs_carbon_avg, f.cogs_count
+            from unnest(industries, years) as k(industry, year)
+            join lateral (
+                select sum(c.carbon) as carbon_sum, avg(c.carbon) as carbon_avg,
+                       max(c.carbon) as carbon_max, min(c.carbon) as carbon_min, count(*) as carbon_count
+                from company.carbon c
+                where c.year = k.year
+                  and c.ticker_norm in (select g.ticker_norm from company."General" g where g.industry = k.industry)
+                having count(*) > 0
+            ) t on true
+            cross join lateral (
+                select sum(fisy.totalrevenue) - sum(fisy.grossprofit) as cogs_sum,
+                       sum(c.carbon) as cogs_carbon_sum, avg(c.carbon) as cogs_carbon_avg, count(*) as cogs_count
+                from company.carbon c
+                join company."financials_Income_Statement_yearly" fisy
+                on fisy.ticker_norm = c.ticker_norm and extract(year from fisy.date) = c.year
+                where c.year = k.year and fisy.grossprofit != fisy.totalrevenue
+                  and c.ticker_norm in (select g.ticker_norm from company."General" g where g.industry = k.industry)
+            ) f;
+"""
+
+# the scores of a company with zero carbon are null instead of failing the whole refresh
+_refresh_global_score = """
+            delete from company.global_score s
+            using unnest(industries, years) as k(industry, year)
+            where coalesce(s.industry, '') = k.industry and s.year = k.year;
+
+            insert into company.global_score (
+                ticker, ticker_norm, industry, countryname, exchange, year, carbon,
+                industavg, groupingnumrank, industmax, industmin, globalmodelscore, globalmodelpercent
+            )
+            select ticker, ticker_norm, industry, countryname, exchange, year, carbon,
+                   industavg, groupingnumrank, industmax, industmin,
+                   industavg / nullif(carbon, 0),
+                   100 - round(carbon * 100.0 / nullif(industmax, 0), 2)
+            from (
+                select g.ticker, g.ticker_norm, g.industry, g.countryname, g.exchange, c.year, c.carbon,
+                       ROW_NUMBER() OVER (PARTITION BY g.industry, c.year ORDER BY c.carbon ASC) AS groupingnumrank,
+                       AVG(c.carbon) OVER (PARTITION BY g.industry, c.year) as industavg,
+                       MAX(c.carbon) OVER (PARTITION BY g.industry, c.year) as industmax,
+                       MIN(c.carbon) OVER (PARTITION BY g.industry, c.year) as industmin
+                from unnest(industries, years) as k(industry, year)
+                join company."General" g on coalesce(g.industry, '') = k.industry
+                join company.carbon c on c.ticker_norm = g.ticker_norm and c.year = k.year
+            ) data;
+"""
+
+
+def _mark_function(name: str, keys: str) -> str:
+    return f"""
+        create or replace function company.{name}() returns trigger
+        language plpgsql as $$
+        begin
+            if TG_OP in ('INSERT', 'UPDATE') then
+                insert into company.industry_carbon_dirty (industry, year)
+                {keys.format(rows='new_rows')}
+                on conflict do nothing;
+            end if;
+
+            if TG_OP in ('UPDATE', 'DELETE') then
+                insert into company.industry_carbon_dirty (industry, year)
+                {keys.format(rows='old_rows')}
+                on conflict do nothing;
+            end if;
+
+            return null;
+        end;
+        $$
+    """
+
+
+def _refresh_function(*steps: str) -> str:
+    return f"""
+        create or replace function company.refresh_industry_carbon_yearly() returns integer
+        language plpgsql as $$
+        declare
+            industries text[];
+            years integer[];
+        begin
+            if not pg_try_advisory_xact_lock(hashtext('company.industry_carbon_yearly')) then
+                return 0;
+            end if;
+
+            -- keys marked while this refresh runs are left for the next one
+            with claimed as (
+                delete from company.industry_carbon_dirty returning industry, year
+            )
+            select array_agg(industry), array_agg(year) into industries, years from claimed;
+
+            if industries is null then
+                return 0;
+            end if;
+            {''.join(steps)}
+            return array_length(industries, 1);
+        end;
+        $$
+    """
+
+
+_mark_all = """
+        create or replace function company.industry_carbon_mark_all() returns trigger
+        language plpgsql as $$
+        begin
+            insert into company.industry_carbon_dirty (industry, year)
+            {keys}
+            on conflict do nothing;
+
+            return null;
+        end;
+        $$
+"""
+
+
+def upgrade():
+    op.execute("""
+        create table if not exists company.global_score (
+            ticker text not null,
+            ticker_norm text not null,
+            industry text,
+            countryname text,
+            exchange text,
+            year integer not null,
+            carbon numeric,
+            industavg numeric,
+            groupingnumrank bigint not null,
+            industmax numeric,
+            industmin numeric,
+            globalmodelscore numeric,
+            globalmodelpercent numeric
+        )
+    """)
+    op.execute('create index if not exists global_score_ticker_norm_idx on company.global_score (ticker_norm, year)')
+    op.execute("""
+        create index if not exists global_score_industry_year_idx
+        on company.global_score ((coalesce(industry, '')), year)
+    """)
+
+    for name, keys in _mark_keys.items():
+        op.execute(_mark_function(name, keys))
+    op.execute(_mark_all.format(keys="""
+            select industry, year from company.industry_carbon_yearly
+            union
+            select distinct coalesce(industry, ''), year from company.global_score
+    """))
+    op.execute(_refresh_function(_refresh_industry_carbon, _refresh_global_score))
+
+    # initial load, every partition of the scores is dirty
+    op.execute("""
+        insert into company.industry_carbon_dirty (industry, year)
+        select distinct coalesce(g.industry, ''), c.year::integer
+        from company.carbon c
+        join company."General" g on g.ticker_norm = c.ticker_norm
+        where c.year is not null
+        on conflict do nothing
+    """)
+    op.execute('select company.refresh_industry_carbon_yearly()')
+
+
+def downgrade():
+    op.execute(_refresh_function(_refresh_industry_carbon))
+    op.execute(_mark_all.format(keys='select industry, year from company.industry_carbon_yearly'))
+    for name, keys in _previous_mark_keys.items():
+        op.execute(_mark_function(name, keys))
+
+    op.execute("delete from company.industry_carbon_dirty where industry = ''")
+    op.execute("delete from company.industry_carbon_yearly where industry = ''")
+    op.execute('drop table if exists company.global_score')
@@ -0,0 +1,32 @@
+"""trigram index for the company search fallback
+
+The company search matched LIKE '%term%' on five upper cased columns of company."General",
+which no btree index can serve. The fallback query, used while the in-memory search index of
+a worker is cold, matches one expression over the five columns, indexed with pg_trgm.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18
+"""
+from alembic import op
+
+revision = '0005'
+down_revision = '0004'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute('create extension if not exists pg_trgm')
+    # the expression must stay identical to the one of the search_company query
+    op.execute("""
+        create index if not exists general_search_trgm_idx on company."General" using gin (
+            upper(coalesce(ticker, '') || ' ' || coalesce(name, '') || ' ' || coalesce(isin, '') || ' '
+                  || coalesce(cusip, '') || ' ' || coalesce(cik, '')) gin_trgm_ops
+        )
+        where type = 'Common Stock'
+    """)
+
+
+def downgrade():
+    op.execute('drop index if exists company.general_search_trgm_idx')
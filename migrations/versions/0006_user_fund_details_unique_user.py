@@ -0,0 +1,42 @@
+"""one fund per user, required by the fund creation upsert of add_to_fund
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-18
+"""
+from alembic import op
+
+revision = '0006'
+down_revision = '0005'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # concurrent first holdings could create a second fund, the first fund of the user is the
+    # one the api reads, move the holdings of the others into it
+    op.execute("""
+        update company.user_fund_holding h
+        set fund_id = k.fund_id
+        from company.user_fund_details d
+        join (
+            select user_id, min(fund_id) as fund_id
+            from company.user_fund_details
+            group by user_id
+            having count(*) > 1
+        ) k on k.user_id = d.user_id
+        where h.fund_id = d.fund_id and d.fund_id > k.fund_id
+    """)
+    op.execute("""
+        delete from company.user_fund_details d
+        using company.user_fund_details k
+        where d.user_id = k.user_id and d.fund_id > k.fund_id
+    """)
+    op.execute("""
+        create unique index if not exists user_fund_details_user_id_key
+        on company.user_fund_details (user_id)
+    """)
+
+
+def downgrade():
+    op.execute("drop index if exists company.user_fund_details_user_id_key")
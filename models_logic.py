@@ -7,8 +7,11 @@ from datetime import datetime
 import py15rock
 from concurrent.futures import ThreadPoolExecutor
 from config import config
+from fastapi import HTTPException
 from fastapi.encoders import jsonable_encoder
-from utils import convert_tickers
+from utils import convert_tickers, convert_ticker_list, convert_country_list, reference_data
+import named_queries as queries
+from search import CompanySearchIndex
 import logging
 
 logger = logging.getLogger('COMPANY_ROUTER')
@@ -17,267 +20,104 @@ logger = logging.getLogger('COMPANY_ROUTER')
 py15rock.get.config.api_key = config.rock_api_key
 py15rock.get.config.api_endpoint = config.rock_url
 
+company_search = CompanySearchIndex(
+    db=main_db_instance,
+    refresh_interval=config.search_index_refresh_interval,
+)
 
-async def get_carbon_footprint(tickers):
-    processed_tickers = convert_tickers(tickers)
-    query_statement = f"""
-    select ticker, year, carbon, provided 
-    from company.carbon 
-    where upper(ticker) in {processed_tickers} 
-    order by year ASC
-    """
-
-    result_data = await main_db_instance.fetch_rows(query_statement)
-    return jsonable_encoder(result_data)
 
+# financials are bound as float8, missing values as null
+def _as_float(value):
+    return None if pd.isna(value) else float(value)
 
-async def get_sum_historic_carbon(tickers, year: int):
-    processed_tickers = convert_tickers(tickers)
 
-    query_statement = f"""
-        WITH T as (
-        select carbon
-        from company.carbon cb
-        where upper(ticker) in {processed_tickers}
-        order by year desc
-        limit {year}
-        ) 
-        select SUM(carbon) as totalcarbon from T 
-    
-    """
+async def get_carbon_footprint(tickers):
+    result_data = await main_db_instance.fetch(queries.carbon_footprint, convert_ticker_list(tickers))
+    return result_data
 
-    result_data = await main_db_instance.fetch_rows(query_statement)
-    return jsonable_encoder(result_data)
 
+async def get_sum_historic_carbon(tickers, year: int):
+    result_data = await main_db_instance.fetch(queries.sum_historic_carbon, convert_ticker_list(tickers), int(year))
+    return result_data
 
-async def get_temperature_conversion(tickers, year: int):
-    processed_tickers = convert_tickers(tickers)
 
-    query_statement = f"""
-        WITH T as (
-        select carbon
-        from company.carbon cb
-        where upper(ticker) in {processed_tickers}
-        order by year desc
-        limit {year}
-        ) 
-        select SUM(carbon) as totalcarbon, 
-        round(SUM(carbon)/1000000000000::numeric, 60) as CarbonInTeratonnes, 
-        round(SUM(carbon)/1000000000000::numeric * 1.6, 60) as ChangeTemperatureMean, 
-        round(SUM(carbon)/1000000000000::numeric * 1, 60) as ChangeTemperature5thPercentile, 
-        round(SUM(carbon)/1000000000000::numeric * 2.1, 60) as ChangeTemperature95thPercentile	
-        from T 
-    """
-    result_data = await main_db_instance.fetch_rows(query_statement)
-    return jsonable_encoder(result_data)
+async def get_temperature_conversion(tickers, year: int):
+    result_data = await main_db_instance.fetch(queries.temperature_conversion, convert_ticker_list(tickers), int(year))
+    return result_data
 
 
 async def get_industry_sum(tickers):
-    processed_tickers = convert_tickers(tickers)
-    
-    query_statement = f"""
-    select
-    year,
-    cast(SUM(carbon) as NUMERIC) AS SUM_carbon,
-    cast(MAX(carbon) FILTER (WHERE upper(ticker) in {processed_tickers} ) as NUMERIC) AS company_carbon
-    from "company"."carbon" c
-    where lower(c.ticker) in (
-            select lower(g4.ticker)
-            from "company"."General" g4
-            where industry = (
-                    select industry
-                    from "company"."General" g3
-                    where upper(g3.ticker) in {processed_tickers}
-                )
-        )
-    GROUP BY c.year
-    having MAX(carbon) FILTER (WHERE upper(ticker) in {processed_tickers}) is not null
-    order by year ASC;
-    """
-    result_data = await main_db_instance.fetch_rows(query_statement)
-    return jsonable_encoder(result_data)
+    processed_tickers = convert_ticker_list(tickers)
+    result_data = await main_db_instance.fetch(queries.industry_sum, processed_tickers,
+                                               reference_data.industry_of(processed_tickers))
+    return result_data
 
 
 async def get_industry_temp_impact(tickers, year):
-    processed_tickers = convert_tickers(tickers)
-    query_statement = f"""
-    WITH T as (
-    select cast(SUM(carbon) as NUMERIC) AS industry_carbon
-    from "company"."carbon" c
-    where lower(c.ticker) in (
-            select lower(g4.ticker)
-            from "company"."General" g4
-            where industry = (
-                    select industry
-                    from "company"."General" g3
-                    where upper(g3.ticker) in {processed_tickers}
-                )
-        )
-    GROUP BY c.year
-    having MAX(carbon) FILTER (WHERE upper(ticker) in {processed_tickers} ) is not null
-    order by year desc
-    limit {year}
-    )
-    
-        select SUM(industry_carbon) as totalcarbon, 
-        round(SUM(industry_carbon)/1000000000000::numeric, 60) as CarbonInTeratonnes, 
-        round(SUM(industry_carbon)/1000000000000::numeric * 1.6, 60) as ChangeTemperatureMean, 
-        round(SUM(industry_carbon)/1000000000000::numeric * 1, 60) as ChangeTemperature5thPercentile, 
-        round(SUM(industry_carbon)/1000000000000::numeric * 2.1, 60) as ChangeTemperature95thPercentile	
-        from T 
-
-    """
-    result_data = await main_db_instance.fetch_rows(query_statement)
-    return jsonable_encoder(result_data)
+    processed_tickers = convert_ticker_list(tickers)
+    result_data = await main_db_instance.fetch(queries.industry_temp_impact, processed_tickers, int(year),
+                                               reference_data.industry_of(processed_tickers))
+    return result_data
 
 
 async def get_emissions_efficiency(tickers):
     # TODO this might be a duplicate, confirm and delete
-    processed_tickers = convert_tickers(tickers)
-    query_statement = f"""
-    select c.year, 
-    --sum(fisy.totalrevenue) as industryTotalRevenue,
-    --sum(fisy.grossprofit) as indsutryGrossProfit,
-    ln(sum(fisy.totalrevenue) - sum(fisy.grossprofit)) as industryCOGS,
-    sum(c.carbon) as industryCarbon,
-    --sum(revenue) filter (where upper(company) in {processed_tickers} ) / sum(revenue),
-    ln(sum(fisy.totalrevenue) filter (where upper(fisy.ticker) in {processed_tickers} ) - sum(fisy.grossprofit) filter (where upper(fisy.ticker) in {processed_tickers})) as companyCOGS,
-    (avg(c.carbon) filter (where upper(fisy.ticker) in {processed_tickers} )) / ln(sum(fisy.totalrevenue) filter (where upper(fisy.ticker) in {processed_tickers}) - sum(fisy.grossprofit) filter (where upper(fisy.ticker) in {processed_tickers})) as CarbonoverCOGS,
-    avg(c.carbon) / ln(sum(fisy.totalrevenue) filter (where upper(fisy.ticker) in {processed_tickers} ) - sum(fisy.grossprofit) filter (where upper(fisy.ticker) in {processed_tickers} )) / ln(sum(fisy.totalrevenue) filter (where upper(fisy.ticker) in {processed_tickers} ) - sum(fisy.grossprofit) filter (where upper(fisy.ticker) in {processed_tickers} )) as ExcessCarbonOverIndusry
-    --(c.carbon/ln(fisy.totalrevenue- fisy.grossprofit)) as emissionsPerCOGS
-    from "company"."carbon" c
-    join company."financials_Income_Statement_yearly" fisy 
-    on upper(fisy.ticker) = upper(c.ticker) 
-    where lower(c.ticker) in (
-            select lower(g4.ticker)
-            from "company"."General" g4
-            where industry = (
-                    select industry
-                    from "company"."General" g3
-                    where upper(g3.ticker) in {processed_tickers}
-                )
-        ) and fisy.grossprofit != fisy.totalrevenue
-        and extract(year from fisy.date) = c.year
-    GROUP BY c.year
-    order by year ASC;
-
-    """
-    result_data = await main_db_instance.fetch_rows(query_statement)
-    return jsonable_encoder(result_data)
+    processed_tickers = convert_ticker_list(tickers)
+    result_data = await main_db_instance.fetch(queries.emissions_efficiency, processed_tickers,
+                                               reference_data.industry_of(processed_tickers))
+    return result_data
 
 
 # historical prices
-async def get_historical_prices(tickers, limitdate):
+async def get_historical_prices(tickers, limitdate=4000):
     # removing the casting to upper for pricing as items are already upper
-    processed_tickers = convert_tickers(tickers)
-    query_statement = f"""
-    select * 
-    from company."EODprice" e 
-    where ticker in {processed_tickers}
-    --and e.date > '2021-01-01'
-    order by date desc
-    limit {limitdate}
-    """
-    
-    result_data = await main_db_instance.fetch_rows(query_statement)
-    return jsonable_encoder(result_data)
+    result_data = await main_db_instance.fetch(queries.historical_prices, convert_ticker_list(tickers), int(limitdate))
+    return result_data
 
 
 async def get_company_valuation(tickers):
     # removing the casting to upper for pricing as items are already upper
-    processed_tickers = convert_tickers(tickers)
-    query_statement = f"""
-    select * 
-    from company."Valuation" v 
-    where ticker in {processed_tickers}
-    """
-    
-    result_data = await main_db_instance.fetch_rows(query_statement)
-    return jsonable_encoder(result_data)
+    result_data = await main_db_instance.fetch(queries.company_valuation, convert_ticker_list(tickers))
+    return result_data
 
 
 # get fund data
 async def get_fund_data(fund_ticker):
-    # removing the casting to upper for pricing as items are already upper
-    processed_tickers = convert_tickers(fund_ticker)
-    query_statement = f"""
-    select * 
-    from company.fund_data fd 
-    where upper(ticker) in {processed_tickers}
-    """
-    
-    result_data = await main_db_instance.fetch_rows(query_statement)
-    return jsonable_encoder(result_data)
+    result_data = await main_db_instance.fetch(queries.fund_data, convert_ticker_list(fund_ticker))
+    return result_data
 
 
 # getCountryCarbonHistory
 async def get_country_carbon_history(tickers):
-    # removing the casting to upper for pricing as items are already upper
-    processed_tickers = convert_tickers(tickers)
-    query_statement = f"""
-    select country, year, co2emissions
-    from company."country_emissions" e 
-    where REPLACE(upper(country),' ','') in {processed_tickers}
-    order by year desc
-
-    """
-    
-    result_data = await main_db_instance.fetch_rows(query_statement)
-    return jsonable_encoder(result_data)
+    result_data = await main_db_instance.fetch(queries.country_carbon_history, convert_country_list(tickers))
+    return result_data
 
 
 # getCountryCarbonHistory
 async def get_country_tax(tickers):
-    # removing the casting to upper for pricing as items are already upper
-    processed_tickers = convert_tickers(tickers)
-    query_statement = f"""
-    select countryname, lower_bound, upper_bound, mean
-    from company.tax_regimes tr  
-    where REPLACE(upper(countryname),' ','') in {processed_tickers}
-    """
-    
-    result_data = await main_db_instance.fetch_rows(query_statement)
-    return jsonable_encoder(result_data)
+    result_data = await main_db_instance.fetch(queries.country_tax, convert_country_list(tickers))
+    return result_data
 
 
 # getWorldCarbonHistory
 async def get_world_carbon_history():
-    # removing the casting to upper for pricing as items are already upper
-    # processed_tickers = convertTickers(tickers)
-    query_statement = f"""
-    select year, sum(co2emissions) as WorldCarbon
-    from company.country_emissions ce 
-    group by year
-    order by year desc
-    """
-    
-    result_data = await main_db_instance.fetch_rows(query_statement)
-    return jsonable_encoder(result_data)
+    result_data = await main_db_instance.fetch(queries.world_carbon_history)
+    return result_data
 
 
 async def get_cogs(tickers):
-    processed_tickers = convert_tickers(tickers)
-    query_statement = f"""
-    select date_part('year', date) as year, (totalrevenue -  grossprofit) as cogs
-    from company."financials_Income_Statement_yearly" fisy 
-    where upper(ticker) in {processed_tickers}
-    order by date_part('year', date) desc 
-    """
-    
-    result_data = await main_db_instance.fetch_rows(query_statement)
-    
+    processed_tickers = convert_ticker_list(tickers)
+    result_data = await main_db_instance.fetch(queries.cogs, processed_tickers)
+
+    # no financials for the ticker, or the query failed
+    if not result_data or result_data[0]['cogs'] is None:
+        raise HTTPException(status_code=404, detail=f'No COGS for {", ".join(processed_tickers)}')
+
     # if gross profit and total revenue are the same then we can use operating income
     if result_data[0]['cogs'] <= 0:
-        query_statement = f"""
-        select date_part('year', date) as year, (totalrevenue -  operatingincome) as cogs
-        from company."financials_Income_Statement_yearly" fisy 
-        where upper(ticker) in {processed_tickers}
-        --group by date_part('year', date)
-        order by date_part('year', date) desc 
-        """
-        result_data = await main_db_instance.fetch_rows(query_statement)
+        result_data = await main_db_instance.fetch(queries.cogs_from_operating_income, processed_tickers)
 
-    return jsonable_encoder(result_data)
+    return result_data
 
 
 async def get_carbon_growth_rate(tickers):
@@ -300,52 +140,19 @@ async def get_company_industry_average(tickers):
     processed_tickers = convert_tickers(tickers)
     processed_tickers = processed_tickers[0]
 
-    query_statement = f"""
-    select
-    year,
-    cast(AVG(carbon) as NUMERIC) AS AVG_carbon,
-    cast(MAX(carbon) FILTER (WHERE upper(ticker) = '{processed_tickers}' ) as NUMERIC) AS company_carbon
-    from "company"."carbon" c
-    where upper(c.ticker) in (
-            select upper(g4.ticker)
-            from "company"."General" g4
-            where industry = (
-                    select industry
-                    from "company"."General" g3
-                    where upper(g3.ticker) = '{processed_tickers}'
-                )
-        )
-    GROUP BY c.year
-    having MAX(carbon) FILTER (WHERE upper(ticker) = '{processed_tickers}') is not null
-    order by year ASC;
-
-    """
-
-    result_data = await main_db_instance.fetch_rows(query_statement)
-    return jsonable_encoder(result_data)
+    result_data = await main_db_instance.fetch(queries.company_industry_average, processed_tickers,
+                                               reference_data.get(processed_tickers, 'industry'))
+    return result_data
 
 
+# answered from the in-memory index, postgres is only asked while the index is cold
 async def search_company(search_name: str):
-    search_name = search_name.upper()
-
-    query_statement = f"""
-        SELECT g.ticker, g.name, g.isin, g.cusip, g.cik, 
-        --g.ticker as value
-        concat(g.name, ' | ', g.ticker ) as value
-        FROM "company"."General" g
-        WHERE upper(g.ticker) like '%{search_name}%' 
-        OR upper(g.name) like '%{search_name}%'
-        OR upper(g.isin) like '%{search_name}%'
-        OR upper(g.cusip) like '%{search_name}%'
-        OR upper(g.cik) like '%{search_name}%'
-        AND g.type = 'Common Stock'
-        order by g.ticker
-        LIMIT 20;
-    
-    """
+    results = company_search.search(search_name)
+    if results is not None:
+        return results
 
-    result_data = await main_db_instance.fetch_rows(query_statement)
-    return jsonable_encoder(result_data)
+    result_data = await main_db_instance.fetch(queries.search_company, search_name.strip().upper())
+    return result_data
 
 
 # getProductionEfficiency
@@ -510,174 +317,74 @@ async def get_fund_holdings_weights(tickers, imputation='None'):
     processed_tickers = convert_tickers(tickers)
     print("fund ticker is ", processed_tickers[0])
     # we can only review one fund at at time
-    query_statement = f'''
-    select 
-    fh.ticker as fund_Name,
-    g.ticker,
-    fh.sector, 
-    fh.industry ,
-    max(fh.weight) as weight,
-    max(fh.assets_percent) as assets_percent, 
-    max(c.carbon) as carbon
-    from "company"."fund_Holdings" fh
-    LEFT JOIN "company".fund_mapping fm on fh.name=fm.fund_name
-    LEFT join "company"."General" g on g.name = fm.mapped_name
-    LEFT join "company".carbon c on lower(c.ticker) = lower(g.ticker)
-    where upper(fh.ticker) = '{processed_tickers[0]}'
-    and c."year" = '2019'
-    group by g.ticker, fh.ticker,fh.sector, fh.industry
-    '''
-
-    result_data = await main_db_instance.fetch_rows(query_statement)
+    result_data = await main_db_instance.fetch(queries.fund_holdings_weights, processed_tickers[0])
     if imputation == 'None':
         pass
     elif imputation == 'market':
-        query_statement = f"""
-        select *
-        from company."fund_Holdings" fh 
-        where ticker = '{processed_tickers[0]}'
-        """
-        result_data = await main_db_instance.fetch_rows(query_statement)
+        result_data = await main_db_instance.fetch(queries.fund_holdings, processed_tickers[0])
 
-    return jsonable_encoder(result_data)
+    return result_data
 
 
 async def get_company_info(tickers):
-    # removing the casting to upper for pricing as items are already upper
-    processed_tickers = convert_tickers(tickers)
-    print("we are in get company")
-    query_statement = f"""
-
-    select * from "company"."General" where upper(ticker) in {processed_tickers}
-
-    """
-
-    result_data = await main_db_instance.fetch_rows(query_statement)
-    return jsonable_encoder(result_data)
+    result_data = await main_db_instance.fetch(queries.company_info, convert_ticker_list(tickers))
+    return result_data
 
 
 async def get_company_financials(tickers):
     # removing the casting to upper for pricing as items are already upper
-    processed_tickers = convert_tickers(tickers)
-    query_statement = f"""
-
-    select *, date_part('year', fisy.date) as year, g.ticker
-    from company."General" g 
-    join company."financials_Balance_Sheet_yearly" fbsy ON fbsy.ticker = g.ticker
-    join company."financials_Cash_Flow_yearly" fcfy ON fcfy.ticker = fbsy.ticker AND fcfy.date = fbsy.date
-    join company."financials_Income_Statement_yearly" fisy ON fisy.ticker = fcfy.ticker AND fisy.date = fbsy.date
-    --left join company.carbon c on upper(c.ticker) = g.ticker and c.year = date_part('year', fisy.date) -- and c.provided = true 
-    left join company."ESGScores" e on e.ticker = g.ticker 
-    left join company."Earnings_Annual" ea on ea.ticker = g.ticker and ea.date = cast(fisy.date as text)
-    where g.ticker in {processed_tickers}
-    order by year desc
-
-    """
-    result_data = await main_db_instance.fetch_rows(query_statement)
-    print(result_data)
-    return jsonable_encoder(result_data)
+    result_data = await main_db_instance.fetch(queries.company_financials, convert_ticker_list(tickers))
+    return result_data
 
-async def get_portfolio_scores(tickers, func):
-    # removing the casting to upper for pricing as items are already upper
-    processed_tickers = convert_tickers(tickers)
-    logger.info(f'User provided us with following tickers {processed_tickers}')
-    #let scores
-    portfolio_score_df = pd.DataFrame()
-    #this should work but it's not
-    # for ticker in processed_tickers:
-    #     var = await py15rock.get.company15rockScore(ticker)
-    #     logger.info(f'we are in in {ticker}')
-    #
-    #     try:
-    #         var = await py15rock.get.company15rockScore(ticker)
-    #         # print('Success - ', ticker, " - ", var['globalmodelpercent'])
-    #         portfolio_score_df = portfolio_score_df.append(var, ignore_index=True)
-    #     except Exception as e:
-    #         logger.critical(f"Error - {ticker}  with error of  {e}")
-
-    #this is the big way to do
-    for ticker in processed_tickers:
-        query_statement = """
-        with data as
-        (select g.ticker, g.industry , g.countryname, g.exchange, c.carbon, c.year,
-        ROW_NUMBER() OVER (
-        PARTITION BY g.industry,c."year" --, g.exchange
-        ORDER BY c.carbon ASC
-        ) AS groupingNumRank,
-        AVG(c.carbon) over (
-        PARTITION BY g.industry, c."year" --, g.exchange
-        ) as industavg,
-        --sql test
-        max(c.carbon) over (
-        PARTITION BY g.industry, c."year" --, g.exchange
-        ) as industMAX,
-        min(c.carbon) over (
-        PARTITION BY g.industry, c."year" --, g.exchange
-        ) as industMIN
-        from company."General" g
-        INNER JOIN company.carbon c ON upper(c.ticker) =g.ticker
-        --and c.year = '2019'
-        )
-        select ticker, industry , countryname, exchange, year, carbon, industavg, groupingNumRank, industMAX, industMIN, (data.industavg/data.carbon) as GlobalModelScore, ( 100 - ROUND(data.carbon * 100.0 / data.industMAX, 2)  )AS GlobalModelPercent
-        from data
-        -- comment below to get entire sector
-        where upper(data.ticker) = $1
-
-        """
-        result_data = await main_db_instance.fetch_rows(query_statement, ticker.upper())
-        current_portfolio_score_df = pd.DataFrame(jsonable_encoder(result_data))
-        current_portfolio_score_df["year"] = pd.to_numeric(current_portfolio_score_df["year"])
-        current_portfolio_score_df.reset_index(drop=True, inplace=True)
-        portfolio_score_df = portfolio_score_df.append(current_portfolio_score_df) #, ignore_index=True)
-    # portfolio_score_df = portfolio_score_df.fillna(0)
-    logger.info(f'scores are {portfolio_score_df}')
-    portfolio_score_df = portfolio_score_df.groupby('year', as_index=False).agg(func)
-    portfolio_score_df = portfolio_score_df[['year', 'carbon', 'globalmodelscore' ]]
-    return jsonable_encoder(portfolio_score_df.to_dict('records'))
+# holdings weigh in with their shares, in the years they have a value, tickers are matched
+# case-insensitively and holdings missing from shares weigh nothing, so shares matching none
+# of the tickers give null years (the portfolio router rejects them)
+def _weighted_by_shares(scores: pd.DataFrame, shares: dict, columns: list) -> pd.DataFrame:
+    weights = pd.Series({ticker.upper(): float(n) for ticker, n in shares.items()})
+    weight = scores['ticker'].str.upper().map(weights).fillna(0.0)
 
-async def get_company_news(tickers):
-    # removing the casting to upper for pricing as items are already upper
-    processed_tickers = convert_tickers(tickers)
-    query_statement = f"""
+    values = scores[columns]
+    weighted_sums = values.mul(weight, axis=0).groupby(scores['year']).sum()
+    total_weights = values.notna().mul(weight, axis=0).groupby(scores['year']).sum()
 
-    select ticker, link, title, "date",	predicted_sentiment,	generated_summary
-    from company.news_analytics na 
-    where ticker in {processed_tickers}
-    order by date desc
+    return (weighted_sums / total_weights.replace(0.0, np.nan)).reset_index()
 
-    """
-    result_data = await main_db_instance.fetch_rows(query_statement)
-    return jsonable_encoder(result_data)
 
+# scores of every holding in one query, aggregated per year with func or weighted by the shares
+async def get_portfolio_scores(tickers, func, shares=None):
+    processed_tickers = convert_ticker_list(tickers)
+    logger.info(f'User provided us with following tickers {processed_tickers}')
 
-async def get_company_chart_endpoints():
-    # removing the casting to upper for pricing as items are already upper
-    # processed_tickers = convertTickers(tickers)
-    query_statement = f"""
+    result_data = await main_db_instance.fetch(queries.global_scores, processed_tickers)
+    if not result_data:
+        return []
 
-    select *
-    from company.web_companypage_models wcm 
-    where portfolio_model is not true 
+    columns = ['carbon', 'globalmodelscore']
+    scores = pd.DataFrame.from_records(result_data, columns=list(result_data[0].keys()))
+    scores = scores[['ticker', 'year'] + columns]
+    scores['year'] = pd.to_numeric(scores['year'])
+    scores[columns] = scores[columns].astype(float)
 
-    """
-    result_data = await main_db_instance.fetch_rows(query_statement)
-    
-    return jsonable_encoder(result_data)
+    if shares:
+        portfolio_score_df = _weighted_by_shares(scores, shares, columns)
+    else:
+        portfolio_score_df = scores.groupby('year', as_index=False)[columns].agg(func)
 
+    return jsonable_encoder(portfolio_score_df[['year'] + columns].to_dict('records'))
 
-async def get_portfolio_chart_endpoints():
-    # removing the casting to upper for pricing as items are already upper
-    # processed_tickers = convertTickers(tickers)
-    query_statement = f"""
+async def get_company_news(tickers):
+    result_data = await main_db_instance.fetch(queries.company_news, convert_ticker_list(tickers))
+    return result_data
 
-    select *
-    from company.web_companypage_models wcm 
-    where portfolio_model is  true 
 
-    """
-    result_data = await main_db_instance.fetch_rows(query_statement)
+async def get_company_chart_endpoints():
+    result_data = await main_db_instance.fetch(queries.company_chart_endpoints)
+    return result_data
 
-    return jsonable_encoder(result_data)
+
+async def get_portfolio_chart_endpoints():
+    result_data = await main_db_instance.fetch(queries.portfolio_chart_endpoints)
+    return result_data
 
 
 async def get_related_companies(tickers):
@@ -689,31 +396,21 @@ async def get_related_companies(tickers):
         ['year', 'countryiso', 'name', 'currencycode', 'sector', 'totalassets', 'totalliab', 'grossprofit',
          'totalrevenue', 'netincome']].iloc[0]
 
-    query_statement = f"""
-    select distinct on (recommendation, g.name) g.name, g.ticker,
-    abs(fbsy.totalassets - {company_financials['totalassets']})* 1+
-    abs(fbsy.totalliab - {company_financials['totalliab']})* 5+
-    abs(fisy.grossprofit - {company_financials['grossprofit']})* 1+
-    abs(fisy.totalrevenue - {company_financials['totalrevenue']})* 10+
-    abs(fisy.netincome - {company_financials['netincome']})* 50+
-    (g.countryiso <> '{company_financials['countryiso']}')::int* 100000000000000+
-    (g.sector <> '{company_financials['sector']}')::int* 100000000000000
-    as recommendation,
-    case when  g.logourl<>'' then concat('https://eodhistoricaldata.com', g.logourl ) end as logourl
-    from company."General" g 
-    join company."financials_Balance_Sheet_yearly" fbsy ON fbsy.ticker = g.ticker
-    join company."financials_Cash_Flow_yearly" fcfy ON fcfy.ticker = fbsy.ticker AND fcfy.date = fbsy.date
-    join company."financials_Income_Statement_yearly" fisy ON fisy.ticker = fcfy.ticker AND fisy.date = fbsy.date
-    --left join company.carbon c on upper(c.ticker) = g.ticker and c.year = date_part('year', fisy.date) -- and c.provided = true 
-    left join company."ESGScores" e on e.ticker = g.ticker 
-    left join company."Earnings_Annual" ea on ea.ticker = g.ticker and ea.date = cast(fisy.date as text)
-    where upper(g.name) != upper('{company_financials['name']}')
-    order by recommendation, g.name
-    limit 10
-
-    """
-    result_data = await main_db_instance.fetch_rows(query_statement)
-    return jsonable_encoder(result_data)
+    # the country, sector and name are compared with company."General", take them from there
+    company = reference_data.company(processed_tickers[0]) or company_financials
+
+    result_data = await main_db_instance.fetch(
+        queries.related_companies,
+        _as_float(company_financials['totalassets']),
+        _as_float(company_financials['totalliab']),
+        _as_float(company_financials['grossprofit']),
+        _as_float(company_financials['totalrevenue']),
+        _as_float(company_financials['netincome']),
+        company['countryiso'],
+        company['sector'],
+        company['name'],
+    )
+    return result_data
 
 
 # async def getCarbonAlpha1(tickers):
@@ -835,52 +532,20 @@ async def get_carbon_alpha(tickers, pct_carbonChange=1):
     # TODO not working still
     # removing the casting to upper for pricing as items are already upper
     processed_tickers = convert_tickers(tickers)[0]
-    query_statement_prices = f"""
-    select *
-    from company."EODprice" e 
-    where e.ticker in ('GSPC.INDX', '{processed_tickers}', 'US10Y.INDX')
-    order by e,ticker 
-
-    """
-    query_statement_carbon = f"""
-    select * 
-    from company."carbon" c 
-    where upper(ticker) = upper('{processed_tickers}')
-    """
-
-    query_statement_industryAVG = f"""
-
-    select
-	year,
-    cast(AVG(carbon) as NUMERIC) AS AVG_carbon,
-    cast(MAX(carbon) FILTER (WHERE upper(c.ticker) = '{processed_tickers}' ) as NUMERIC) AS company_carbon
-    from company."carbon" c
-    where upper(c.ticker) in (
-            select upper(g4.ticker)
-            from "company"."General" g4
-            where industry = (
-                    select industry
-                    from "company"."General" g3
-                    where upper(g3.ticker) = '{processed_tickers}'
-                )
-        )
-    GROUP BY c.year
-    having MAX(carbon) FILTER (WHERE upper(c.ticker) = '{processed_tickers}') is not null
-    order by year ASC;
-
-    """
+
     # print("processing ", processed_tickers )
 
     # control variable
     percentOfLengh = .2  # .50 #the regression will use this % of the size of the data set
 
-    result_data_price = await main_db_instance.fetch_rows(query_statement_prices)
+    result_data_price = await main_db_instance.fetch(queries.market_prices, processed_tickers)
     result_data_price = jsonable_encoder(result_data_price)
 
-    result_data_carbon = await main_db_instance.fetch_rows(query_statement_carbon)
+    result_data_carbon = await main_db_instance.fetch(queries.company_carbon, processed_tickers)
     result_data_carbon = jsonable_encoder(result_data_carbon)
 
-    result_data_industry = await main_db_instance.fetch_rows(query_statement_industryAVG)
+    result_data_industry = await main_db_instance.fetch(queries.company_industry_average, processed_tickers,
+                                                        reference_data.get(processed_tickers, 'industry'))
     result_data_industry = jsonable_encoder(result_data_industry)
 
     industryCarbonDF = pd.DataFrame(result_data_industry)
@@ -972,69 +637,20 @@ async def get_carbon_transition_risk(tickers, pct_carbon_change):
     # TODO not working still
     # removing the casting to upper for pricing as items are already upper
     processed_tickers = convert_tickers(tickers)[0]
-    query_statement_prices = f"""
-    select *
-    from company."EODprice" e 
-    where e.ticker in ('GSPC.INDX', '{processed_tickers}', 'US10Y.INDX')
-    order by e,ticker 
-    
-    """
-    query_statement_carbon = f"""
-    select * 
-    from company."carbon" c 
-    where upper(ticker) = upper('{processed_tickers}')
-    """
-
-    query_statement_industryAVG = f"""
-
-    select
-	year,
-    cast(AVG(carbon) as NUMERIC) AS AVG_carbon,
-    cast(MAX(carbon) FILTER (WHERE upper(c.ticker) = '{processed_tickers}' ) as NUMERIC) AS company_carbon
-    from company."carbon" c
-    where upper(c.ticker) in (
-            select upper(g4.ticker)
-            from "company"."General" g4
-            where industry = (
-                    select industry
-                    from "company"."General" g3
-                    where upper(g3.ticker) = '{processed_tickers}'
-                )
-        )
-    GROUP BY c.year
-    having MAX(carbon) FILTER (WHERE upper(c.ticker) = '{processed_tickers}') is not null
-    order by year ASC;
-
-    """
-
-    query_statement_financials = f"""
-
-    select * 
-    from company."General" g 
-    join company."financials_Balance_Sheet_yearly" fbsy ON fbsy.ticker = g.ticker
-    join company."financials_Cash_Flow_yearly" fcfy ON fcfy.ticker = fbsy.ticker AND fcfy.date = fbsy.date
-    join company."financials_Income_Statement_yearly" fisy ON fisy.ticker = fcfy.ticker AND fisy.date = fbsy.date
-    left join company.carbon c on upper(c.ticker) = g.ticker and c.year = date_part('year', fisy.date) -- and c.provided = true 
-    left join company."ESGScores" e on e.ticker = g.ticker 
-    left join company."Earnings_Annual" ea on ea.ticker = g.ticker and ea.date = cast(fisy.date as text)
-    where g.ticker = '{processed_tickers}'
-
-    """
 
     # print("processing ", processed_tickers )
 
     # control variable
 
-    result_data_price = await main_db_instance.fetch_rows(query_statement_prices)
+    result_data_price = await main_db_instance.fetch(queries.market_prices, processed_tickers)
     result_data_price = jsonable_encoder(result_data_price)
 
-    # result_data_carbon = await main_db_instance.fetch_rows(query_statement_carbon)
-    # result_data_carbon = jsonable_encoder(result_data_carbon)
-
-    result_data_industry = await main_db_instance.fetch_rows(query_statement_industryAVG)
+    result_data_industry = await main_db_instance.fetch(queries.company_industry_average, processed_tickers,
+                                                        reference_data.get(processed_tickers, 'industry'))
     result_data_industry = jsonable_encoder(result_data_industry)
 
-    result_data_financialStatements = await main_db_instance.fetch_rows(query_statement_financials)
+    result_data_financialStatements = await main_db_instance.fetch(queries.company_financial_statements,
+                                                                   processed_tickers)
     result_data_financialStatements = jsonable_encoder(result_data_financialStatements)
 
     industryCarbonDF = pd.DataFrame(result_data_industry)
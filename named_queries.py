@@ -0,0 +1,416 @@
+from db_connection import Query
+
+# every statement used by models_logic and the company router, ticker lists are passed
+# as one text[] parameter and compared with = ANY($1). Tickers and countries are matched on
+# the indexed *_norm columns (migration 0002), the parameters are normalized by the caller.
+
+carbon_footprint = Query('carbon_footprint', """
+    select ticker, year, carbon, provided
+    from company.carbon
+    where ticker_norm = ANY($1)
+    order by year ASC
+""")
+
+sum_historic_carbon = Query('sum_historic_carbon', """
+    WITH T as (
+    select carbon
+    from company.carbon cb
+    where ticker_norm = ANY($1)
+    order by year desc
+    limit $2
+    )
+    select SUM(carbon) as totalcarbon from T
+""")
+
+temperature_conversion = Query('temperature_conversion', """
+    WITH T as (
+    select carbon
+    from company.carbon cb
+    where ticker_norm = ANY($1)
+    order by year desc
+    limit $2
+    )
+    select SUM(carbon) as totalcarbon,
+    round(SUM(carbon)/1000000000000::numeric, 60) as CarbonInTeratonnes,
+    round(SUM(carbon)/1000000000000::numeric * 1.6, 60) as ChangeTemperatureMean,
+    round(SUM(carbon)/1000000000000::numeric * 1, 60) as ChangeTemperature5thPercentile,
+    round(SUM(carbon)/1000000000000::numeric * 2.1, 60) as ChangeTemperature95thPercentile
+    from T
+""")
+
+# the industry aggregates are precomputed per (industry, year) by the 0003 migration, only the
+# years with carbon data of the company are returned. The industry parameter comes from the
+# reference data, when it is null the industry is looked up in company."General"
+industry_sum = Query('industry_sum', """
+    select a.year, a.carbon_sum AS SUM_carbon, co.company_carbon
+    from company.industry_carbon_yearly a
+    join (
+        select year, cast(MAX(carbon) as NUMERIC) AS company_carbon
+        from company.carbon
+        where ticker_norm = ANY($1)
+        group by year
+        having MAX(carbon) is not null
+    ) co on co.year = a.year
+    where a.industry = coalesce($2::text, (
+            select industry
+            from "company"."General" g3
+            where g3.ticker_norm = ANY($1)
+        ))
+    order by a.year ASC
+""")
+
+industry_temp_impact = Query('industry_temp_impact', """
+    WITH T as (
+    select a.carbon_sum AS industry_carbon
+    from company.industry_carbon_yearly a
+    join (
+        select year
+        from company.carbon
+        where ticker_norm = ANY($1)
+        group by year
+        having MAX(carbon) is not null
+    ) co on co.year = a.year
+    where a.industry = coalesce($3::text, (
+            select industry
+            from "company"."General" g3
+            where g3.ticker_norm = ANY($1)
+        ))
+    order by a.year desc
+    limit $2
+    )
+    select SUM(industry_carbon) as totalcarbon,
+    round(SUM(industry_carbon)/1000000000000::numeric, 60) as CarbonInTeratonnes,
+    round(SUM(industry_carbon)/1000000000000::numeric * 1.6, 60) as ChangeTemperatureMean,
+    round(SUM(industry_carbon)/1000000000000::numeric * 1, 60) as ChangeTemperature5thPercentile,
+    round(SUM(industry_carbon)/1000000000000::numeric * 2.1, 60) as ChangeTemperature95thPercentile
+    from T
+""")
+
+emissions_efficiency = Query('emissions_efficiency', """
+    select a.year,
+    ln(a.cogs_sum) as industryCOGS,
+    a.cogs_carbon_sum as industryCarbon,
+    ln(co.cogs) as companyCOGS,
+    co.carbon / ln(co.cogs) as CarbonoverCOGS,
+    a.cogs_carbon_avg / ln(co.cogs) / ln(co.cogs) as ExcessCarbonOverIndusry
+    from company.industry_carbon_yearly a
+    left join (
+        select c.year, sum(fisy.totalrevenue) - sum(fisy.grossprofit) as cogs, avg(c.carbon) as carbon
+        from "company"."carbon" c
+        join company."financials_Income_Statement_yearly" fisy
+        on fisy.ticker_norm = c.ticker_norm and extract(year from fisy.date) = c.year
+        where c.ticker_norm = ANY($1) and fisy.grossprofit != fisy.totalrevenue
+        group by c.year
+    ) co on co.year = a.year
+    where a.industry = coalesce($2::text, (
+            select industry
+            from "company"."General" g3
+            where g3.ticker_norm = ANY($1)
+        )) and a.cogs_count > 0
+    order by a.year ASC
+""")
+
+historical_prices = Query('historical_prices', """
+    select *
+    from company."EODprice" e
+    where ticker = ANY($1)
+    order by date desc
+    limit $2
+""")
+
+company_valuation = Query('company_valuation', """
+    select *
+    from company."Valuation" v
+    where ticker = ANY($1)
+""")
+
+fund_data = Query('fund_data', """
+    select *
+    from company.fund_data fd
+    where ticker_norm = ANY($1)
+""")
+
+country_carbon_history = Query('country_carbon_history', """
+    select country, year, co2emissions
+    from company."country_emissions" e
+    where country_norm = ANY($1)
+    order by year desc
+""")
+
+country_tax = Query('country_tax', """
+    select countryname, lower_bound, upper_bound, mean
+    from company.tax_regimes tr
+    where countryname_norm = ANY($1)
+""")
+
+world_carbon_history = Query('world_carbon_history', """
+    select year, sum(co2emissions) as WorldCarbon
+    from company.country_emissions ce
+    group by year
+    order by year desc
+""")
+
+cogs = Query('cogs', """
+    select date_part('year', date) as year, (totalrevenue -  grossprofit) as cogs
+    from company."financials_Income_Statement_yearly" fisy
+    where ticker_norm = ANY($1)
+    order by date_part('year', date) desc
+""")
+
+# if gross profit and total revenue are the same then we can use operating income
+cogs_from_operating_income = Query('cogs_from_operating_income', """
+    select date_part('year', date) as year, (totalrevenue -  operatingincome) as cogs
+    from company."financials_Income_Statement_yearly" fisy
+    where ticker_norm = ANY($1)
+    order by date_part('year', date) desc
+""")
+
+company_industry_average = Query('company_industry_average', """
+    select a.year, a.carbon_avg AS AVG_carbon, co.company_carbon
+    from company.industry_carbon_yearly a
+    join (
+        select year, cast(MAX(carbon) as NUMERIC) AS company_carbon
+        from company.carbon
+        where ticker_norm = $1
+        group by year
+        having MAX(carbon) is not null
+    ) co on co.year = a.year
+    where a.industry = coalesce($2::text, (
+            select industry
+            from "company"."General" g3
+            where g3.ticker_norm = $1
+        ))
+    order by a.year ASC
+""")
+
+# used while the in-memory search index is cold, the substring matches use the trigram index of
+# the 0005 migration
+search_company = Query('search_company', """
+    SELECT g.ticker, g.name, g.isin, g.cusip, g.cik,
+    concat(g.name, ' | ', g.ticker ) as value
+    FROM "company"."General" g
+    WHERE upper(coalesce(g.ticker, '') || ' ' || coalesce(g.name, '') || ' ' || coalesce(g.isin, '') || ' '
+                || coalesce(g.cusip, '') || ' ' || coalesce(g.cik, '')) like '%' || $1 || '%'
+    AND g.type = 'Common Stock'
+    order by g.ticker_norm = $1 desc, g.ticker_norm like $1 || '%' desc, upper(g.name) like $1 || '%' desc, g.ticker
+    LIMIT 20
+""")
+
+reference_companies = Query('reference_companies', """
+    SELECT g.ticker_norm, g.ticker, g.name, g.industry, g.sector, g.countryname, g.countryiso, g.exchange
+    FROM "company"."General" g
+    ORDER BY g.ticker_norm
+""")
+
+search_universe = Query('search_universe', """
+    SELECT g.ticker, g.name, g.isin, g.cusip, g.cik
+    FROM "company"."General" g
+    WHERE g.type = 'Common Stock'
+""")
+
+fund_holdings_weights = Query('fund_holdings_weights', """
+    select
+    fh.ticker as fund_Name,
+    g.ticker,
+    fh.sector,
+    fh.industry ,
+    max(fh.weight) as weight,
+    max(fh.assets_percent) as assets_percent,
+    max(c.carbon) as carbon
+    from "company"."fund_Holdings" fh
+    LEFT JOIN "company".fund_mapping fm on fh.name=fm.fund_name
+    LEFT join "company"."General" g on g.name = fm.mapped_name
+    LEFT join "company".carbon c on c.ticker_norm = g.ticker_norm
+    where fh.ticker_norm = $1
+    and c."year" = '2019'
+    group by g.ticker, fh.ticker,fh.sector, fh.industry
+""")
+
+fund_holdings = Query('fund_holdings', """
+    select *
+    from company."fund_Holdings" fh
+    where ticker = $1
+""")
+
+company_info = Query('company_info', """
+    select * from "company"."General" where ticker_norm = ANY($1)
+""")
+
+company_financials = Query('company_financials', """
+    select *, date_part('year', fisy.date) as year, g.ticker
+    from company."General" g
+    join company."financials_Balance_Sheet_yearly" fbsy ON fbsy.ticker = g.ticker
+    join company."financials_Cash_Flow_yearly" fcfy ON fcfy.ticker = fbsy.ticker AND fcfy.date = fbsy.date
+    join company."financials_Income_Statement_yearly" fisy ON fisy.ticker = fcfy.ticker AND fisy.date = fbsy.date
+    left join company."ESGScores" e on e.ticker = g.ticker
+    left join company."Earnings_Annual" ea on ea.ticker = g.ticker and ea.date = cast(fisy.date as text)
+    where g.ticker = ANY($1)
+    order by year desc
+""")
+
+# the scores are materialized per (ticker, year) by the 0004 migration
+global_score = Query('global_score', """
+    select ticker, industry, countryname, exchange, year, carbon, industavg, groupingnumrank, industmax, industmin,
+    globalmodelscore, globalmodelpercent
+    from company.global_score
+    where ticker_norm = $1
+    order by year
+""")
+
+# the scores of every holding of a portfolio in one roundtrip
+global_scores = Query('global_scores', """
+    select ticker, industry, countryname, exchange, year, carbon, industavg, groupingnumrank, industmax, industmin,
+    globalmodelscore, globalmodelpercent
+    from company.global_score
+    where ticker_norm = ANY($1)
+    order by ticker, year
+""")
+
+company_news = Query('company_news', """
+    select ticker, link, title, "date",	predicted_sentiment,	generated_summary
+    from company.news_analytics na
+    where ticker = ANY($1)
+    order by date desc
+""")
+
+company_chart_endpoints = Query('company_chart_endpoints', """
+    select *
+    from company.web_companypage_models wcm
+    where portfolio_model is not true
+""")
+
+portfolio_chart_endpoints = Query('portfolio_chart_endpoints', """
+    select *
+    from company.web_companypage_models wcm
+    where portfolio_model is true
+""")
+
+# $1-$5 are the financials of the company, $6 its country, $7 its sector and $8 its name
+related_companies = Query('related_companies', """
+    select distinct on (recommendation, g.name) g.name, g.ticker,
+    abs(fbsy.totalassets - $1::float8)* 1+
+    abs(fbsy.totalliab - $2::float8)* 5+
+    abs(fisy.grossprofit - $3::float8)* 1+
+    abs(fisy.totalrevenue - $4::float8)* 10+
+    abs(fisy.netincome - $5::float8)* 50+
+    (g.countryiso <> $6)::int* 100000000000000+
+    (g.sector <> $7)::int* 100000000000000
+    as recommendation,
+    case when  g.logourl<>'' then concat('https://eodhistoricaldata.com', g.logourl ) end as logourl
+    from company."General" g
+    join company."financials_Balance_Sheet_yearly" fbsy ON fbsy.ticker = g.ticker
+    join company."financials_Cash_Flow_yearly" fcfy ON fcfy.ticker = fbsy.ticker AND fcfy.date = fbsy.date
+    join company."financials_Income_Statement_yearly" fisy ON fisy.ticker = fcfy.ticker AND fisy.date = fbsy.date
+    left join company."ESGScores" e on e.ticker = g.ticker
+    left join company."Earnings_Annual" ea on ea.ticker = g.ticker and ea.date = cast(fisy.date as text)
+    where upper(g.name) != upper($8)
+    order by recommendation, g.name
+    limit 10
+""")
+
+# the equity together with the index and the risk free rate
+market_prices = Query('market_prices', """
+    select *
+    from company."EODprice" e
+    where e.ticker = ANY(ARRAY['GSPC.INDX', $1, 'US10Y.INDX'])
+    order by e,ticker
+""")
+
+company_carbon = Query('company_carbon', """
+    select *
+    from company."carbon" c
+    where ticker_norm = $1
+""")
+
+company_financial_statements = Query('company_financial_statements', """
+    select *
+    from company."General" g
+    join company."financials_Balance_Sheet_yearly" fbsy ON fbsy.ticker = g.ticker
+    join company."financials_Cash_Flow_yearly" fcfy ON fcfy.ticker = fbsy.ticker AND fcfy.date = fbsy.date
+    join company."financials_Income_Statement_yearly" fisy ON fisy.ticker = fcfy.ticker AND fisy.date = fbsy.date
+    left join company.carbon c on c.ticker_norm = g.ticker_norm and c.year = date_part('year', fisy.date)
+    left join company."ESGScores" e on e.ticker = g.ticker
+    left join company."Earnings_Annual" ea on ea.ticker = g.ticker and ea.date = cast(fisy.date as text)
+    where g.ticker = $1
+""")
+
+net_income_carbon = Query('net_income_carbon', """
+    select c.carbon, fisy.netincome,
+    round( (CAST (fisy.netincome AS float) / CAST (c.carbon AS float))::DECIMAL, 2) as NetIncomeOverCarbon,
+    c.year
+    from "company"."financials_Income_Statement_yearly" fisy
+    INNER JOIN company.carbon c ON c.ticker_norm = fisy.ticker_norm
+        and c.year =  EXTRACT(YEAR FROM CAST(fisy.date AS DATE))
+    where c.ticker_norm = $1
+    order by "date" asc
+""")
+
+co2_breakdown = Query('co2_breakdown', """
+    select c.carbon,
+    -- high level predictions
+    round( (CAST (c.carbon AS float) * .36 )::DECIMAL, 2) as StationaryCombustion,
+    round( (CAST (c.carbon AS float) * .1188 )::DECIMAL, 2) as StationaryCombustionFromPetroleumProducts,
+    round( (CAST (c.carbon AS float) * .0324 )::DECIMAL, 2) as StationaryCombustionFromCoal,
+    round( (CAST (c.carbon AS float) * 0.1476 )::DECIMAL, 2) as StationaryCombustionFromNaturalGas,
+    round( (CAST (c.carbon AS float) * 0.35 )::DECIMAL, 2) as MobileCombustion,
+    round( (CAST (c.carbon AS float) * 0.315 )::DECIMAL, 2) as MobileCombustionFromPetroleumProducts,
+    -- Petroleum Products
+    round( (CAST (c.carbon AS float) * .1188 * .9999497 )::DECIMAL, 2) as CO2FromPetroleumStationary,
+    round( (CAST (c.carbon AS float) * .1188 * .0000419 )::DECIMAL, 2) as MethaneFromPetroleumStationary,
+    round( (CAST (c.carbon AS float) * .1188 * .0000084 )::DECIMAL, 2) as NitroFromPetroleumStationary,
+    -- Coal products  by
+    round( (CAST (c.carbon AS float) * .0324 * .9998717 )::DECIMAL, 2) as CO2FromCoalStationary,
+    round( (CAST (c.carbon AS float) * .0324 * .000112 )::DECIMAL, 2) as MethaneFromCoalStationary,
+    round( (CAST (c.carbon AS float) * .0324 * .0000163 )::DECIMAL, 2) as NitroFromCoalStationary,
+    -- Natural Gas products  by
+    round( (CAST (c.carbon AS float) * .1476 * .9999793 )::DECIMAL, 2) as CO2FromNaturalGasStationary,
+    round( (CAST (c.carbon AS float) * .1476 * .0000188 )::DECIMAL, 2) as MethaneFromNaturalGasStationary,
+    round( (CAST (c.carbon AS float) * .1476 * .0000019 )::DECIMAL, 2) as NitroFromNaturalGasStationary,
+    -- Mobile combustion products  by
+    round( (CAST (c.carbon AS float) * .315 * .9998707 )::DECIMAL, 2) as CO2FromPetroleumMobile,
+    round( (CAST (c.carbon AS float) * .315 * .00011 )::DECIMAL, 2) as MethaneFromPetroleumMobile,
+    round( (CAST (c.carbon AS float) * .315 * .00000193 )::DECIMAL, 2) as NitroFromPetroleumMobile,
+    c.year
+    from "company"."financials_Income_Statement_yearly" fisy
+    INNER JOIN company.carbon c ON c.ticker_norm = fisy.ticker_norm
+        and c.year =  EXTRACT(YEAR FROM CAST(fisy.date AS DATE))
+    where c.ticker_norm = $1
+    order by "date" asc
+""")
+
+equivalencies_calculator = Query('equivalencies_calculator', """
+    select c.carbon,
+    round( (CAST (fisy.netincome AS float) / CAST (c.carbon AS float))::DECIMAL, 2) as NetIncomeOverCarbon,
+    round( (CAST (c.carbon AS float) * 121643 )::DECIMAL, 2) as NumSmartPhones,
+    round( (CAST (c.carbon AS float) * 113 )::DECIMAL, 2) as GasolineConsumedGallons,
+    round( (CAST (c.carbon AS float) * 1105 )::DECIMAL, 2) as poundsCoalBurned,
+    round( (CAST (c.carbon AS float) * 0.182 )::DECIMAL, 2) as homeElectricityOneYear,
+    round( (CAST (c.carbon AS float) * 2513 )::DECIMAL, 2) as milesDrivenByAverageCar,
+    round( (CAST (c.carbon AS float) * 0.217 )::DECIMAL, 2) as vhiclesDrivenOneYear,
+    round( (CAST (c.carbon AS float) * 98.2 )::DECIMAL, 2) as DieselConsumedInGallons,
+    round( (CAST (c.carbon AS float) * 0.12 )::DECIMAL, 2) as HomeEnergyUseForYear,
+    -- Greenhouse gas avoided by
+    round( (CAST (c.carbon AS float) * 37.9 )::DECIMAL, 2) as lampsSwitchedTOLEDs,
+    round( (CAST (c.carbon AS float) * 0.34 )::DECIMAL, 2) as WasteRecycledInsteadLandfilled,
+    round( (CAST (c.carbon AS float) * 42.5 )::DECIMAL, 2) as TrashBagsRecycledInsteadOfLandfilled,
+    round( (CAST (c.carbon AS float) * 0.0002 )::DECIMAL, 2) as windTurbinesRunningForYear,
+    -- Carbon Sequestered by
+    round( (CAST (c.carbon AS float) * 16.5 )::DECIMAL, 2) as TreesSeedlingsGrownforDecade,
+    round( (CAST (c.carbon AS float) * 1.2 )::DECIMAL, 2) as AcresOfForstOneYear,
+    -- Carbon food
+    round( (CAST (c.carbon AS float) * 47.61 )::DECIMAL, 2) as CheeseProducedInKG,
+    round( (CAST (c.carbon AS float) * 333.33 )::DECIMAL, 2) as MilkProducedInKG,
+    round( (CAST (c.carbon AS float) * 250 )::DECIMAL, 2) as RiceProducedInKG,
+    round( (CAST (c.carbon AS float) * 166.67 )::DECIMAL, 2) as PoultryMeatProducedInKG,
+    c.year
+    from "company"."financials_Income_Statement_yearly" fisy
+    INNER JOIN company.carbon c ON c.ticker_norm = fisy.ticker_norm
+        and c.year =  EXTRACT(YEAR FROM CAST(fisy.date AS DATE))
+    where c.ticker_norm = $1
+    order by "date" asc
+""")
+
+# recomputes the (industry, year) aggregates and global scores marked dirty since the last refresh
+refresh_industry_carbon = Query('refresh_industry_carbon', """
+    select company.refresh_industry_carbon_yearly() as refreshed
+""")
@@ -0,0 +1,156 @@
+import sys
+import time
+import asyncio
+import logging
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional
+from db_connection import Database
+import named_queries as queries
+
+logger = logging.getLogger('REFERENCE_DATA')
+
+_FIELDS = ('ticker', 'name', 'industry', 'sector', 'countryname', 'countryiso', 'exchange')
+
+
+class BackgroundLoaded(ABC):
+    """
+    Per-worker data loaded lazily in the background and reloaded every `refresh_interval`
+    seconds, a failed or empty load is retried after `retry_interval` seconds. Lookups call
+    `_refresh_in_background` and never wait for the database.
+    """
+    description = 'reference data'
+
+    def __init__(self, refresh_interval: float = 60 * 60, retry_interval: float = 30):
+        self._refresh_interval = refresh_interval
+        self._retry_interval = retry_interval
+
+        self._attempted_at = None
+        self._loading: Optional[asyncio.Task] = None
+
+    @property
+    @abstractmethod
+    def loaded(self) -> bool:
+        ...
+
+    @abstractmethod
+    async def load(self):
+        ...
+
+    def _refresh_in_background(self):
+        if self._loading is not None and not self._loading.done():
+            return
+
+        interval = self._refresh_interval if self.loaded else self._retry_interval
+        if self._attempted_at is not None and time.monotonic() - self._attempted_at < interval:
+            return
+
+        self._attempted_at = time.monotonic()
+        self._loading = asyncio.get_event_loop().create_task(self._safe_load())
+
+    async def _safe_load(self):
+        try:
+            await self.load()
+        except Exception as exp:
+            logger.error(f'Failed to load the {self.description}: {exp}')
+
+
+class ReferenceData(BackgroundLoaded):
+    """
+    Per-worker copy of the slowly changing company facts of company."General": industry,
+    sector and country of every ticker. The columns are kept as lists of interned strings
+    indexed by row, with a ticker -> row index, so the models resolve these facts without a
+    subquery. Until the first load finishes every lookup returns None and the callers fall
+    back to the database. The copy is reloaded when the general dataset is bumped, see
+    cache.versions.DatasetVersions.
+    """
+    description = 'reference data'
+
+    def __init__(self, db: Database, refresh_interval: float = 60 * 60, retry_interval: float = 30):
+        super().__init__(refresh_interval, retry_interval)
+        self._db = db
+
+        self._columns: Dict[str, List[Optional[str]]] = {}
+        self._rows: Optional[Dict[str, int]] = None
+
+    @property
+    def loaded(self) -> bool:
+        return self._rows is not None
+
+    def __len__(self):
+        return len(self._rows or ())
+
+    # returns whether the data was loaded
+    async def load(self) -> bool:
+        rows = await self._db.fetch(queries.reference_companies)
+
+        # the pool may not be connected yet, try again after the retry interval
+        if not rows:
+            logger.warning('Could not load the reference data')
+            return False
+
+        self.build(rows)
+        logger.info(f'Loaded the reference data of {len(self)} tickers')
+        return True
+
+    def build(self, rows):
+        columns: Dict[str, List[Optional[str]]] = {field: [] for field in _FIELDS}
+        positions: Dict[str, int] = {}
+
+        for row in rows:
+            ticker = row['ticker_norm']
+            # the first row wins when a ticker is listed twice
+            if not ticker or ticker in positions:
+                continue
+
+            ticker = sys.intern(ticker)
+            positions[ticker] = len(positions)
+            for field in _FIELDS:
+                value = row[field]
+                columns[field].append(sys.intern(value) if isinstance(value, str) else value)
+
+        self._columns = columns
+        self._rows = positions
+
+    # on demand, e.g. after a load of company."General"
+    async def refresh(self) -> bool:
+        self._attempted_at = time.monotonic()
+        return await self.load()
+
+    def _position(self, ticker: str) -> Optional[int]:
+        self._refresh_in_background()
+
+        if self._rows is None:
+            return None
+
+        return self._rows.get(ticker.strip().upper())
+
+    # True or False once the tickers are loaded, None while the data is still cold
+    def is_known(self, ticker: str) -> Optional[bool]:
+        self._refresh_in_background()
+
+        if self._rows is None:
+            return None
+
+        return ticker.strip().upper() in self._rows
+
+    def company(self, ticker: str) -> Optional[dict]:
+        position = self._position(ticker)
+        if position is None:
+            return None
+
+        return {field: values[position] for field, values in self._columns.items()}
+
+    def get(self, ticker: str, field: str) -> Optional[str]:
+        position = self._position(ticker)
+        if position is None:
+            return None
+
+        return self._columns[field][position]
+
+    # the industry shared by all the tickers, None when unknown or when they differ
+    def industry_of(self, tickers: List[str]) -> Optional[str]:
+        industries = {self.get(ticker, 'industry') for ticker in tickers}
+        if len(industries) != 1:
+            return None
+
+        return industries.pop()
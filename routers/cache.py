@@ -0,0 +1,55 @@
+import os
+import logging
+from typing import List
+from pydantic import BaseModel
+from fastapi import APIRouter, Depends
+from cache.apiroute import cache_stats, invalidate, bump_dataset_versions
+from db_sessions import main_db_instance
+from utils import reference_data
+from dependencies.validation import validate_token_dependency, admin_dependency
+
+logger = logging.getLogger('CACHE_ROUTER')
+
+
+class CacheDeleteRequest(BaseModel):
+    patterns: List[str] = []  # glob patterns, e.g. /company/IBM.US/*
+    tags: List[str] = []  # e.g. ticker:IBM.US, router:portfolio, dataset:carbon
+
+
+class DatasetBumpRequest(BaseModel):
+    datasets: List[str]  # e.g. carbon, eodprice, financials
+
+
+router = APIRouter(
+    prefix='/cache',
+    tags=['cache'],
+    responses={404: {'description': 'Not found'}},
+    dependencies=[Depends(validate_token_dependency)]
+)
+
+
+# hit/miss counters of the caching tiers and timings of the named queries, all per worker
+@router.get('/stats')
+async def get_cache_stats_controller():
+    return {'pid': os.getpid(), **cache_stats(), 'queries': main_db_instance.query_stats()}
+
+
+@router.delete('/delete', dependencies=[Depends(admin_dependency)])
+async def cache_delete_controller(body: CacheDeleteRequest):
+    logger.info(f'Deleting cache keys for patterns: {body.patterns} and tags: {body.tags}')
+
+    deleted_keys = await invalidate(body.patterns, body.tags)
+    return deleted_keys
+
+
+# invalidates every cached response derived from the datasets without touching the keys
+@router.post('/datasets/bump', dependencies=[Depends(admin_dependency)])
+async def bump_dataset_versions_controller(body: DatasetBumpRequest):
+    return await bump_dataset_versions(body.datasets)
+
+
+# reloads company."General" into this worker now, the other workers reload on their schedule
+@router.post('/reference-data/refresh', dependencies=[Depends(admin_dependency)])
+async def refresh_reference_data_controller():
+    await reference_data.refresh()
+    return {'pid': os.getpid(), 'loaded': reference_data.loaded, 'tickers': len(reference_data)}
@@ -2,9 +2,10 @@ import logging
 from typing import Optional
 from models_logic import *
 from db_sessions import main_db_instance
+import named_queries as queries
 from fastapi import APIRouter, Depends
-from fastapi.encoders import jsonable_encoder
 from cache.apiroute import CachingLayerRoute
+from serialization import RecordJSONResponse
 from dependencies.validation import validate_token_dependency
 from task_scheduler.cpu_bound import CPUBoundTaskScheduler
 from utils import schedule_task
@@ -34,21 +35,20 @@ router.route_class = CachingLayerRoute
 async def get_company_footprint_controller(company_ticker: str):
     logger.info(f"Getting {company_ticker} ticker carbon footprint data")
     footprint = await get_carbon_footprint(company_ticker)
-    footprint_json = jsonable_encoder(footprint)
-    return footprint_json
+    return RecordJSONResponse(footprint)
 
 
 @router.get("/{company_ticker}/related-companies")
 async def get_related_companies_controller(company_ticker: str):
     logger.info(f'Getting related companies of {company_ticker} ticker')
     related_companies = await get_related_companies(company_ticker)
-    return related_companies
+    return RecordJSONResponse(related_companies)
 
 
 @router.get("/{company_ticker}/news")
 async def get_news_company_controller(company_ticker: str):
     company_news = await get_company_news(company_ticker)
-    return company_news
+    return RecordJSONResponse(company_news)
 
 
 # carbon historical
@@ -58,7 +58,7 @@ async def get_company_sum_historic_carbon_controller(
         year_range: int
 ):
     historic_carbon = await get_sum_historic_carbon(company_ticker, year_range)
-    return historic_carbon
+    return RecordJSONResponse(historic_carbon)
 
 # carbon temp conversation
 @router.get("/{company_ticker}/temperatureconversion/{year_range}")
@@ -67,20 +67,20 @@ async def get_company_temperature_conversion_controller(
         year_range: int
 ):
     temperature_conversion = await get_temperature_conversion(company_ticker, year_range)
-    return temperature_conversion
+    return RecordJSONResponse(temperature_conversion)
 
 # company industry sum - take company and return time series of average within it's industry
 @router.get("/{company_ticker}/industry-sum")
 async def get_company_industry_sum_controller(company_ticker: str):
     industry_sum = await get_industry_sum(company_ticker)
-    return industry_sum
+    return RecordJSONResponse(industry_sum)
 
 
 # company carbon efficiently
 @router.get("/{company_ticker}/EmissionsEfficiency")
 async def get_company_emissions_efficiency_controller(company_ticker: str):
     emissions_efficiency = await get_emissions_efficiency(company_ticker)
-    return emissions_efficiency
+    return RecordJSONResponse(emissions_efficiency)
 
 
 # company carbon efficiently
@@ -91,7 +91,7 @@ async def get_company_carbon_tax_controller(
         financial_column: Optional[str] = 'netincome'
 ):
     carbon_tax = await get_carbon_tax(company_ticker, financial_column)
-    return carbon_tax
+    return RecordJSONResponse(carbon_tax)
 
 
 # company industry averages - take company and return time series of average within it's industry
@@ -100,7 +100,7 @@ async def get_company_industry_average_controller(
         company_ticker: str
 ):
     industry_average = await get_company_industry_average(company_ticker)
-    return jsonable_encoder(industry_average)
+    return RecordJSONResponse(industry_average)
 
 
 @router.get("/{company_ticker}/industry-temp-impact/{year}")
@@ -109,7 +109,7 @@ async def get_company_industry_temp_impact_controller(
         year: int
 ):
     ind_temp_impact = await get_industry_temp_impact(company_ticker, year)
-    return ind_temp_impact
+    return RecordJSONResponse(ind_temp_impact)
 
 
 # company carbon over net income
@@ -117,23 +117,8 @@ async def get_company_industry_temp_impact_controller(
 async def get_company_net_income_over_carbon_controller(
         company_ticker: str
 ):
-    query_statement = """
-    select c.carbon, fisy.netincome,
-    round( (CAST (fisy.netincome AS float) / CAST (c.carbon AS float))::DECIMAL, 2) as NetIncomeOverCarbon,
-    c.year
-
-    from "company"."financials_Income_Statement_yearly" fisy
-
-    INNER JOIN company.carbon c ON upper(c.ticker) = upper(fisy.ticker)
-        and c.year =  EXTRACT(YEAR FROM CAST(fisy.date AS DATE))
-
-    where upper(c.ticker) = $1
-
-    order by "date" asc
-    """
-
-    result_data = await main_db_instance.fetch_rows(query_statement, company_ticker.upper())
-    return jsonable_encoder(result_data)
+    result_data = await main_db_instance.fetch(queries.net_income_carbon, company_ticker.upper())
+    return RecordJSONResponse(result_data)
 
 
 # 15Rock model score
@@ -141,36 +126,8 @@ async def get_company_net_income_over_carbon_controller(
 async def get_company_15rock_global_score_controller(
         company_ticker: str
 ):
-    query_statement = """
-    with data as
-    (select g.ticker, g.industry , g.countryname, g.exchange, c.carbon, c.year,
-    ROW_NUMBER() OVER (
-    PARTITION BY g.industry,c."year" --, g.exchange
-    ORDER BY c.carbon ASC
-    ) AS groupingNumRank,
-    AVG(c.carbon) over (
-    PARTITION BY g.industry, c."year" --, g.exchange
-    ) as industavg,
-    --sql test
-    max(c.carbon) over (
-    PARTITION BY g.industry, c."year" --, g.exchange
-    ) as industMAX,
-    min(c.carbon) over (
-    PARTITION BY g.industry, c."year" --, g.exchange
-    ) as industMIN
-    from company."General" g
-    INNER JOIN company.carbon c ON upper(c.ticker) =g.ticker
-    --and c.year = '2019'
-    )
-    select ticker, industry , countryname, exchange, year, carbon, industavg, groupingNumRank, industMAX, industMIN, (data.industavg/data.carbon) as GlobalModelScore, ( 100 - ROUND(data.carbon * 100.0 / data.industMAX, 2)  )AS GlobalModelPercent
-    from data
-    -- comment below to get entire sector
-    where upper(data.ticker) = $1
-
-    """
-
-    result_data = await main_db_instance.fetch_rows(query_statement, company_ticker.upper())
-    return jsonable_encoder(result_data)
+    result_data = await main_db_instance.fetch(queries.global_score, company_ticker.upper())
+    return RecordJSONResponse(result_data)
 
 
 # carbon breakdown
@@ -178,51 +135,8 @@ async def get_company_15rock_global_score_controller(
 async def get_company_15rock_co2_breakdown_controller(
         company_ticker: str
 ):
-    query_statement = """
-
-    select c.carbon,
-    --round( (CAST (fisy.netincome AS float) / CAST (c.carbon AS float))::DECIMAL, 2) as NetIncomeOverCarbon,
-    -- high level predictions
-    round( (CAST (c.carbon AS float) * .36 )::DECIMAL, 2) as StationaryCombustion,
-    round( (CAST (c.carbon AS float) * .1188 )::DECIMAL, 2) as StationaryCombustionFromPetroleumProducts,
-    round( (CAST (c.carbon AS float) * .0324 )::DECIMAL, 2) as StationaryCombustionFromCoal,
-    round( (CAST (c.carbon AS float) * 0.1476 )::DECIMAL, 2) as StationaryCombustionFromNaturalGas,
-    round( (CAST (c.carbon AS float) * 0.35 )::DECIMAL, 2) as MobileCombustion,
-    round( (CAST (c.carbon AS float) * 0.315 )::DECIMAL, 2) as MobileCombustionFromPetroleumProducts,
-    -- Petroleum Products
-    round( (CAST (c.carbon AS float) * .1188 * .9999497 )::DECIMAL, 2) as CO2FromPetroleumStationary,
-    round( (CAST (c.carbon AS float) * .1188 * .0000419 )::DECIMAL, 2) as MethaneFromPetroleumStationary,
-    round( (CAST (c.carbon AS float) * .1188 * .0000084 )::DECIMAL, 2) as NitroFromPetroleumStationary,
-    -- Coal products  by
-    round( (CAST (c.carbon AS float) * .0324 * .9998717 )::DECIMAL, 2) as CO2FromCoalStationary,
-    round( (CAST (c.carbon AS float) * .0324 * .000112 )::DECIMAL, 2) as MethaneFromCoalStationary,
-    round( (CAST (c.carbon AS float) * .0324 * .0000163 )::DECIMAL, 2) as NitroFromCoalStationary,
-    -- Natural Gas products  by
-    round( (CAST (c.carbon AS float) * .1476 * .9999793 )::DECIMAL, 2) as CO2FromNaturalGasStationary,
-    round( (CAST (c.carbon AS float) * .1476 * .0000188 )::DECIMAL, 2) as MethaneFromNaturalGasStationary,
-    round( (CAST (c.carbon AS float) * .1476 * .0000019 )::DECIMAL, 2) as NitroFromNaturalGasStationary,
-    -- Mobile combustion products  by
-    round( (CAST (c.carbon AS float) * .315 * .9998707 )::DECIMAL, 2) as CO2FromPetroleumMobile,
-    round( (CAST (c.carbon AS float) * .315 * .00011 )::DECIMAL, 2) as MethaneFromPetroleumMobile,
-    round( (CAST (c.carbon AS float) * .315 * .00000193 )::DECIMAL, 2) as NitroFromPetroleumMobile,
-
-    c.year
-
-
-
-    from "company"."financials_Income_Statement_yearly" fisy
-
-    INNER JOIN company.carbon c ON upper(c.ticker) = upper(fisy.ticker)
-        and c.year =  EXTRACT(YEAR FROM CAST(fisy.date AS DATE))
-
-    where upper(c.ticker) = $1
-
-    order by "date" asc
-
-    """
-
-    result_data = await main_db_instance.fetch_rows(query_statement, company_ticker.upper())
-    return jsonable_encoder(result_data)
+    result_data = await main_db_instance.fetch(queries.co2_breakdown, company_ticker.upper())
+    return RecordJSONResponse(result_data)
 
 
 # carbon  Equivalencies Calculator
@@ -230,50 +144,8 @@ async def get_company_15rock_co2_breakdown_controller(
 async def get_company_15rock_equivalencies_calculator_controller(
         company_ticker: str
 ):
-    query_statement = """
-
-    select c.carbon,
-    round( (CAST (fisy.netincome AS float) / CAST (c.carbon AS float))::DECIMAL, 2) as NetIncomeOverCarbon,
-    round( (CAST (c.carbon AS float) * 121643 )::DECIMAL, 2) as NumSmartPhones,
-    round( (CAST (c.carbon AS float) * 113 )::DECIMAL, 2) as GasolineConsumedGallons,
-    round( (CAST (c.carbon AS float) * 1105 )::DECIMAL, 2) as poundsCoalBurned,
-    round( (CAST (c.carbon AS float) * 0.182 )::DECIMAL, 2) as homeElectricityOneYear,
-    round( (CAST (c.carbon AS float) * 2513 )::DECIMAL, 2) as milesDrivenByAverageCar,
-    round( (CAST (c.carbon AS float) * 0.217 )::DECIMAL, 2) as vhiclesDrivenOneYear,
-    round( (CAST (c.carbon AS float) * 98.2 )::DECIMAL, 2) as DieselConsumedInGallons,
-    round( (CAST (c.carbon AS float) * 0.12 )::DECIMAL, 2) as HomeEnergyUseForYear,
-    -- Greenhouse gas avoided by
-    round( (CAST (c.carbon AS float) * 37.9 )::DECIMAL, 2) as lampsSwitchedTOLEDs,
-    round( (CAST (c.carbon AS float) * 0.34 )::DECIMAL, 2) as WasteRecycledInsteadLandfilled,
-    round( (CAST (c.carbon AS float) * 42.5 )::DECIMAL, 2) as TrashBagsRecycledInsteadOfLandfilled,
-    round( (CAST (c.carbon AS float) * 0.0002 )::DECIMAL, 2) as windTurbinesRunningForYear,
-    -- Carbon Sequestered by
-    round( (CAST (c.carbon AS float) * 16.5 )::DECIMAL, 2) as TreesSeedlingsGrownforDecade,
-    round( (CAST (c.carbon AS float) * 1.2 )::DECIMAL, 2) as AcresOfForstOneYear,
-
-    -- Carbon food
-    round( (CAST (c.carbon AS float) * 47.61 )::DECIMAL, 2) as CheeseProducedInKG,
-    round( (CAST (c.carbon AS float) * 333.33 )::DECIMAL, 2) as MilkProducedInKG,
-    round( (CAST (c.carbon AS float) * 250 )::DECIMAL, 2) as RiceProducedInKG,
-    round( (CAST (c.carbon AS float) * 166.67 )::DECIMAL, 2) as PoultryMeatProducedInKG,  
-
-    c.year
-
-
-
-    from "company"."financials_Income_Statement_yearly" fisy
-
-    INNER JOIN company.carbon c ON upper(c.ticker) = upper(fisy.ticker)
-        and c.year =  EXTRACT(YEAR FROM CAST(fisy.date AS DATE))
-
-    where upper(c.ticker) = $1
-
-    order by "date" asc
-
-    """
-
-    result_data = await main_db_instance.fetch_rows(query_statement, company_ticker.upper())
-    return jsonable_encoder(result_data)
+    result_data = await main_db_instance.fetch(queries.equivalencies_calculator, company_ticker.upper())
+    return RecordJSONResponse(result_data)
 
 
 # historical prices
@@ -284,7 +156,7 @@ async def get_company_historical_prices_controller(
         limit_date: Optional[int] = 4000
 ):
     historical_prices = await get_historical_prices(company_ticker, limit_date)
-    return historical_prices
+    return RecordJSONResponse(historical_prices)
 
 
 @router.get("/{company_ticker}/valuation")
@@ -292,7 +164,7 @@ async def get_company_valuation_controller(
         company_ticker: str
 ):
     company_valuation = await get_company_valuation(company_ticker)
-    return company_valuation
+    return RecordJSONResponse(company_valuation)
 
 
 @router.get("/{company_ticker}/carbongrowthrate")
@@ -300,7 +172,7 @@ async def get_company_carbon_growth_rate_controller(
         company_ticker: str
 ):
     carbon_growth_rate = await get_carbon_growth_rate(company_ticker)
-    return carbon_growth_rate
+    return RecordJSONResponse(carbon_growth_rate)
 
 
 @router.get("/{company_ticker}/carboncapture")
@@ -308,7 +180,7 @@ async def get_company_carbon_capture_controller(
         company_ticker: str
 ):
     carbon_capture = await get_carbon_capture(company_ticker)
-    return carbon_capture
+    return RecordJSONResponse(carbon_capture)
 
 
 @router.get("/{company_ticker}/productionefficency")
@@ -316,7 +188,7 @@ async def get_company_production_efficiency_controller(
         company_ticker: str
 ):
     production_efficiency = await get_production_efficiency(company_ticker)
-    return production_efficiency
+    return RecordJSONResponse(production_efficiency)
 
 
 # company carbon alpha
@@ -326,7 +198,7 @@ async def get_company_carbon_alpha_controller(
         pct_carbon: int
 ):
     carbon_alpha = await get_carbon_alpha(company_ticker, pct_carbon)
-    return carbon_alpha
+    return RecordJSONResponse(carbon_alpha)
 
 
 # getCarbonTransitionRisk
@@ -337,7 +209,7 @@ async def get_company_carbon_transition_risk_controller(
         pct_carbon: Optional[int] = 3,
 ):
     carbon_trans_risk = await get_carbon_transition_risk(company_ticker, pct_carbon)
-    return carbon_trans_risk
+    return RecordJSONResponse(carbon_trans_risk)
 
 
 # get cogs
@@ -347,7 +219,7 @@ async def get_company_cogs_controller(
 ):
     logger.info(f'Getting COGS for {company_ticker}')
     cogs = await get_cogs(company_ticker)
-    return cogs
+    return RecordJSONResponse(cogs)
 
 
 # getCarbonBudget
@@ -356,7 +228,7 @@ async def get_company_carbon_budget_controller(company_ticker: str):
     logging.info(f"Calculating carbon budget for {company_ticker}")
 
     carbon_budget = await schedule_task(scheduler, get_carbon_budget, company_ticker)
-    return jsonable_encoder(carbon_budget)
+    return RecordJSONResponse(carbon_budget)
 
 
 # financials
@@ -366,7 +238,7 @@ async def get_company_financials_controller(
 ):
     logger.info(f'Getting financials for {company_ticker}')
     financials = await get_company_financials(company_ticker)
-    return financials
+    return RecordJSONResponse(financials)
 
 
 # general info on company
@@ -376,4 +248,4 @@ async def get_company_summary_controller(
         company_ticker: str,
 ):
     company_info = await get_company_info(company_ticker)
-    return company_info
+    return RecordJSONResponse(company_info)
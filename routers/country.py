@@ -5,8 +5,8 @@ from models_logic import (
     get_world_carbon_history,
     get_country_carbon_history
 )
-from fastapi.encoders import jsonable_encoder
 from cache.apiroute import CachingLayerRoute
+from serialization import RecordJSONResponse
 from dependencies.validation import validate_token_dependency
 
 logger = logging.getLogger('COUNTRY_ROUTER')
@@ -25,7 +25,7 @@ router.route_class = CachingLayerRoute
 async def get_country_carbon_controller(country: str):
     logger.info(f'Getting country carbon for {country}')
     country_carbon = await get_country_carbon_history(country)
-    return country_carbon
+    return RecordJSONResponse(country_carbon)
 
 
 # country tax
@@ -35,7 +35,7 @@ async def get_country_tax_regime_controller(
 ):
     logger.info(f'Getting country tax regime for {country}')
     country_tax = await get_country_tax(country)
-    return country_tax
+    return RecordJSONResponse(country_tax)
 
 
 # get world - getWorldCarbonHistory
@@ -43,4 +43,4 @@ async def get_country_tax_regime_controller(
 async def get_world_carbon_history_controller():
     logger.info(f'Getting world carbon history')
     wc_history = await get_world_carbon_history()
-    return wc_history
+    return RecordJSONResponse(wc_history)
@@ -1,11 +1,11 @@
 import logging
-from fastapi import APIRouter, Header, Depends, HTTPException
+from fastapi import APIRouter, Header, Depends, HTTPException, Request
 from fastapi.responses import JSONResponse
 from fastapi.encoders import jsonable_encoder
-from utils import validate_token
 from db_sessions import main_db_instance
+from utils import user_profiles
 from pydantic import BaseModel
-from dependencies.validation import validate_token_dependency
+from dependencies.validation import validate_token_dependency, token_claims
 
 logger = logging.getLogger('FUND_ROUTER')
 
@@ -26,17 +26,39 @@ class FundHoldingCheckRequest(BaseRequest):
     pass
 
 
-async def get_user_info(authorization: str = Header('')):
-    _, data = validate_token(authorization)
-    user_info = await main_db_instance.fetch_rows(
-        "select userid, email, client_type from company.user_profile where email = $1",
-        data['email']
+_insert_holding_query = """
+    INSERT INTO company.user_fund_holding (fund_id, ticker, shares_num)
+    VALUES ($1, $2, $3)
+    RETURNING *
+"""
+
+# the fund is created with the first holding. Concurrent first holdings of a user conflict on the
+# unique user_id of the 0006 migration, the upsert locks the fund row and returns its id
+_create_fund_and_insert_holding_query = """
+    WITH fund AS (
+        INSERT INTO company.user_fund_details (user_id, fund_name, fund_description)
+        VALUES ($1, 'test fund', 'test description')
+        ON CONFLICT (user_id) DO UPDATE SET user_id = excluded.user_id
+        RETURNING fund_id
     )
+    INSERT INTO company.user_fund_holding (fund_id, ticker, shares_num)
+    SELECT fund_id, $2, $3 FROM fund
+    RETURNING *
+"""
 
-    if len(user_info) == 0:
+
+# userid, email, client_type and fund_id of the token holder, cached per worker
+async def get_user_info(request: Request, authorization: str = Header('')):
+    data = token_claims(request, authorization)
+    if data is None:
+        raise HTTPException(status_code=401, detail='Invalid token')
+
+    user_info = await user_profiles.get(data['email'])
+
+    if user_info is None:
         raise HTTPException(status_code=404, detail='User not found')
 
-    return dict(user_info[0].items())
+    return user_info
 
 
 router = APIRouter(
@@ -51,25 +73,15 @@ router = APIRouter(
 @router.put('')
 async def add_to_fund(body: FundAddRequest, user_info: dict = Depends(get_user_info)):
     try:
-        email, user_id = user_info['email'], user_info['userid']
+        email, user_id, fund_id = user_info['email'], user_info['userid'], user_info['fund_id']
         ticker, nshares = body.ticker.upper(), body.shares
 
-        # get the fund id
-        fund_details = await main_db_instance.fetch_rows(
-            f"SELECT fund_id from company.user_fund_details where user_id=$1",
-            user_id
-        )
-
-        if len(fund_details) == 0:
-            fund_details = await main_db_instance.fetch_rows(f"INSERT INTO company.user_fund_details"
-                                                             f" (user_id, fund_name, fund_description)"
-                                                             f" VALUES ({user_id}, 'test fund', 'test description')"
-                                                             f" RETURNING *")
-
-        # insert the ticker to user holdings
-        res = await main_db_instance.fetch_rows(f"INSERT INTO company.user_fund_holding (fund_id, ticker, shares_num)"
-                                                f" VALUES ({fund_details[0]['fund_id']}, '{ticker}', {nshares})"
-                                                f" RETURNING *")
+        if fund_id is not None:
+            res = await main_db_instance.fetch_rows(_insert_holding_query, fund_id, ticker, nshares)
+        else:
+            res = await main_db_instance.fetch_rows(_create_fund_and_insert_holding_query, user_id, ticker, nshares)
+            if res:
+                user_profiles.update(email, fund_id=res[0]['fund_id'])
 
         return JSONResponse(jsonable_encoder(res), status_code=200)
 
@@ -82,19 +94,17 @@ async def add_to_fund(body: FundAddRequest, user_info: dict = Depends(get_user_i
 @router.delete('')
 async def delete_from_fund(body: FundHoldingCheckRequest, user_info: dict = Depends(get_user_info)):
     try:
-        email, user_id = user_info['email'], user_info['userid']
+        fund_id = await user_profiles.fund_id(user_info)
         ticker = body.ticker.upper()
 
-        # get the fund id
-        fund_details = await main_db_instance.fetch_rows(
-            f"SELECT fund_id from company.user_fund_details where user_id=$1",
-            user_id
-        )
+        if fund_id is None:
+            return JSONResponse([])
 
         # delete the ticker from the user holdings
-        res = await main_db_instance.fetch_rows(f"DELETE FROM company.user_fund_holding"
-                                                f" WHERE fund_id='{fund_details[0]['fund_id']}' AND ticker='{ticker}'"
-                                                f" RETURNING *")
+        res = await main_db_instance.fetch_rows(
+            "DELETE FROM company.user_fund_holding WHERE fund_id = $1 AND ticker = $2 RETURNING *",
+            fund_id, ticker
+        )
 
         return JSONResponse(jsonable_encoder(res))
 
@@ -110,19 +120,15 @@ async def check_if_fund_holding_exists(ticker: str, user_info: dict = Depends(ge
 
     try:
         ticker = ticker.upper()
-        email, user_id = user_info['email'], user_info['userid']
-
-        # does holding exist
-        query = f"""
-        select count(*) 
-        from company.user_fund_holding ufh, company.user_fund_details ufd, company.user_profile up 
-        where ufd.fund_id = ufh.fund_id 
-        and up.userid = ufd.user_id 
-        and up.userid = $1
-        and ufh.ticker = $2
-        """
-        fund_holding = await main_db_instance.fetch_rows(query, user_id, ticker)
-        count = fund_holding[0]['count']
+        fund_id = await user_profiles.fund_id(user_info)
+
+        count = 0
+        if fund_id is not None:
+            fund_holding = await main_db_instance.fetch_rows(
+                "select count(*) from company.user_fund_holding where fund_id = $1 and ticker = $2",
+                fund_id, ticker
+            )
+            count = fund_holding[0]['count']
 
         logger.info(f'Found {count} {ticker} holding(s) for user {user_info["email"]}')
         return {'exists': count != 0}
@@ -137,18 +143,17 @@ async def get_user_holdings(user_info: dict = Depends(get_user_info)):
     logger.info(f"getting {user_info['email']} investment holdings")
 
     try:
-        email, user_id = user_info['email'], user_info['userid']
-
-        # does holding exist
-        query = f"""
-        select ticker, shares_num, fund_name, fund_description
-        from company.user_fund_holding ufh, company.user_fund_details ufd, company.user_profile up 
-        where ufd.fund_id = ufh.fund_id 
-        and up.userid = ufd.user_id 
-        and up.userid = $1
-        """
-        fund_holding = await main_db_instance.fetch_rows(query, user_id)
-        # count = fund_holding
+        fund_id = await user_profiles.fund_id(user_info)
+
+        fund_holding = []
+        if fund_id is not None:
+            query = """
+            select ticker, shares_num, fund_name, fund_description
+            from company.user_fund_holding ufh
+            join company.user_fund_details ufd on ufd.fund_id = ufh.fund_id
+            where ufh.fund_id = $1
+            """
+            fund_holding = await main_db_instance.fetch_rows(query, fund_id)
 
         logger.info(f'Found holding(s) for user {user_info["email"]}')
         return {'holdings': fund_holding}
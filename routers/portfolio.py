@@ -1,8 +1,10 @@
 import logging
 import pandas as pd
-from fastapi import APIRouter, Depends, Body
+from typing import Dict, Optional
+from fastapi import APIRouter, Depends, Body, HTTPException, Response
 from fastapi.encoders import jsonable_encoder
 from cache.apiroute import CachingLayerRoute
+from serialization import RecordJSONResponse
 from dependencies.validation import validate_token_dependency
 from models_logic import (
     get_cogs,
@@ -32,7 +34,8 @@ async def get_portfolio_carbon_footprint_controller(
         func: str = Body(...),
 ):
     portfolioDF = pd.DataFrame()
-    jsonResults = await get_carbon_footprint(tickers)
+    # dicts with float columns even when numeric is decoded exactly, select_dtypes drops Decimals
+    jsonResults = jsonable_encoder(await get_carbon_footprint(tickers))
     elementDF = pd.DataFrame(jsonResults)
     portfolioDF = portfolioDF.append(elementDF, ignore_index=True)
 
@@ -40,9 +43,7 @@ async def get_portfolio_carbon_footprint_controller(
     portfolioDF = portfolioDF.select_dtypes(['number'])
     gr = portfolioDF.groupby('year').agg(func)
     gr.reset_index(inplace=True)
-    res = gr.to_json(orient='records')
-    res = eval(res)  # TODO: eval is dangerous, are we sure we want to use it
-    return res
+    return Response(content=gr.to_json(orient='records'), media_type='application/json')
 
 
 # portfolioCOGS
@@ -52,7 +53,8 @@ async def get_portfolio_cogs_footprint_controller(
         func: str = Body(...),
 ):
     portfolioDF = pd.DataFrame()
-    jsonResults = await get_cogs(tickers)
+    # dicts with float columns even when numeric is decoded exactly, select_dtypes drops Decimals
+    jsonResults = jsonable_encoder(await get_cogs(tickers))
     elementDF = pd.DataFrame(jsonResults)
     portfolioDF = portfolioDF.append(elementDF, ignore_index=True)
 
@@ -60,9 +62,7 @@ async def get_portfolio_cogs_footprint_controller(
     portfolioDF = portfolioDF.select_dtypes(['number'])
     gr = portfolioDF.groupby('year').agg(func)
     gr.reset_index(inplace=True)
-    res = gr.to_json(orient='records')
-    res = eval(res)
-    return res
+    return Response(content=gr.to_json(orient='records'), media_type='application/json')
 
 
 # historical prices
@@ -71,17 +71,21 @@ async def get_portfolio_historical_prices_controller(
         tickers: list = Body(..., embed=True)
 ):
     hist_prices = await get_historical_prices(tickers)
-    return hist_prices
+    return RecordJSONResponse(hist_prices)
 
-# portfolio score prices
+# portfolio score prices, shares maps tickers to the number of shares held for a weighted average
 @router.post("/analytics/score")
 async def get_portfolio_historical_scores_controller(
         tickers: list = Body(...),
         func: str = Body(...),
+        shares: Optional[Dict[str, float]] = Body(None),
 ):
     logger.info(f"tickers at endpoint are {tickers}")
-    port_scores = await get_portfolio_scores(tickers, func)
-    return port_scores
+    if shares and not {ticker.upper() for ticker in shares} & {ticker.upper() for ticker in tickers}:
+        raise HTTPException(status_code=400, detail='shares has no entry for any of the tickers')
+
+    port_scores = await get_portfolio_scores(tickers, func, shares)
+    return RecordJSONResponse(port_scores)
 
 # TODO:  work in progress
 @router.post("/analytics/sortino")
@@ -103,9 +107,7 @@ async def get_portfolio_carbon_footprint_controller(
     portfolioDF = portfolioDF.select_dtypes(['number'])
     gr = portfolioDF.groupby('year').agg(func)
     gr.reset_index(inplace=True)
-    res = gr.to_json(orient='records')
-    res = eval(res)
-    return res
+    return Response(content=gr.to_json(orient='records'), media_type='application/json')
 
 
 # portfolio carbon individual for each company/year
@@ -116,26 +118,26 @@ async def get_portfolio_carbon_controller(
     query_statement = '''
     select ticker, year, carbon, provided
     from "company"."carbon" c
-    where upper(c.ticker) =  ANY($1)
+    where c.ticker_norm = ANY($1)
     order by ticker, year ASC;
 
     '''
 
     result_data = await main_db_instance.fetch_rows(query_statement, [element.upper() for element in items.tickers])
-    return jsonable_encoder(result_data)
+    return RecordJSONResponse(result_data)
 
 
 async def run_portfolio(items, portfolio_type):
     query_statement = f'''
     select year, AVG({portfolio_type}) AS AVG_{portfolio_type}
     from "company"."{portfolio_type}" c
-    where upper(c.ticker)  = ANY($1)
+    where c.ticker_norm = ANY($1)
     GROUP BY year
     order by year asc
     '''
 
     result_data = await main_db_instance.fetch_rows(query_statement, [element.upper() for element in items.tickers])
-    return jsonable_encoder(result_data)
+    return RecordJSONResponse(result_data)
 
 
 def portfolio_average(func):
@@ -164,4 +166,4 @@ async def get_portfolio_summaries_controller(
     query_statement = 'select * from "company"."General" where ticker = ANY($1)'
 
     result_data = await main_db_instance.fetch_rows(query_statement, [element.upper() for element in items.tickers])
-    return jsonable_encoder(result_data)
+    return RecordJSONResponse(result_data)
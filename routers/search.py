@@ -0,0 +1,24 @@
+import logging
+from fastapi import APIRouter, Depends
+from models_logic import search_company
+from cache.apiroute import CachingLayerRoute
+from serialization import RecordJSONResponse
+from dependencies.validation import validate_token_dependency
+
+logger = logging.getLogger('SEARCH_ROUTER')
+
+router = APIRouter(
+    prefix='/search',
+    tags=['search'],
+    responses={404: {'description': 'Not found'}},
+    dependencies=[Depends(validate_token_dependency)]
+)
+
+router.route_class = CachingLayerRoute
+
+
+# company autocomplete on ticker, name, isin, cusip and cik
+@router.get("/{search_name}")
+async def get_search_names_controller(search_name: str):
+    results = await search_company(search_name)
+    return RecordJSONResponse(results)
@@ -0,0 +1,23 @@
+import logging
+from fastapi import APIRouter, Depends
+from dependencies.validation import validate_token_dependency
+from usage import current_period
+from utils import usage_counter
+
+logger = logging.getLogger('USAGE_ROUTER')
+
+router = APIRouter(
+    prefix='/usage',
+    tags=['usage'],
+    responses={404: {'description': 'Not found'}},
+    dependencies=[Depends(validate_token_dependency)]
+)
+
+
+# api calls of the token holder in the current month, read from redis
+@router.get('')
+async def get_usage_controller(data: dict = Depends(validate_token_dependency)):
+    month, year = current_period()
+
+    count = await usage_counter.get(data['email'])
+    return {'email': data['email'], 'month': month, 'year': year, 'count': count}
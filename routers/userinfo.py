@@ -1,5 +1,5 @@
 import logging
-from utils import jwt_token
+from utils import jwt_token, user_profiles
 from fastapi import APIRouter, Depends
 from fastapi.responses import JSONResponse
 from fastapi.encoders import jsonable_encoder
@@ -84,6 +84,7 @@ async def new_token(user: ValidateToken):
             token = jwt_token(user.email)
             query_statement = f"insert into company.user_profile (email, token) values('{user.email}', '{token}');"
             await main_db_instance.execute(query_statement)
+            user_profiles.invalidate(user.email)
             return {"success": True, "token": token}
 
         except Exception as exp:
@@ -0,0 +1,178 @@
+import sys
+import heapq
+import logging
+from bisect import bisect_left
+from typing import Dict, List, Optional, Set, Tuple
+from rapidfuzz import process, fuzz
+from db_connection import Database
+from reference_data import BackgroundLoaded
+import named_queries as queries
+
+logger = logging.getLogger('SEARCH')
+
+# lower ranks come first: the ticker, then the start of the name, a word of the name, an identifier
+_TICKER, _NAME, _WORD, _IDENTIFIER = range(4)
+
+_FIELDS = ('ticker', 'name', 'isin', 'cusip', 'cik')
+
+
+def _intern(value) -> Optional[str]:
+    return sys.intern(str(value)) if value is not None else None
+
+
+def _trigrams(value: str) -> Set[str]:
+    return {value[i:i + 3] for i in range(len(value) - 2)}
+
+
+class CompanySearchIndex(BackgroundLoaded):
+    """
+    Per-worker autocomplete index of the common stocks in company."General". Every ticker,
+    name, word of a name and identifier is kept upper case in one sorted array, so a prefix
+    is two binary searches away and the matches come ranked by what they matched. The ranked
+    matches of the prefixes up to `short_prefix_length` characters, which span most of the
+    keys, are computed when the index is built. When the prefixes find fewer than `limit`
+    companies the names are fuzzy matched with rapidfuzz, only the `fuzzy_candidates` names
+    sharing the most trigrams with the term are scored. Trigrams found in more than
+    `fuzzy_max_postings` names, like ORP or INC, are not indexed. search() returns None until
+    the first load, the caller then asks postgres.
+    """
+    description = 'company search index'
+
+    def __init__(self, db: Database, refresh_interval: float = 60 * 60, retry_interval: float = 30,
+                 limit: int = 20, fuzzy_min_length: int = 3, fuzzy_cutoff: float = 80.0,
+                 short_prefix_length: int = 2, fuzzy_candidates: int = 200, fuzzy_max_postings: int = 2000):
+        super().__init__(refresh_interval, retry_interval)
+        self._db = db
+        self.limit = limit
+        self.fuzzy_min_length = fuzzy_min_length
+        self.fuzzy_cutoff = fuzzy_cutoff
+        self.short_prefix_length = short_prefix_length
+        self.fuzzy_candidates = fuzzy_candidates
+        self.fuzzy_max_postings = fuzzy_max_postings
+
+        self._companies: Optional[List[dict]] = None
+        self._keys: List[str] = []
+        self._entries: List[Tuple[int, int]] = []  # (rank, company) of each key
+        self._names: List[str] = []
+        self._short_prefixes: Dict[str, List[int]] = {}  # ranked companies of every short prefix
+        self._trigrams: Dict[str, List[int]] = {}  # companies whose name has the trigram
+
+    @property
+    def loaded(self) -> bool:
+        return self._companies is not None
+
+    def __len__(self):
+        return len(self._companies or ())
+
+    async def load(self):
+        rows = await self._db.fetch(queries.search_universe)
+
+        # the pool may not be connected yet, try again after the retry interval
+        if not rows:
+            logger.warning('Could not load the company search index')
+            return
+
+        self.build(rows)
+        logger.info(f'Loaded {len(self)} companies into the search index')
+
+    def build(self, rows):
+        companies = []
+        keyed = []
+        for row in rows:
+            company = {field: _intern(row[field]) for field in _FIELDS}
+            company['value'] = f"{company['name']} | {company['ticker']}"
+            position = len(companies)
+            companies.append(company)
+
+            if company['ticker']:
+                keyed.append((company['ticker'].upper(), _TICKER, position))
+
+            name = (company['name'] or '').upper()
+            if name:
+                keyed.append((name, _NAME, position))
+                for word in name.split()[1:]:
+                    keyed.append((word, _WORD, position))
+
+            for field in ('isin', 'cusip', 'cik'):
+                if company[field]:
+                    keyed.append((company[field].upper(), _IDENTIFIER, position))
+
+        keyed.sort()
+
+        keys = [key for key, _, _ in keyed]
+        entries = [(rank, position) for _, rank, position in keyed]
+        prefixes = {key[:length] for key in keys for length in range(1, self.short_prefix_length + 1)}
+
+        self._keys, self._entries = keys, entries
+        self._short_prefixes = {prefix: self._ranked_matches(prefix, self.limit) for prefix in prefixes}
+        names = [(company['name'] or '').upper() for company in companies]
+        postings: Dict[str, List[int]] = {}
+        for position, name in enumerate(names):
+            for trigram in _trigrams(name):
+                postings.setdefault(trigram, []).append(position)
+
+        self._names = names
+        self._trigrams = {trigram: positions for trigram, positions in postings.items()
+                          if len(positions) <= self.fuzzy_max_postings}
+        self._companies = companies
+
+    def _ranked_matches(self, term: str, limit: int) -> List[int]:
+        matches = self._prefix_matches(term)
+        return heapq.nsmallest(limit, matches, key=matches.get)
+
+    def _prefix_matches(self, term: str) -> Dict[int, Tuple[int, int, int, str]]:
+        keys, entries = self._keys, self._entries
+        start = bisect_left(keys, term)
+        end = bisect_left(keys, term + '\uffff', lo=start)
+
+        best: Dict[int, Tuple[int, int, int, str]] = {}
+        for index in range(start, end):
+            rank, position = entries[index]
+            # exact matches first, then shorter keys
+            score = (rank, 0 if keys[index] == term else 1, len(keys[index]), keys[index])
+            if position not in best or score < best[position]:
+                best[position] = score
+
+        return best
+
+    # the names sharing the most trigrams with the term, what the fuzzy match scores
+    def _fuzzy_candidates(self, term: str) -> Dict[int, str]:
+        shared: Dict[int, int] = {}
+        for trigram in _trigrams(term):
+            for position in self._trigrams.get(trigram, ()):
+                shared[position] = shared.get(position, 0) + 1
+
+        names = self._names
+        return {position: names[position]
+                for position in heapq.nlargest(self.fuzzy_candidates, shared, key=shared.get)}
+
+    # ranked companies matching the term, None while the index is cold
+    def search(self, term: str, limit: Optional[int] = None) -> Optional[List[dict]]:
+        self._refresh_in_background()
+
+        companies = self._companies
+        if companies is None:
+            return None
+
+        limit = limit or self.limit
+        term = term.strip().upper()
+        if not term:
+            return []
+
+        if len(term) <= self.short_prefix_length and limit <= self.limit:
+            found = self._short_prefixes.get(term, [])[:limit]
+        else:
+            found = self._ranked_matches(term, limit)
+
+        if len(found) < limit and len(term) >= self.fuzzy_min_length:
+            seen = set(found)
+            candidates = self._fuzzy_candidates(term)
+            for _, _, position in process.extract(term, candidates, scorer=fuzz.WRatio, processor=None,
+                                                  limit=limit + len(found), score_cutoff=self.fuzzy_cutoff):
+                if position not in seen:
+                    seen.add(position)
+                    found.append(position)
+                if len(found) >= limit:
+                    break
+
+        return [companies[position] for position in found]
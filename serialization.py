@@ -0,0 +1,40 @@
+import datetime
+from decimal import Decimal
+from typing import Any
+import numpy as np
+import orjson
+from asyncpg import Record
+from fastapi.responses import JSONResponse
+
+_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+
+# the types orjson does not know, everything else it serializes natively
+def _default(value: Any):
+    if isinstance(value, Record):
+        return dict(value)
+    if isinstance(value, Decimal):
+        return float(value)
+    # pandas Timestamp and other subclasses of the native types
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, np.generic):
+        return value.item()
+
+    raise TypeError(f'Type is not JSON serializable: {type(value).__name__}')
+
+
+def dumps(content: Any) -> bytes:
+    return orjson.dumps(content, default=_default, option=_OPTIONS)
+
+
+class RecordJSONResponse(JSONResponse):
+    """
+    JSON response serialized in one pass with orjson. asyncpg Records, Decimals, dates and
+    numpy values are converted on the way out, so the controllers return the rows of a query
+    as they come instead of copying them through jsonable_encoder first. NaN and infinity
+    become null.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
@@ -0,0 +1,35 @@
+import unittest
+from aggregates import AggregateRefresher
+from db_connection import Query
+
+_refresh = Query('refresh', 'select 1 as refreshed')
+
+
+class FakeDatabase:
+    def __init__(self, results):
+        self.results = list(results)
+
+    async def fetch(self, query, *args):
+        return self.results.pop(0)
+
+
+class AggregateRefresherTest(unittest.IsolatedAsyncioTestCase):
+    async def test_bumps_the_datasets_after_a_refresh(self):
+        bumped = []
+
+        async def bump(datasets):
+            bumped.append(datasets)
+
+        refresher = AggregateRefresher(FakeDatabase([[{'refreshed': 3}], [{'refreshed': 0}]]), _refresh,
+                                       datasets=['industry_aggregates'], on_refresh=bump)
+
+        self.assertEqual(await refresher.refresh(), 3)
+        self.assertEqual(await refresher.refresh(), 0)
+        self.assertListEqual(bumped, [['industry_aggregates']])
+        self.assertDictEqual(refresher.stats(), {'refreshed': 3, 'failures': 0})
+
+    async def test_counts_the_failed_refreshes(self):
+        refresher = AggregateRefresher(FakeDatabase([None]), _refresh)
+
+        self.assertEqual(await refresher.refresh(), 0)
+        self.assertEqual(refresher.failures, 1)
@@ -0,0 +1,34 @@
+import unittest
+from cache.keys import CacheKeySpec, build_cache_key
+
+
+class CacheKeyTest(unittest.TestCase):
+    def test_path_params_are_canonical(self):
+        key = build_cache_key('/company/{company_ticker}/carbon-footprint', {'company_ticker': 'ibm.us'})
+        self.assertEqual(key, '/company/IBM.US/carbon-footprint')
+
+    def test_query_params_are_sorted(self):
+        first = build_cache_key('/company/{company_ticker}/historicalPrices', {'company_ticker': 'IBM.US'},
+                                [('limit_date', '100'), ('a', '1')])
+        second = build_cache_key('/company/{company_ticker}/historicalPrices', {'company_ticker': 'IBM.US'},
+                                 [('a', '1'), ('limit_date', '100')])
+
+        self.assertEqual(first, second)
+        self.assertEqual(first, '/company/IBM.US/historicalPrices?a=1&limit_date=100')
+
+    def test_equivalent_bodies_share_a_key(self):
+        first = build_cache_key('/portfolio/carbon-footprint', {}, body=b'{"tickers": ["ibm.us", "GS.US"]}')
+        second = build_cache_key('/portfolio/carbon-footprint', {},
+                                 body=b'{\n  "tickers": ["gs.us", "IBM.US"]\n}')
+        third = build_cache_key('/portfolio/carbon-footprint', {}, body=b'{"tickers": ["IBM.US"]}')
+
+        self.assertEqual(first, second)
+        self.assertNotEqual(first, third)
+
+    def test_spec_selects_inputs(self):
+        spec = CacheKeySpec(path_params=('company_ticker',), query_params=('limit_date',))
+        key = build_cache_key('/company/{company_ticker}/historicalPrices/{limitdate}',
+                              {'company_ticker': 'ibm.us', 'limitdate': '10'},
+                              [('limit_date', '100'), ('cache_buster', '1')], spec=spec)
+
+        self.assertEqual(key, '/company/IBM.US/historicalPrices/_?limit_date=100')
@@ -0,0 +1,79 @@
+import time
+import asyncio
+import unittest
+from cache.breaker import CircuitBreaker
+from cache.redis import RedisRequestResponseCache
+
+
+class CircuitBreakerTest(unittest.TestCase):
+    def test_opens_after_consecutive_failures(self):
+        breaker = CircuitBreaker('test', failure_threshold=2, recovery_timeout=10)
+
+        breaker.record_failure()
+        self.assertTrue(breaker.allow())
+
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+        self.assertFalse(breaker.allow())
+        self.assertEqual(breaker.stats()['rejected'], 1)
+
+    def test_success_resets_the_failures(self):
+        breaker = CircuitBreaker('test', failure_threshold=2, recovery_timeout=10)
+
+        breaker.record_failure()
+        breaker.record_success()
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+
+    def test_half_open_probe(self):
+        breaker = CircuitBreaker('test', failure_threshold=1, recovery_timeout=0.01)
+        breaker.record_failure()
+        time.sleep(0.02)
+
+        self.assertEqual(breaker.state, CircuitBreaker.HALF_OPEN)
+        self.assertTrue(breaker.allow())
+        self.assertFalse(breaker.allow())  # only one probe at a time
+
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+
+        time.sleep(0.02)
+        self.assertTrue(breaker.allow())
+        breaker.record_success()
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+
+    def test_late_failures_do_not_extend_the_open_circuit(self):
+        breaker = CircuitBreaker('test', failure_threshold=1, recovery_timeout=0.05)
+        breaker.record_failure()
+        time.sleep(0.03)
+
+        # a call let through before the circuit opened fails late
+        breaker.record_failure()
+        time.sleep(0.03)
+
+        self.assertEqual(breaker.state, CircuitBreaker.HALF_OPEN)
+        self.assertEqual(breaker.stats()['trips'], 1)
+
+
+class AbandonedProbeTest(unittest.IsolatedAsyncioTestCase):
+    async def test_cancelled_probe_frees_its_slot(self):
+        breaker = CircuitBreaker('test', failure_threshold=1, recovery_timeout=0.01)
+        cache = RedisRequestResponseCache('redis://localhost', breaker=breaker)
+        breaker.record_failure()
+        await asyncio.sleep(0.02)
+
+        probe = asyncio.ensure_future(cache._call(lambda: asyncio.sleep(10), timeout=10))
+        await asyncio.sleep(0)
+        probe.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await probe
+
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+        await asyncio.sleep(0.02)
+        self.assertTrue(breaker.allow())
+
+    def test_abandoned_calls_do_not_count_while_closed(self):
+        breaker = CircuitBreaker('test', failure_threshold=1)
+
+        breaker.record_abandoned()
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
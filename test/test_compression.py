@@ -0,0 +1,29 @@
+import unittest
+from cache.compression import PayloadCompressor
+
+
+class PayloadCompressorTest(unittest.TestCase):
+    def test_round_trip(self):
+        compressor = PayloadCompressor(codec='zlib', threshold=16)
+        payload = b'\x81\xa4body' + b'[{"ticker": "IBM.US"}]' * 100
+
+        encoded = compressor.encode(payload)
+        self.assertLess(len(encoded), len(payload))
+        self.assertEqual(compressor.decode(encoded), payload)
+        self.assertGreater(compressor.stats()['ratio'], 1)
+
+    def test_small_payloads_are_not_compressed(self):
+        compressor = PayloadCompressor(codec='zlib', threshold=1024)
+        payload = b'\xc4\x02[]'
+
+        self.assertEqual(compressor.encode(payload), payload)
+
+    def test_reads_uncompressed_entries(self):
+        compressor = PayloadCompressor(codec='zlib', threshold=16)
+        legacy = b'\xc5\x08\x98' + b'[{"ticker": "IBM.US"}]' * 100
+
+        self.assertEqual(compressor.decode(legacy), legacy)
+
+    def test_unavailable_codec_falls_back_to_zlib(self):
+        compressor = PayloadCompressor(codec='does-not-exist')
+        self.assertEqual(compressor.stats()['codec'], 'zlib')
@@ -0,0 +1,65 @@
+import gzip
+import unittest
+from unittest import mock
+from starlette.requests import Request
+from fastapi.responses import JSONResponse
+from cache import apiroute
+from cache.apiroute import _build_response, _etag
+from cache.policy import CachePolicy
+
+_body = b'[{"ticker": "IBM.US", "carbon": 12.5}]' * 100
+_policy = CachePolicy(ttl=60, stale_ttl=0)
+
+
+def _request(**headers) -> Request:
+    raw = [(name.replace('_', '-').lower().encode('latin-1'), value.encode('latin-1'))
+           for name, value in headers.items()]
+    return Request({'type': 'http', 'method': 'GET', 'path': '/company/IBM.US/carbon', 'headers': raw})
+
+
+def _entry() -> dict:
+    return {'body': None, 'encodings': {'gzip': gzip.compress(_body)}, 'etag': _etag(_body),
+            'status': 200, 'stale_at': None, 'delta': 0.0}
+
+
+class ConditionalRequestTest(unittest.TestCase):
+    def test_every_representation_has_its_own_etag(self):
+        identity = _build_response(_request(accept_encoding='identity'), _entry(), _policy)
+        compressed = _build_response(_request(accept_encoding='gzip'), _entry(), _policy)
+
+        self.assertEqual(identity.headers['ETag'], _etag(_body))
+        self.assertEqual(compressed.headers['ETag'], _etag(_body)[:-1] + '-gzip"')
+        self.assertEqual(compressed.headers['Content-Encoding'], 'gzip')
+        for response in (identity, compressed):
+            self.assertEqual(response.headers['Vary'], 'Accept-Encoding')
+
+    def test_not_modified_when_the_representation_matches(self):
+        etag = _etag(_body)[:-1] + '-gzip"'
+
+        response = _build_response(_request(accept_encoding='gzip', if_none_match=etag), _entry(), _policy)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.body, b'')
+        self.assertEqual(response.headers['ETag'], etag)
+        self.assertEqual(response.headers['Vary'], 'Accept-Encoding')
+
+        # the validator of the gzip body does not match the identity body
+        response = _build_response(_request(accept_encoding='identity', if_none_match=etag), _entry(), _policy)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.body, _body)
+
+
+class UncachedErrorTest(unittest.IsolatedAsyncioTestCase):
+    async def test_errors_are_sent_as_the_handler_built_them(self):
+        error = JSONResponse(status_code=500, content='Error looking up the ticker', headers={'X-Request': '1'})
+
+        async def handler(request):
+            return error
+
+        with mock.patch.object(apiroute, '_set_cached') as set_cached:
+            entry = await apiroute._compute('key', _request(), handler, _policy, [])
+        set_cached.assert_not_called()
+
+        response = _build_response(_request(), entry, _policy)
+        self.assertIs(response, error)
+        self.assertNotIn('Cache-Control', response.headers)
+        self.assertNotIn('ETag', response.headers)
@@ -0,0 +1,57 @@
+import asyncio
+import unittest
+from cache.versions import DatasetVersions
+
+
+class FakeVersionsCache:
+    def __init__(self):
+        self.versions = {}
+
+    async def get_dataset_versions(self):
+        return dict(self.versions)
+
+    async def bump_dataset_versions(self, datasets):
+        for dataset in datasets:
+            self.versions[dataset] = self.versions.get(dataset, 0) + 1
+        return {dataset: self.versions[dataset] for dataset in datasets}
+
+
+class DatasetVersionsTest(unittest.IsolatedAsyncioTestCase):
+    async def test_keeps_the_old_version_until_the_copy_is_reloaded(self):
+        cache = FakeVersionsCache()
+        reloaded = asyncio.Event()
+        results = [False, True]
+
+        async def reload():
+            await reloaded.wait()
+            return results.pop(0)
+
+        versions = DatasetVersions(cache, refresh_interval=0, reloaders={'general': reload})
+        self.assertEqual(await versions.stamp(['general', 'carbon']), '@carbon:0,general:0')
+
+        cache.versions.update({'general': 1, 'carbon': 1})
+        self.assertEqual(await versions.stamp(['general', 'carbon']), '@carbon:1,general:0')
+
+        # a failed reload keeps the old version and is retried on the next refresh
+        reloaded.set()
+        await asyncio.sleep(0)
+        self.assertEqual(await versions.stamp(['general']), '@general:0')
+        await asyncio.sleep(0)
+        self.assertEqual(await versions.stamp(['general']), '@general:1')
+
+    async def test_a_local_bump_reloads_too(self):
+        calls = []
+
+        async def reload():
+            calls.append('general')
+            return True
+
+        versions = DatasetVersions(FakeVersionsCache(), refresh_interval=60, reloaders={'general': reload})
+        await versions.stamp(['general'])
+
+        await versions.bump(['general'])
+        self.assertEqual(await versions.stamp(['general']), '@general:0')
+        await asyncio.sleep(0)
+
+        self.assertListEqual(calls, ['general'])
+        self.assertEqual(await versions.stamp(['general']), '@general:1')
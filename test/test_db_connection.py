@@ -0,0 +1,44 @@
+import unittest
+from db_connection import Database, Query, set_numeric_codec
+
+
+class FakeConnection:
+    def __init__(self):
+        self.codecs = []
+
+    async def set_type_codec(self, typename, **kwargs):
+        self.codecs.append((typename, kwargs))
+
+
+class NumericCodecTest(unittest.IsolatedAsyncioTestCase):
+    async def test_float_decoder(self):
+        con = FakeConnection()
+        await set_numeric_codec(con, 'float')
+
+        [(typename, codec)] = con.codecs
+        self.assertEqual(typename, 'numeric')
+        self.assertEqual(codec['format'], 'text')
+        self.assertEqual(codec['decoder']('12.50'), 12.5)
+
+    async def test_decimal_keeps_the_asyncpg_codec(self):
+        con = FakeConnection()
+        await set_numeric_codec(con, 'decimal')
+
+        self.assertListEqual(con.codecs, [])
+
+    def test_text_is_not_a_pool_format(self):
+        for numeric in ('str', 'double'):
+            with self.assertRaises(ValueError):
+                Database('db', 'user', 'password', 'localhost', numeric=numeric)
+
+
+class UnreachableDatabaseTest(unittest.IsolatedAsyncioTestCase):
+    async def test_fetch_returns_none_without_a_pool(self):
+        db = Database('db', 'user', 'password', 'localhost')
+
+        async def connect():
+            pass
+
+        db.connect = connect
+        self.assertIsNone(await db.fetch(Query('company_info', 'select 1')))
+        self.assertEqual(db.query_stats()['company_info']['errors'], 1)
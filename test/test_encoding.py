@@ -0,0 +1,23 @@
+import gzip
+import unittest
+from cache.encoding import encode_variants, choose_encoding
+
+
+class ResponseEncodingTest(unittest.TestCase):
+    def test_variants_above_threshold(self):
+        body = b'[{"ticker": "IBM.US"}]' * 100
+
+        variants = encode_variants(body, threshold=1024, use_brotli=False)
+        self.assertEqual(gzip.decompress(variants['gzip']), body)
+        self.assertEqual(encode_variants(b'[]', threshold=1024), {})
+
+    def test_choose_encoding(self):
+        available = {'gzip': b'', 'br': b''}
+
+        self.assertEqual(choose_encoding('gzip, deflate, br', available), 'br')
+        self.assertEqual(choose_encoding('gzip, br;q=0.5', available), 'gzip')
+        self.assertEqual(choose_encoding('gzip', {'gzip': b''}), 'gzip')
+        self.assertEqual(choose_encoding('*;q=0.1', {'gzip': b''}), 'gzip')
+        self.assertIsNone(choose_encoding('identity', available))
+        self.assertIsNone(choose_encoding('gzip;q=0', {'gzip': b''}))
+        self.assertIsNone(choose_encoding(None, available))
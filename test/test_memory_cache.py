@@ -0,0 +1,52 @@
+import time
+import unittest
+from cache.memory import LRUMemoryCache
+
+
+class LRUMemoryCacheTest(unittest.TestCase):
+    def test_get_set(self):
+        cache = LRUMemoryCache(max_bytes=1024)
+        cache.set('a', b'value', expire_after=10, size=5)
+
+        self.assertEqual(cache.get('a'), (True, b'value'))
+        self.assertEqual(cache.get('b'), (False, None))
+        self.assertEqual(cache.stats()['hits'], 1)
+        self.assertEqual(cache.stats()['misses'], 1)
+
+    def test_evicts_least_recently_used(self):
+        cache = LRUMemoryCache(max_bytes=30, max_item_bytes=10)
+        cache.set('a', b'a', expire_after=10, size=10)
+        cache.set('b', b'b', expire_after=10, size=10)
+        cache.set('c', b'c', expire_after=10, size=10)
+
+        # touch a so that b becomes the oldest entry
+        cache.get('a')
+        cache.set('d', b'd', expire_after=10, size=10)
+
+        self.assertFalse(cache.get('b')[0])
+        self.assertTrue(cache.get('a')[0])
+        self.assertEqual(cache.size, 30)
+        self.assertEqual(cache.evictions, 1)
+
+    def test_expiry(self):
+        cache = LRUMemoryCache(max_bytes=1024)
+        cache.set('a', b'value', expire_after=0.01, size=5)
+        time.sleep(0.02)
+
+        self.assertEqual(cache.get('a'), (False, None))
+        self.assertEqual(cache.size, 0)
+
+    def test_rejects_oversized_items(self):
+        cache = LRUMemoryCache(max_bytes=100, max_item_bytes=10)
+
+        self.assertFalse(cache.set('a', b'x' * 11, expire_after=10, size=11))
+        self.assertEqual(len(cache), 0)
+
+    def test_evicts_past_max_entries(self):
+        cache = LRUMemoryCache(max_entries=2)
+        for key in ('a', 'b', 'c'):
+            cache.set(key, {'key': key}, expire_after=10)
+
+        self.assertFalse(cache.get('a')[0])
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.evictions, 1)
@@ -0,0 +1,34 @@
+import unittest
+import numpy as np
+import pandas as pd
+from models_logic import _weighted_by_shares
+
+_columns = ['carbon', 'globalmodelscore']
+
+
+def _scores() -> pd.DataFrame:
+    return pd.DataFrame.from_records([
+        ('IBM.US', 2019, 10.0, 1.0),
+        ('IBM.US', 2020, 20.0, 2.0),
+        ('AAPL.US', 2020, 40.0, np.nan),
+    ], columns=['ticker', 'year'] + _columns)
+
+
+class WeightedBySharesTest(unittest.TestCase):
+    def test_shares_are_matched_case_insensitively(self):
+        result = _weighted_by_shares(_scores(), {'ibm.us': 1, 'Aapl.Us': 3}, _columns).set_index('year')
+
+        self.assertAlmostEqual(result.loc[2020, 'carbon'], (20.0 + 3 * 40.0) / 4)
+
+    def test_a_holding_missing_a_year_only_weighs_in_its_years(self):
+        result = _weighted_by_shares(_scores(), {'IBM.US': 1, 'AAPL.US': 3}, _columns).set_index('year')
+
+        self.assertAlmostEqual(result.loc[2019, 'carbon'], 10.0)
+        # AAPL.US has no score in 2020, IBM.US is the only one left
+        self.assertAlmostEqual(result.loc[2020, 'globalmodelscore'], 2.0)
+
+    def test_shares_without_any_ticker_give_null_years(self):
+        result = _weighted_by_shares(_scores(), {'MSFT.US': 5}, _columns)
+
+        self.assertListEqual(list(result['year']), [2019, 2020])
+        self.assertTrue(result[_columns].isna().all().all())
@@ -0,0 +1,84 @@
+import asyncio
+import unittest
+from unittest import mock
+from aioredis import RedisError
+from cache import apiroute
+from cache.ratelimit import RateLimit, RateLimiter, RateLimitPolicy
+from cache.singleflight import SingleFlight
+
+
+class RecordingCache:
+    def __init__(self, allowed=True, retry_after=0, fail=False):
+        self.allowed = allowed
+        self.retry_after = retry_after
+        self.fail = fail
+        self.calls = []
+
+    async def take_tokens(self, key, rate, burst, cost):
+        if self.fail:
+            raise RedisError('redis is down')
+
+        self.calls.append((key, rate, burst, cost))
+        return self.allowed, self.retry_after
+
+
+default = RateLimitPolicy(read=RateLimit(rate=10, burst=100), compute=RateLimit(rate=1, burst=20))
+enterprise = RateLimitPolicy(read=RateLimit(rate=100, burst=1000), compute=RateLimit(rate=10, burst=200))
+
+
+class RateLimiterTest(unittest.IsolatedAsyncioTestCase):
+    async def test_uses_the_limits_of_the_client_type(self):
+        cache = RecordingCache()
+        limiter = RateLimiter(cache, default, {'enterprise': enterprise})
+
+        self.assertIsNone(await limiter.check('a@15rock.com', 'enterprise', 'compute', cost=10))
+        self.assertIsNone(await limiter.check('b@15rock.com', None, 'read'))
+
+        self.assertListEqual(cache.calls, [
+            ('ratelimit:compute:a@15rock.com', 10, 200, 10),
+            ('ratelimit:read:b@15rock.com', 10, 100, 1),
+        ])
+
+    async def test_cost_is_capped_by_the_burst(self):
+        cache = RecordingCache()
+        limiter = RateLimiter(cache, default)
+
+        await limiter.check('a@15rock.com', None, 'compute', cost=50)
+        self.assertEqual(cache.calls[0][3], 20)
+
+    async def test_returns_the_retry_after_in_seconds(self):
+        limiter = RateLimiter(RecordingCache(allowed=False, retry_after=1500), default)
+
+        self.assertEqual(await limiter.check('a@15rock.com', None, 'read'), 1.5)
+        self.assertEqual(limiter.limited, 1)
+
+    async def test_fails_open_when_redis_is_down(self):
+        limiter = RateLimiter(RecordingCache(fail=True), default)
+
+        self.assertIsNone(await limiter.check('a@15rock.com', None, 'read'))
+        self.assertEqual(limiter.failed_open, 1)
+
+
+class ComputeChargeTest(unittest.IsolatedAsyncioTestCase):
+    async def test_only_the_computing_request_is_charged(self):
+        cache = RecordingCache()
+        flight = SingleFlight()
+        computed = asyncio.Event()
+
+        async def compute():
+            await computed.wait()
+            return {'body': b'[]'}
+
+        def charged(email):
+            return flight.do('key', lambda: apiroute._charge_compute(email, None, '/portfolio/analytics/score', compute))
+
+        with mock.patch.object(apiroute, '_rate_limiter', RateLimiter(cache, default)):
+            leader = asyncio.ensure_future(charged('a@15rock.com'))
+            follower = asyncio.ensure_future(charged('b@15rock.com'))
+            await asyncio.sleep(0)
+            computed.set()
+
+            self.assertEqual(await leader, ({'body': b'[]'}, False))
+            self.assertEqual(await follower, ({'body': b'[]'}, True))
+
+        self.assertListEqual(cache.calls, [('ratelimit:compute:a@15rock.com', 1, 20, 5)])
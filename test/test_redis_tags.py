@@ -0,0 +1,121 @@
+import time
+import fnmatch
+import unittest
+from cache.redis import RedisRequestResponseCache
+
+
+class FakePipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.calls = []
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self.calls.append((name, args, kwargs))
+
+    async def execute(self):
+        return [await getattr(self.redis, name)(*args, **kwargs) for name, args, kwargs in self.calls]
+
+
+class FakeRedis:
+    def __init__(self):
+        self.values = {}
+        self.sets = {}
+        self.sorted_sets = {}
+        self.unlinked = []
+
+    def pipeline(self, transaction=False):
+        return FakePipeline(self)
+
+    async def setex(self, key, expire_after, value):
+        self.values[key.encode('utf-8')] = value
+
+    async def zadd(self, name, mapping):
+        members = self.sorted_sets.setdefault(name, {})
+        members.update({key.encode('utf-8'): score for key, score in mapping.items()})
+
+    async def zremrangebyscore(self, name, low, high):
+        members = self.sorted_sets.get(name, {})
+        for key in [key for key, score in members.items() if score <= high]:
+            del members[key]
+
+    async def expire(self, name, seconds):
+        pass
+
+    # one member per page, so the walks take several cursors
+    @staticmethod
+    def _page(items, cursor):
+        cursor = int(cursor)
+        return (cursor + 1 if cursor + 1 < len(items) else 0), items[cursor:cursor + 1]
+
+    async def zscan(self, name, cursor=0, count=None):
+        return self._page(list(self.sorted_sets.get(name, {}).items()), cursor)
+
+    async def sscan(self, name, cursor=0, count=None):
+        return self._page(list(self.sets.get(name, ())), cursor)
+
+    async def scan(self, cursor=0, match=None, count=None):
+        return self._page([key for key in self.values if fnmatch.fnmatch(key.decode('utf-8'), match)], cursor)
+
+    async def unlink(self, *keys):
+        self.unlinked.append(keys)
+        for key in keys:
+            self.values.pop(key.encode('utf-8') if isinstance(key, str) else key, None)
+            self.sorted_sets.pop(key, None)
+            self.sets.pop(key, None)
+
+
+class RedisTagsTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.cache = RedisRequestResponseCache('redis://localhost', batch_size=2)
+        self.redis = self.cache._redis = FakeRedis()
+
+    async def test_records_the_keys_under_every_tag(self):
+        await self.cache.set('/company/IBM.US/carbon', {'body': b'[]'}, expire_after=60,
+                             tags=['ticker:IBM.US', 'router:company'])
+
+        for tag in ('ticker:IBM.US', 'router:company'):
+            [(key, expires_at)] = self.redis.sorted_sets[f'tags:{tag}'].items()
+            self.assertEqual(key, b'/company/IBM.US/carbon')
+            self.assertAlmostEqual(expires_at, time.time() + 60, delta=5)
+
+    async def test_writes_prune_the_expired_members(self):
+        self.redis.sorted_sets['tags:router:company'] = {b'/company/OLD.US/carbon': time.time() - 1}
+
+        await self.cache.set('/company/IBM.US/carbon', {}, expire_after=60, tags=['router:company'])
+
+        self.assertListEqual(list(self.redis.sorted_sets['tags:router:company']), [b'/company/IBM.US/carbon'])
+
+    async def test_delete_tags_unlinks_the_live_keys_in_batches(self):
+        for ticker in ('IBM.US', 'AAPL.US', 'MSFT.US'):
+            await self.cache.set(f'/company/{ticker}/carbon', {}, expire_after=60, tags=['dataset:carbon'])
+        self.redis.sorted_sets['tags:dataset:carbon'][b'/company/OLD.US/carbon'] = time.time() - 1
+        self.redis.sets['tag:dataset:carbon'] = {b'/company/TSLA.US/carbon'}
+
+        deleted = await self.cache.delete_tags(['dataset:carbon'])
+
+        self.assertCountEqual(deleted, ['/company/IBM.US/carbon', '/company/AAPL.US/carbon',
+                                        '/company/MSFT.US/carbon', '/company/TSLA.US/carbon'])
+        self.assertEqual(self.redis.values, {})
+        self.assertNotIn('tags:dataset:carbon', self.redis.sorted_sets)
+        self.assertTrue(all(len(batch) <= 2 for batch in self.redis.unlinked))
+
+    async def test_delete_scans_the_pattern(self):
+        for key in ('/company/IBM.US/carbon', '/company/IBM.US/news', '/company/AAPL.US/carbon'):
+            await self.cache.set(key, {}, expire_after=60)
+
+        deleted = await self.cache.delete('/company/IBM.US/*')
+
+        self.assertCountEqual(deleted, ['/company/IBM.US/carbon', '/company/IBM.US/news'])
+        self.assertListEqual(list(self.redis.values), [b'/company/AAPL.US/carbon'])
+
+    async def test_a_failing_scan_page_counts_against_the_breaker(self):
+        self.redis.sets['tag:dataset:carbon'] = {b'/company/TSLA.US/carbon'}
+
+        async def sscan(name, cursor=0, count=None):
+            raise ConnectionError('redis is down')
+
+        self.redis.sscan = sscan
+        with self.assertRaises(ConnectionError):
+            await self.cache.delete_tags(['dataset:carbon'])
+
+        self.assertEqual(self.cache.breaker.stats()['consecutive_failures'], 1)
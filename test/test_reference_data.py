@@ -0,0 +1,42 @@
+import unittest
+from reference_data import ReferenceData
+
+_rows = [
+    {'ticker_norm': 'IBM.US', 'ticker': 'IBM.US', 'name': 'International Business Machines Corp',
+     'industry': 'Information Technology Services', 'sector': 'Technology', 'countryname': 'USA',
+     'countryiso': 'US', 'exchange': 'US'},
+    {'ticker_norm': 'ACN.US', 'ticker': 'ACN.US', 'name': 'Accenture plc',
+     'industry': 'Information Technology Services', 'sector': 'Technology', 'countryname': 'USA',
+     'countryiso': 'US', 'exchange': 'US'},
+    {'ticker_norm': 'XOM.US', 'ticker': 'XOM.US', 'name': 'Exxon Mobil Corp',
+     'industry': 'Oil & Gas Integrated', 'sector': 'Energy', 'countryname': 'USA',
+     'countryiso': 'US', 'exchange': 'US'},
+    {'ticker_norm': 'XOM.US', 'ticker': 'xom.us', 'name': 'Duplicate', 'industry': None, 'sector': None,
+     'countryname': None, 'countryiso': None, 'exchange': None},
+]
+
+
+class ReferenceDataTest(unittest.TestCase):
+    def setUp(self):
+        self.reference_data = ReferenceData(db=None)
+        # a recent attempt keeps the lookups from scheduling a load
+        self.reference_data._attempted_at = float('inf')
+
+    def test_is_cold_until_built(self):
+        self.assertIsNone(self.reference_data.is_known('IBM.US'))
+        self.assertIsNone(self.reference_data.get('IBM.US', 'industry'))
+
+    def test_resolves_the_company_facts(self):
+        self.reference_data.build(_rows)
+
+        self.assertTrue(self.reference_data.is_known(' ibm.us '))
+        self.assertFalse(self.reference_data.is_known('NOPE.US'))
+        self.assertEqual(self.reference_data.get('ibm.us', 'sector'), 'Technology')
+        self.assertEqual(self.reference_data.company('XOM.US')['name'], 'Exxon Mobil Corp')
+        self.assertEqual(len(self.reference_data), 3)
+
+    def test_industry_shared_by_the_tickers(self):
+        self.reference_data.build(_rows)
+
+        self.assertEqual(self.reference_data.industry_of(['IBM.US', 'ACN.US']), 'Information Technology Services')
+        self.assertIsNone(self.reference_data.industry_of(['IBM.US', 'XOM.US']))
@@ -0,0 +1,53 @@
+import unittest
+from search import CompanySearchIndex
+
+_rows = [
+    {'ticker': 'IBM.US', 'name': 'International Business Machines Corp', 'isin': 'US4592001014',
+     'cusip': '459200101', 'cik': '51143'},
+    {'ticker': 'IBKR.US', 'name': 'Interactive Brokers Group Inc', 'isin': 'US45841N1072',
+     'cusip': '45841N107', 'cik': '1381197'},
+    {'ticker': 'MSFT.US', 'name': 'Microsoft Corporation', 'isin': 'US5949181045',
+     'cusip': '594918104', 'cik': '789019'},
+    {'ticker': 'AAPL.US', 'name': 'Apple Inc', 'isin': None, 'cusip': None, 'cik': None},
+]
+
+
+class CompanySearchIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.index = CompanySearchIndex(db=None, limit=5)
+        # a recent attempt keeps the lookups from scheduling a load
+        self.index._attempted_at = float('inf')
+
+    def test_is_cold_until_built(self):
+        self.assertIsNone(self.index.search('ibm'))
+
+    def test_ranks_ticker_matches_first(self):
+        self.index.build(_rows)
+
+        results = self.index.search('ib')
+        self.assertListEqual([result['ticker'] for result in results][:2], ['IBM.US', 'IBKR.US'])
+        self.assertEqual(results[0]['value'], 'International Business Machines Corp | IBM.US')
+
+    def test_matches_words_of_the_name_and_identifiers(self):
+        self.index.build(_rows)
+
+        self.assertEqual(self.index.search('brokers')[0]['ticker'], 'IBKR.US')
+        self.assertEqual(self.index.search('us5949')[0]['ticker'], 'MSFT.US')
+
+    def test_fuzzy_matches_misspelled_names(self):
+        self.index.build(_rows)
+
+        self.assertIn('MSFT.US', [result['ticker'] for result in self.index.search('mircosoft corporation')])
+
+    def test_fuzzy_match_scores_only_names_sharing_trigrams(self):
+        self.index.build(_rows)
+
+        candidates = self.index._fuzzy_candidates('MIRCOSOFT')
+        self.assertListEqual(list(candidates.values()), ['MICROSOFT CORPORATION'])
+
+    def test_short_prefixes_are_ranked_when_built(self):
+        self.index.build(_rows)
+
+        self.assertListEqual(self.index._short_prefixes['IB'], self.index._ranked_matches('IB', 5))
+        self.assertListEqual([result['ticker'] for result in self.index.search('i', limit=2)],
+                             ['IBM.US', 'IBKR.US'])
@@ -0,0 +1,31 @@
+import datetime
+import unittest
+from decimal import Decimal
+import numpy as np
+import orjson
+from serialization import RecordJSONResponse, dumps
+
+
+class SerializationTest(unittest.TestCase):
+    def test_converts_the_query_types(self):
+        row = {
+            'ticker': 'IBM.US',
+            'carbon': Decimal('12.5'),
+            'date': datetime.date(2021, 3, 31),
+            'year': np.int64(2021),
+            'score': float('nan'),
+        }
+
+        self.assertEqual(orjson.loads(dumps([row])), [{
+            'ticker': 'IBM.US', 'carbon': 12.5, 'date': '2021-03-31', 'year': 2021, 'score': None,
+        }])
+
+    def test_response_body(self):
+        response = RecordJSONResponse([{'year': 2020, 'carbon': Decimal('1.25')}])
+
+        self.assertEqual(response.body, b'[{"year":2020,"carbon":1.25}]')
+        self.assertEqual(response.media_type, 'application/json')
+
+    def test_unknown_types_fail(self):
+        with self.assertRaises(TypeError):
+            dumps({'value': object()})
@@ -0,0 +1,57 @@
+import asyncio
+import unittest
+from cache.singleflight import SingleFlight
+
+
+class SingleFlightTest(unittest.IsolatedAsyncioTestCase):
+    async def test_coalesces_concurrent_calls(self):
+        flight = SingleFlight(timeout=1)
+        calls = 0
+
+        async def compute():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.05)
+            return b'body'
+
+        results = await asyncio.gather(*[flight.do('key', compute) for _ in range(5)])
+
+        self.assertEqual(calls, 1)
+        self.assertListEqual([result for result, _ in results], [b'body'] * 5)
+        self.assertEqual(sum(shared for _, shared in results), 4)
+        self.assertEqual(len(flight), 0)
+
+    async def test_followers_fall_back_when_leader_fails(self):
+        flight = SingleFlight(timeout=1)
+        calls = 0
+
+        async def compute():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.05)
+            if calls == 1:
+                raise ValueError('leader failed')
+            return b'body'
+
+        leader, follower = await asyncio.gather(
+            flight.do('key', compute), flight.do('key', compute), return_exceptions=True)
+
+        self.assertIsInstance(leader, ValueError)
+        self.assertEqual(follower, (b'body', False))
+        self.assertEqual(flight.fallbacks, 1)
+
+    async def test_followers_wait_with_a_bound(self):
+        flight = SingleFlight(timeout=0.01)
+
+        async def slow():
+            await asyncio.sleep(0.2)
+            return b'slow'
+
+        async def fast():
+            return b'fast'
+
+        leader = asyncio.ensure_future(flight.do('key', slow))
+        await asyncio.sleep(0)
+
+        self.assertEqual(await flight.do('key', fast), (b'fast', False))
+        self.assertEqual(await leader, (b'slow', False))
@@ -0,0 +1,122 @@
+import unittest
+from usage import RedisUsageStore, UsageCounter
+
+
+class RecordingStore:
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.batches = []
+
+    async def add(self, rows):
+        if self.fail:
+            raise ConnectionError('store is down')
+        self.batches.append(list(rows))
+
+    async def get(self, email, month, year):
+        counts = [row[3] for batch in self.batches for row in batch if row[:3] == (email, month, year)]
+        return sum(counts) if counts else None
+
+
+class UsageCounterTest(unittest.IsolatedAsyncioTestCase):
+    async def test_aggregates_counts_per_email(self):
+        store = RecordingStore()
+        counter = UsageCounter(store, flush_interval=60, max_pending=100)
+
+        for _ in range(3):
+            counter.increment('a@15rock.com')
+        counter.increment('b@15rock.com')
+
+        self.assertEqual(await counter.flush(), 4)
+        await counter.close()
+
+        self.assertEqual(len(store.batches), 1)
+        counts = {row[0]: row[3] for row in store.batches[0]}
+        self.assertDictEqual(counts, {'a@15rock.com': 3, 'b@15rock.com': 1})
+
+    async def test_keeps_counts_when_the_flush_fails(self):
+        store = RecordingStore(fail=True)
+        counter = UsageCounter(store, flush_interval=60, max_pending=100)
+
+        counter.increment('a@15rock.com')
+        self.assertEqual(await counter.flush(), 0)
+        self.assertEqual(len(counter), 1)
+
+        store.fail = False
+        await counter.close()
+
+        self.assertEqual(store.batches[0][0][3], 1)
+        self.assertEqual(len(counter), 0)
+
+    async def test_drops_counts_above_the_buffer_limit(self):
+        store = RecordingStore(fail=True)
+        counter = UsageCounter(store, flush_interval=60, max_pending=100, max_buffered=2)
+
+        for _ in range(3):
+            counter.increment('a@15rock.com')
+        await counter.close()
+
+        self.assertEqual(counter.dropped, 3)
+        self.assertEqual(len(counter), 0)
+
+    async def test_reads_include_the_buffered_counts(self):
+        store = RecordingStore()
+        counter = UsageCounter(store, flush_interval=60, max_pending=100)
+
+        counter.increment('a@15rock.com')
+        await counter.flush()
+        counter.increment('a@15rock.com')
+
+        self.assertEqual(await counter.get('a@15rock.com'), 2)
+        self.assertEqual(await counter.get('b@15rock.com'), 0)
+        await counter.close()
+
+
+class FakeUsageCache:
+    def __init__(self):
+        self.totals = {}
+
+    async def incr_usage(self, rows, expire_after, baselines=None):
+        for email, month, year, count in rows:
+            key = (email, month, year)
+            self.totals.setdefault(key, (baselines or {}).get(key, 0))
+            self.totals[key] += count
+
+    async def get_usage(self, email, month, year):
+        return self.totals.get((email, month, year))
+
+    async def close(self):
+        pass
+
+
+class RedisUsageStoreTest(unittest.IsolatedAsyncioTestCase):
+    async def test_first_count_starts_from_postgres(self):
+        postgres = RecordingStore()
+        await postgres.add([('a@15rock.com', 'Jan', 2021, 40)])
+        store = RedisUsageStore(FakeUsageCache(), postgres, rollup_interval=60)
+
+        await store.add([('a@15rock.com', 'Jan', 2021, 2), ('b@15rock.com', 'Jan', 2021, 1)])
+        await store.add([('a@15rock.com', 'Jan', 2021, 3)])
+        await store.close()
+
+        self.assertEqual(await store.get('a@15rock.com', 'Jan', 2021), 45)
+        self.assertEqual(await store.get('b@15rock.com', 'Jan', 2021), 1)
+
+    async def test_a_total_created_in_the_meantime_is_not_seeded_again(self):
+        postgres = RecordingStore()
+        await postgres.add([('a@15rock.com', 'Jan', 2021, 40)])
+        cache = FakeUsageCache()
+        store = RedisUsageStore(cache, postgres, rollup_interval=60)
+
+        # another worker counts between the read of the postgres total and the increment
+        get = postgres.get
+
+        async def get_then_count(email, month, year):
+            count = await get(email, month, year)
+            await cache.incr_usage([(email, month, year, 1)], 60, {(email, month, year): count})
+            return count
+
+        postgres.get = get_then_count
+        await store.add([('a@15rock.com', 'Jan', 2021, 2)])
+        await store.close()
+
+        self.assertEqual(cache.totals[('a@15rock.com', 'Jan', 2021)], 43)
@@ -0,0 +1,51 @@
+import unittest
+from user_profiles import UserProfiles
+
+
+class RecordingDatabase:
+    def __init__(self, rows):
+        self.rows = rows
+        self.queries = 0
+
+    async def fetch_rows(self, query, *args):
+        self.queries += 1
+        return self.rows
+
+
+class UserProfilesTest(unittest.IsolatedAsyncioTestCase):
+    async def test_caches_the_profile(self):
+        db = RecordingDatabase([{'userid': 1, 'email': 'a@15rock.com', 'client_type': 'free', 'fund_id': None}])
+        profiles = UserProfiles(db, ttl=60)
+
+        self.assertEqual((await profiles.get('a@15rock.com'))['client_type'], 'free')
+        self.assertEqual(await profiles.client_type('a@15rock.com'), 'free')
+        self.assertEqual(db.queries, 1)
+
+    async def test_update_writes_through(self):
+        db = RecordingDatabase([{'userid': 1, 'email': 'a@15rock.com', 'client_type': 'free', 'fund_id': None}])
+        profiles = UserProfiles(db, ttl=60)
+
+        await profiles.get('a@15rock.com')
+        profiles.update('a@15rock.com', fund_id=7)
+
+        self.assertEqual((await profiles.get('a@15rock.com'))['fund_id'], 7)
+        self.assertEqual(db.queries, 1)
+
+    async def test_unconnected_pool_is_not_cached(self):
+        db = RecordingDatabase(None)
+        profiles = UserProfiles(db, ttl=60)
+
+        self.assertIsNone(await profiles.get('a@15rock.com'))
+        self.assertIsNone(await profiles.get('a@15rock.com'))
+        self.assertEqual(db.queries, 2)
+
+    async def test_missing_fund_is_resolved_again(self):
+        db = RecordingDatabase([{'userid': 1, 'email': 'a@15rock.com', 'client_type': 'free', 'fund_id': None}])
+        profiles = UserProfiles(db, ttl=60)
+        profile = await profiles.get('a@15rock.com')
+
+        # another worker created the fund
+        db.rows = [{'fund_id': 7}]
+        self.assertEqual(await profiles.fund_id(profile), 7)
+        self.assertEqual(await profiles.fund_id(await profiles.get('a@15rock.com')), 7)
+        self.assertEqual(db.queries, 2)
@@ -1,5 +1,7 @@
+import time
 import unittest
-from utils import convert_tickers
+from unittest import mock
+from utils import convert_tickers, convert_ticker_list, convert_country_list, validate_token
 
 
 class TestModelLogic(unittest.TestCase):
@@ -12,3 +14,45 @@ class TestModelLogic(unittest.TestCase):
         tickers = ['ibm.us', 'gs.us', 'dell.us']
         processed = convert_tickers(tickers)
         self.assertTupleEqual(processed, ('IBM.US', 'GS.US', 'DELL.US'))
+
+    def test_convert_ticker_list(self):
+        self.assertListEqual(convert_ticker_list('ibm.us'), ['IBM.US'])
+        self.assertListEqual(convert_ticker_list(['ibm.us', 'gs.us']), ['IBM.US', 'GS.US'])
+
+    def test_convert_country_list(self):
+        self.assertListEqual(convert_country_list('United States'), ['UNITEDSTATES'])
+        self.assertListEqual(convert_country_list(['united kingdom', 'France']), ['UNITEDKINGDOM', 'FRANCE'])
+
+
+class TestValidateToken(unittest.TestCase):
+    def test_memoizes_the_verification(self):
+        claims = {'email': 'memo@15rock.com'}
+
+        with mock.patch('utils._decode_token', return_value=(True, claims)) as decode:
+            self.assertTupleEqual(validate_token('memo-token'), (True, claims))
+            self.assertTupleEqual(validate_token('memo-token'), (True, claims))
+
+        self.assertEqual(decode.call_count, 1)
+
+    def test_callers_get_their_own_claims(self):
+        with mock.patch('utils._decode_token', return_value=(True, {'email': 'copy@15rock.com'})):
+            _, claims = validate_token('copy-token')
+            claims['email'] = 'other@15rock.com'
+
+            self.assertEqual(validate_token('copy-token')[1]['email'], 'copy@15rock.com')
+
+    def test_expired_claims_are_not_memoized(self):
+        claims = {'email': 'exp@15rock.com', 'exp': time.time() - 1}
+
+        with mock.patch('utils._decode_token', return_value=(True, claims)) as decode:
+            validate_token('exp-token')
+            validate_token('exp-token')
+
+        self.assertEqual(decode.call_count, 2)
+
+    def test_failures_are_not_memoized(self):
+        with mock.patch('utils._decode_token', return_value=(False, None)) as decode:
+            self.assertTupleEqual(validate_token('bad-token'), (False, None))
+            validate_token('bad-token')
+
+        self.assertEqual(decode.call_count, 2)
@@ -0,0 +1,242 @@
+import asyncio
+import logging
+from datetime import datetime
+from typing import Dict, List, Optional, Set, Tuple
+from aioredis import RedisError
+from cache.redis import RedisRequestResponseCache
+from db_connection import Database
+
+logger = logging.getLogger('API_USAGE')
+
+# relies on the unique index on (email, month, year) added by the 0001 migration
+_upsert_query = """
+    insert into company.api_usage (email, month, year, count)
+    values ($1, $2, $3, $4)
+    on conflict (email, month, year) do update set count = company.api_usage.count + excluded.count
+"""
+
+
+_usage_query = 'select count from company.api_usage where email = $1 and month = $2 and year = $3'
+
+UsageRow = Tuple[str, str, int, int]  # email, month, year, count
+
+
+def current_period() -> Tuple[str, int]:
+    now = datetime.now()
+    return now.strftime("%b"), now.year
+
+
+class PostgresUsageStore:
+    """company.api_usage, the durable record of the usage counts"""
+
+    def __init__(self, db: Database):
+        self._db = db
+
+    async def add(self, rows: List[UsageRow]):
+        await self._db.execute_many(_upsert_query, rows)
+
+    async def get(self, email: str, month: str, year: int) -> Optional[int]:
+        rows = await self._db.fetch_rows(_usage_query, email, month, year)
+        return rows[0]['count'] if rows else None
+
+
+class RedisUsageStore:
+    """
+    Usage counts kept in per-month redis hashes, so counting and reading never touch postgres.
+    Every `rollup_interval` seconds one worker, holding a redis lock, writes the counts added
+    since the last rollup into `rollup_store`. A rollup that fails after the upsert is retried,
+    so counts are written at least once. The first count of an email in a month starts from
+    the total postgres had before the redis hashes existed.
+    """
+
+    def __init__(self, cache: RedisRequestResponseCache, rollup_store: PostgresUsageStore,
+                 rollup_interval: float = 60.0, expire_after: int = 62 * 24 * 60 * 60, lock_ttl: int = 60):
+        self._cache = cache
+        self._rollup_store = rollup_store
+        self.rollup_interval = rollup_interval
+        self.expire_after = expire_after
+        self.lock_ttl = lock_ttl
+
+        self._rollup: Optional[asyncio.Task] = None
+        self._seeded: Set[Tuple[str, str, int]] = set()
+        self._seeded_period: Optional[Tuple[str, int]] = None
+        self.rolled_up = 0
+
+    async def add(self, rows: List[UsageRow]):
+        if self._rollup is None or self._rollup.done():
+            self._rollup = asyncio.get_event_loop().create_task(self._roll_up_periodically())
+
+        baselines = await self._baselines(rows)
+        await self._cache.incr_usage(rows, self.expire_after, baselines)
+        self._seeded.update((email, month, year) for email, month, year, _ in rows)
+
+    # the postgres totals of the emails not counted in redis yet, a missing field means postgres
+    # only holds the counts of before. incr_usage applies them with HSETNX in the same
+    # transaction as the increment, so a field another worker created in the meantime is kept
+    async def _baselines(self, rows: List[UsageRow]) -> Dict[Tuple[str, str, int], int]:
+        # only the emails of the current month are remembered
+        if self._seeded_period != current_period():
+            self._seeded, self._seeded_period = set(), current_period()
+
+        baselines = {}
+        for email, month, year, _ in rows:
+            key = (email, month, year)
+            if key in self._seeded or await self._cache.get_usage(email, month, year) is not None:
+                continue
+
+            count = await self._rollup_store.get(email, month, year)
+            if count:
+                baselines[key] = count
+
+        return baselines
+
+    # falls back to postgres for months counted before the redis hashes existed
+    async def get(self, email: str, month: str, year: int) -> Optional[int]:
+        try:
+            count = await self._cache.get_usage(email, month, year)
+            if count is not None:
+                return count
+        except (RedisError, OSError, asyncio.TimeoutError) as exp:
+            logger.warning(f'Could not read the usage of {email} from redis: {exp}')
+
+        return await self._rollup_store.get(email, month, year)
+
+    # returns the number of requests written to postgres
+    async def roll_up(self) -> int:
+        token = await self._cache.acquire_lock('usage:rollup', self.lock_ttl)
+        if token is None:
+            return 0
+
+        try:
+            rows = await self._cache.take_pending_usage()
+            if rows:
+                await self._rollup_store.add(rows)
+            await self._cache.ack_pending_usage()
+        finally:
+            await self._cache.release_lock('usage:rollup', token)
+
+        rolled_up = sum(row[3] for row in rows)
+        self.rolled_up += rolled_up
+        return rolled_up
+
+    async def _roll_up_periodically(self):
+        while True:
+            await asyncio.sleep(self.rollup_interval)
+
+            try:
+                await self.roll_up()
+            except Exception as exp:
+                logger.error(f'Failed to roll up the api usage: {exp}')
+
+    async def close(self):
+        if self._rollup is not None:
+            self._rollup.cancel()
+            self._rollup = None
+
+        await self._cache.close()
+
+
+class UsageCounter:
+    """
+    Per-worker buffer of the api usage counts, aggregated per (email, month, year) and written
+    to the store in one batch every `flush_interval` seconds, or as soon as `max_pending`
+    requests are buffered. A crash loses at most `max_pending` counts or the counts of the last
+    interval. When the store is unavailable the counts are kept for the next flush, up to
+    `max_buffered` requests, then they are dropped.
+    """
+
+    def __init__(self, store, flush_interval: float = 5.0, max_pending: int = 1000,
+                 max_buffered: int = 100000):
+        self._store = store
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.max_buffered = max_buffered
+
+        self._counts: Dict[Tuple[str, str, int], int] = {}
+        self._pending = 0
+        self._lock: Optional[asyncio.Lock] = None
+        self._timer: Optional[asyncio.Task] = None
+        self._flushing: Optional[asyncio.Task] = None
+
+        self.flushed = 0
+        self.failures = 0
+        self.dropped = 0
+
+    def __len__(self):
+        return self._pending
+
+    def increment(self, email: str, count: int = 1):
+        month, year = current_period()
+        key = (email, month, year)
+
+        self._counts[key] = self._counts.get(key, 0) + count
+        self._pending += count
+
+        if self._timer is None or self._timer.done():
+            self._timer = asyncio.get_event_loop().create_task(self._flush_periodically())
+
+        if self._pending >= self.max_pending and (self._flushing is None or self._flushing.done()):
+            self._flushing = asyncio.get_event_loop().create_task(self.flush())
+
+    async def _flush_periodically(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    # returns the number of requests written to the database
+    async def flush(self) -> int:
+        # created lazily so it binds to the running loop
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+
+        async with self._lock:
+            if not self._counts:
+                return 0
+
+            counts, pending = self._counts, self._pending
+            self._counts, self._pending = {}, 0
+
+            rows = [(email, month, year, count) for (email, month, year), count in counts.items()]
+            try:
+                await self._store.add(rows)
+            except Exception as exp:
+                self.failures += 1
+                logger.error(f'Failed to flush {pending} api usage count(s): {exp}')
+                self._restore(counts, pending)
+                return 0
+
+            self.flushed += pending
+            return pending
+
+    def _restore(self, counts: Dict[Tuple[str, str, int], int], pending: int):
+        if self._pending + pending > self.max_buffered:
+            logger.error(f'Dropping {pending} api usage count(s), the buffer is full')
+            self.dropped += pending
+            return
+
+        for key, count in counts.items():
+            self._counts[key] = self._counts.get(key, 0) + count
+        self._pending += pending
+
+    # usage of the current month, including the counts still buffered in this worker
+    async def get(self, email: str) -> int:
+        month, year = current_period()
+        count = await self._store.get(email, month, year)
+
+        return (count or 0) + self._counts.get((email, month, year), 0)
+
+    # stop the periodic flush and write what is left, called on shutdown
+    async def close(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        await self.flush()
+
+    def stats(self) -> dict:
+        return {
+            'pending': self._pending,
+            'flushed': self.flushed,
+            'failures': self.failures,
+            'dropped': self.dropped,
+        }
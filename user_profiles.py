@@ -0,0 +1,88 @@
+import logging
+from typing import Optional
+from cache.memory import LRUMemoryCache
+from cache.singleflight import SingleFlight
+from db_connection import Database
+
+logger = logging.getLogger('USER_PROFILES')
+
+# the first fund of the user, fund_id is null until the user adds a holding
+_profile_query = """
+    select up.userid, up.email, up.client_type, ufd.fund_id
+    from company.user_profile up
+    left join company.user_fund_details ufd on ufd.user_id = up.userid
+    where up.email = $1
+    order by ufd.fund_id
+    limit 1
+"""
+
+_fund_query = 'select fund_id from company.user_fund_details where user_id = $1 order by fund_id limit 1'
+
+
+class UserProfiles:
+    """
+    Per-worker cache of the company.user_profile rows together with the id of the user fund,
+    keyed by email and kept for `ttl` seconds. Concurrent lookups of the same email share one
+    query, unknown emails are cached as None. Writes to the profile or the fund go through
+    `update` or `invalidate` so this worker never serves its own stale data.
+    """
+
+    def __init__(self, db: Database, ttl: float = 5 * 60, max_entries: int = 10000):
+        self._db = db
+        self.ttl = ttl
+
+        self._profiles = LRUMemoryCache(max_entries=max_entries)
+        self._single_flight = SingleFlight()
+
+    async def get(self, email: str) -> Optional[dict]:
+        found, profile = self._profiles.get(email)
+        if found:
+            return profile
+
+        profile, _ = await self._single_flight.do(email, lambda: self._load(email))
+        return profile
+
+    async def _load(self, email: str) -> Optional[dict]:
+        rows = await self._db.fetch_rows(_profile_query, email)
+
+        # the pool is not connected yet, do not remember the user as unknown
+        if rows is None:
+            return None
+
+        profile = dict(rows[0].items()) if rows else None
+        self._profiles.set(email, profile, self.ttl)
+        return profile
+
+    async def client_type(self, email: str) -> Optional[str]:
+        try:
+            profile = await self.get(email)
+        except Exception as exp:
+            logger.error(f'Could not load the profile of {email}: {exp}')
+            return None
+
+        return profile['client_type'] if profile else None
+
+    # a cached profile without a fund is checked again, the fund may have been created
+    # through another worker since
+    async def fund_id(self, profile: dict) -> Optional[int]:
+        if profile['fund_id'] is not None:
+            return profile['fund_id']
+
+        rows = await self._db.fetch_rows(_fund_query, profile['userid'])
+        fund_id = rows[0]['fund_id'] if rows else None
+        if fund_id is not None:
+            self.update(profile['email'], fund_id=fund_id)
+
+        return fund_id
+
+    # write-through, the cached profile keeps its remaining time to live
+    def update(self, email: str, **fields):
+        found, profile = self._profiles.get(email)
+        remaining = self._profiles.ttl(email)
+        if not found or profile is None or remaining is None:
+            return
+
+        self._profiles.set(email, {**profile, **fields}, remaining)
+
+    def invalidate(self, email: str):
+        self._profiles.delete(email)
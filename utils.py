@@ -1,14 +1,48 @@
 import os
+import time
+import hashlib
 from config import config
 import jwt
-from fastapi.responses import JSONResponse
 from config import config as app_config
 from jwt import InvalidSignatureError, InvalidTokenError
-from datetime import datetime
 from db_sessions import main_db_instance
+from cache.breaker import CircuitBreaker
+from cache.memory import LRUMemoryCache
+from cache.redis import RedisRequestResponseCache
+from usage import PostgresUsageStore, RedisUsageStore, UsageCounter
+from user_profiles import UserProfiles
+from reference_data import ReferenceData
 from typing import Callable, List, Union
 from concurrent.futures import Executor
 
+usage_store = RedisUsageStore(
+    cache=RedisRequestResponseCache(
+        url=config.redis_server,
+        breaker=CircuitBreaker(
+            name='usage_redis',
+            failure_threshold=config.cache_breaker_failure_threshold,
+            recovery_timeout=config.cache_breaker_recovery_timeout,
+        ),
+        timeout=config.cache_redis_timeout,
+    ),
+    rollup_store=PostgresUsageStore(main_db_instance),
+    rollup_interval=config.usage_rollup_interval,
+)
+usage_counter = UsageCounter(
+    store=usage_store,
+    flush_interval=config.usage_flush_interval,
+    max_pending=config.usage_max_pending,
+)
+user_profiles = UserProfiles(
+    db=main_db_instance,
+    ttl=config.user_profile_ttl,
+)
+reference_data = ReferenceData(
+    db=main_db_instance,
+    refresh_interval=config.reference_data_refresh_interval,
+)
+_verified_tokens = LRUMemoryCache(max_entries=config.jwt_cache_max_entries)
+
 
 def random_lowercase(n):
     min_lc = ord(b'a')
@@ -24,7 +58,7 @@ def jwt_token(email):
     return jwt.encode({"email": email}, config.jwt_key, algorithm="HS256")
 
 
-def validate_token(token: str):
+def _decode_token(token: str):
     try:
         data = jwt.decode(token, key=app_config.jwt_key, algorithms="HS256")
         return True, data
@@ -33,22 +67,32 @@ def validate_token(token: str):
         return False, None
 
 
-async def increment_usage_counter(email: str):
-    month = datetime.now().strftime("%b")
-    year = int(datetime.now().strftime("%Y"))
+# valid tokens are memoized by their hash, never past their exp claim, failures are not so a
+# flood of random tokens cannot evict the valid ones. Callers get their own copy of the claims
+def validate_token(token: str):
+    key = hashlib.sha256(token.encode('utf-8')).hexdigest()
 
-    try:
-        rows = await main_db_instance.fetch_rows("select count from company.api_usage where month=$1 and year=$2 and "
-                                                 "email= $3", month, year, email)
+    found, verified = _verified_tokens.get(key)
+    if found:
+        return True, dict(verified[1])
+
+    verified = _decode_token(token)
+
+    is_valid, data = verified
+    if not is_valid:
+        return verified
+
+    expire_after = config.jwt_cache_ttl
+    if 'exp' in data:
+        expire_after = min(expire_after, data['exp'] - time.time())
+
+    _verified_tokens.set(key, verified, expire_after)
+    return True, dict(data)
 
-        if rows and len(rows) != 0:
-            await main_db_instance.execute(f"update company.api_usage set count = count + 1 where month='{month}' and year={year} and email= '{email}'")
-        else:
-            await main_db_instance.execute(f"insert into company.api_usage (email, month, year, count) values ('{email}', '{month}', {year}, 1)")
 
-    except Exception:
-        print("error - Failed to update counter")
-        return JSONResponse({"success": False, "message": "Internal server error."}, status_code=500)
+# buffered in the worker and flushed to redis in batches, see usage.UsageCounter
+def increment_usage_counter(email: str):
+    usage_counter.increment(email)
 
 
 async def schedule_task(executor: Executor, fn: Callable, *args):
@@ -65,3 +109,19 @@ def convert_tickers(tickers: Union[str, List[str]]):
         tickers = [tickers, '']
 
     return tuple([x.upper() for x in tickers])
+
+
+# the tickers as a list for = ANY($1) parameters
+def convert_ticker_list(tickers: Union[str, List[str]]) -> List[str]:
+    if not isinstance(tickers, list):
+        tickers = [tickers]
+
+    return [x.upper() for x in tickers]
+
+
+# the countries as a list matching the normalized country columns, upper case without spaces
+def convert_country_list(countries: Union[str, List[str]]) -> List[str]:
+    if not isinstance(countries, list):
+        countries = [countries]
+
+    return [x.upper().replace(' ', '') for x in countries]